@@ -1,102 +1,196 @@
-from flask import Flask, render_template, request
-import pandas as pd
+import csv
+import os
+from startup_timer import StartupTimer
+
+# Cold-start timing (CKD_STARTUP_BUDGET_MS warns when startup takes longer)
+startup = StartupTimer(budget_ms=float(os.environ.get('CKD_STARTUP_BUDGET_MS', 0)) or None)
+
+from flask import Flask, render_template, request, jsonify, make_response
 import numpy as np
-import joblib
-from sklearn.preprocessing import LabelEncoder
+from feature_schema import CATEGORICAL_COLS, FEATURE_COLS, FeatureSchema, label_encoder_codes
+from artifacts import COMPILED_DIR, MANIFEST, artifacts_version, file_sha256, load_artifacts, load_scorer
+from model_registry import load_version, ref_path
+from prediction_cache import PredictionCache
+from micro_batcher import MicroBatcher
+from metrics import Metrics
+from static_page import PrecompressedPage
+from model_reloader import ModelReloader
+from shadow_scoring import ShadowScorer
+from early_exit import wrap_scorer
 
 app = Flask(__name__)
+metrics = Metrics('app')
+startup.mark('imports')
 
-# Load the model and scaler
-try:
-    model = joblib.load('best_model.joblib')
-    scaler = joblib.load('scaler.joblib')
-    
-    # Identify model classes
-    if hasattr(model, 'classes_'):
-        print(f"Model classes: {model.classes_}")
-        # Check if model has 3 classes (likely due to how 'ckd' was encoded in the dataset)
-        if len(model.classes_) == 3:
-            print("Model has 3 classes - adjusting CKD classification mapping")
-            # We'll assume class 0 is "ckd" based on observed behavior
-            CKD_CLASS = 0
-            NON_CKD_CLASS = 1
-        else:
-            # Standard binary classification
-            CKD_CLASS = 1
-            NON_CKD_CLASS = 0
+# Feature and categorical columns with the codes LabelEncoder gives each form value
+feature_cols = FEATURE_COLS
+categorical_cols = CATEGORICAL_COLS
+numerical_cols = [col for col in feature_cols if col not in categorical_cols]
+category_codes = label_encoder_codes()
+
+# Compiled encoder for the single-patient form path
+schema = FeatureSchema(feature_cols, category_codes)
+
+def warmup_rows(n=64):
+    # Real patient rows from the bundled CSV (read without pandas) to validate
+    # and warm each model with, or random rows if the CSV isn't there
+    rows = []
+    try:
+        with open('cleaned_ckd_data.csv', newline='') as f:
+            for record in csv.DictReader(f):
+                try:
+                    rows.append(schema.encode({k.lower(): v.strip() for k, v in record.items()})[0])
+                except ValueError:
+                    continue
+                if len(rows) == n:
+                    break
+    except FileNotFoundError:
+        pass
+    if not rows:
+        return np.random.default_rng(0).normal(size=(n, schema.n_features))
+    return np.vstack(rows)
+
+# Serve a version from the model registry when CKD_MODEL_VERSION names one (a
+# reference such as "latest" is followed when it moves), a compiled directory
+# written by compact_forest.py or early_exit.py --install when CKD_ARTIFACTS_DIR
+# names one, else the files main.py writes to the repo root
+MODEL_VERSION = os.environ.get('CKD_MODEL_VERSION')
+ARTIFACTS_DIR = os.environ.get('CKD_ARTIFACTS_DIR')
+# CKD_EARLY_EXIT=exact (or a delta such as 0.01) stops evaluating a forest's
+# trees once a patient's class is settled
+EARLY_EXIT = os.environ.get('CKD_EARLY_EXIT')
+if MODEL_VERSION:
+    def load_model():
+        scorer, entry = load_version(MODEL_VERSION)
+        return wrap_scorer(scorer, EARLY_EXIT), entry['version']
+    model_paths = [ref_path(MODEL_VERSION)]
+elif ARTIFACTS_DIR:
+    def load_model():
+        # Versioned by its manifest, which records how it was derived
+        return wrap_scorer(load_artifacts(ARTIFACTS_DIR), EARLY_EXIT), artifacts_version(ARTIFACTS_DIR)
+    model_paths = [os.path.join(ARTIFACTS_DIR, MANIFEST)]
+else:
+    # Train first if there is no saved model yet
+    if not (os.path.exists('best_model.joblib') and os.path.exists('scaler.joblib')):
+        print("Warning: Model files not found. Training will be executed first.")
+        # Headless training: no plotting libraries, no plot windows blocking startup
+        from main import train_headless
+        train_headless()
+
+    def load_model():
+        scorer = load_scorer('best_model.joblib', 'scaler.joblib')
+        return wrap_scorer(scorer, EARLY_EXIT), file_sha256('best_model.joblib')[:12]
+    model_paths = ['best_model.joblib', 'scaler.joblib', os.path.join(COMPILED_DIR, 'manifest.json')]
+
+# Load the model and scaler (memory-mapped compiled arrays when main.py wrote them)
+# together with their class mapping. The bundle is swapped as a whole when a new
+# model is saved (checked every CKD_RELOAD_INTERVAL seconds, 0 disables reloading)
+model_reloader = ModelReloader(load_model,
+                               watch_paths=model_paths,
+                               warmup_rows=warmup_rows(),
+                               check_interval=float(os.environ.get('CKD_RELOAD_INTERVAL', 2)))
+loaded = model_reloader.load()
+print(f"Model classes: {loaded.classes} (CKD class {loaded.ckd_class}, version {loaded.version})")
+if model_reloader.check_interval > 0:
+    model_reloader.start()
+
+# Optionally score every request a second time with a candidate registry version
+# (CKD_SHADOW_VERSION) in the background and log how often it disagrees
+shadow = None
+if os.environ.get('CKD_SHADOW_VERSION'):
+    shadow_scorer, shadow_entry = load_version(os.environ['CKD_SHADOW_VERSION'])
+    shadow = ShadowScorer(shadow_scorer, shadow_entry['version'],
+                          max_workers=int(os.environ.get('CKD_SHADOW_WORKERS', 1)))
+    print(f"Shadow scoring with model version {shadow_entry['version']}")
+startup.mark('model')
+
+# Upper bound on patients accepted by a single /predict/batch request
+MAX_BATCH_SIZE = 10000
+
+# Cache of recent single-patient predictions (CKD_CACHE_SIZE=0 disables it);
+# dropped whenever the model files on disk change
+prediction_cache = PredictionCache(maxsize=int(os.environ.get('CKD_CACHE_SIZE', 4096)),
+                                   ttl=float(os.environ.get('CKD_CACHE_TTL', 300)),
+                                   watch_paths=['best_model.joblib', 'scaler.joblib',
+                                                os.path.join(COMPILED_DIR, 'manifest.json')])
+
+def score_rows(rows):
+    # Score a stacked batch with one model and split it back into one
+    # (prediction, probas, trees used or None, model) result per row
+    model = model_reloader.current
+    trees_used = None
+    if model.scorer.kind == 'early_exit':
+        # A single pass, so each row is scored (and counted) once
+        predictions, probas, trees_used = model.scorer.score(rows)
     else:
-        CKD_CLASS = 1
-        NON_CKD_CLASS = 0
-        
-except FileNotFoundError:
-    print("Warning: Model files not found. Training will be executed first.")
-    import main
-    model = joblib.load('best_model.joblib')
-    scaler = joblib.load('scaler.joblib')
-    # Default class mappings
-    CKD_CLASS = 1
-    NON_CKD_CLASS = 0
-
-# Define categorical columns (same as in main.py)
-categorical_cols = ['rbc', 'pc', 'pcc', 'ba', 'htn', 'dm', 'cad', 'appet', 'pe', 'ane']
-
-# Initialize label encoders
-label_encoders = {}
-for col in categorical_cols:
-    label_encoders[col] = LabelEncoder()
-    if col == 'rbc':
-        label_encoders[col].fit(['normal', 'abnormal'])
-    elif col in ['pc']:
-        label_encoders[col].fit(['normal', 'abnormal'])
-    elif col in ['pcc', 'ba']:
-        label_encoders[col].fit(['present', 'not present'])
-    elif col in ['htn', 'dm', 'cad', 'pe', 'ane']:
-        label_encoders[col].fit(['yes', 'no'])
-    elif col == 'appet':
-        label_encoders[col].fit(['good', 'poor'])
-
-# Define feature columns (make sure they match the training data)
-feature_cols = ['age', 'bp', 'sg', 'al', 'su', 'rbc', 'pc', 'pcc', 'ba', 
-                'bgr', 'bu', 'sc', 'sod', 'pot', 'hemo', 'pcv', 'wc', 'rc', 
-                'htn', 'dm', 'cad', 'appet', 'pe', 'ane']
+        predictions = model.scorer.predict(rows)
+        probas = model.scorer.predict_proba(rows)
+    return [(predictions[i:i + 1], probas[i], trees_used[i:i + 1] if trees_used is not None else None, model)
+            for i in range(len(rows))]
+
+# Opt-in micro-batching of concurrent /predict calls (CKD_MICROBATCH_WAIT_MS > 0 enables it)
+micro_batcher = None
+if float(os.environ.get('CKD_MICROBATCH_WAIT_MS', 0)) > 0:
+    micro_batcher = MicroBatcher(score_rows,
+                                 max_wait=float(os.environ['CKD_MICROBATCH_WAIT_MS']) / 1000,
+                                 max_batch=int(os.environ.get('CKD_MICROBATCH_MAX_ROWS', 64)))
+
+# The empty form never changes while the process runs: render and compress it once
+with app.test_request_context('/'):
+    home_page = PrecompressedPage(render_template('index.html', prediction=None))
 
 @app.route('/')
 def home():
-    return render_template('index.html', prediction=None)
+    return home_page.response()
 
 @app.route('/predict', methods=['POST'])
 def predict():
     if request.method == 'POST':
-        # Get form data
-        patient_data = {}
-        for col in feature_cols:
-            if col in categorical_cols:
-                patient_data[col] = request.form.get(col)
-            else:
-                # Convert numerical values to float
-                patient_data[col] = float(request.form.get(col))
-        
-        # Convert to DataFrame
-        input_df = pd.DataFrame([patient_data])
-        
-        # Encode categorical variables
-        for col in categorical_cols:
-            input_df[col] = label_encoders[col].transform(input_df[col])
-        
-        # Scale the input data
-        input_scaled = scaler.transform(input_df)
-        
-        # Make prediction
-        prediction = model.predict(input_scaled)
+        # Parse the form body and encode it straight into a NumPy row
+        with metrics.time('parse'):
+            form = request.form
+        with metrics.time('encode'):
+            input_row = schema.encode(form)
         
-        # Get detailed probability scores
-        raw_probas = model.predict_proba(input_scaled)[0]
-        
-        # Get the correct probabilities based on identified classes
-        ckd_index = np.where(model.classes_ == CKD_CLASS)[0][0]
+        # Take one model for the whole request so a reload can't mix two versions
+        model = model_reloader.current
+        trees_used = None
+
+        # Reuse the result for a panel this model has scored recently
+        cache_key = (model.version, prediction_cache.key(input_row))
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            prediction, raw_probas = cached
+        elif micro_batcher is not None:
+            # Wait for this row to be scored together with other concurrent
+            # requests; the batch reports which model scored it
+            with metrics.time('predict_batched'):
+                prediction, raw_probas, trees_used, model = micro_batcher.submit(input_row)
+            prediction_cache.put((model.version, cache_key[1]), (prediction, raw_probas))
+            if shadow is not None:
+                shadow.submit(input_row, prediction, raw_probas[None], model.classes)
+        elif model.scorer.kind == 'early_exit':
+            # One pass gives the label, the probabilities and the trees it took
+            with metrics.time('predict_proba'):
+                prediction, probas, trees_used = model.scorer.score(input_row)
+            raw_probas = probas[0]
+            prediction_cache.put(cache_key, (prediction, raw_probas))
+            if shadow is not None:
+                shadow.submit(input_row, prediction, probas, model.classes)
+        else:
+            # Make prediction
+            with metrics.time('predict'):
+                prediction = model.scorer.predict(input_row)
+            
+            # Get detailed probability scores
+            with metrics.time('predict_proba'):
+                raw_probas = model.scorer.predict_proba(input_row)[0]
+            prediction_cache.put(cache_key, (prediction, raw_probas))
+            if shadow is not None:
+                shadow.submit(input_row, prediction, raw_probas[None], model.classes)
         
         # Convert probabilities to percentages
-        ckd_prob = raw_probas[ckd_index] * 100
+        ckd_prob = raw_probas[model.ckd_index] * 100
         # Calculate non-CKD probability by subtracting from 100%
         non_ckd_prob = 100 - ckd_prob       
       
@@ -110,14 +204,110 @@ def predict():
         probability = max(ckd_prob, non_ckd_prob)
         
         # Determine if it's CKD based on class, not probability
-        is_ckd = prediction[0] == CKD_CLASS
+        is_ckd = prediction[0] == model.ckd_class
         
         # Return the prediction and probabilities
-        return render_template('index.html', 
-                               prediction=[is_ckd], 
-                               ckd_prob=ckd_prob, 
-                               non_ckd_prob=non_ckd_prob, 
-                               probability=probability)
+        with metrics.time('render'):
+            response = make_response(render_template('index.html', 
+                                                     prediction=[is_ckd], 
+                                                     ckd_prob=ckd_prob, 
+                                                     non_ckd_prob=non_ckd_prob, 
+                                                     probability=probability))
+        if trees_used is not None:
+            response.headers['X-Trees-Used'] = str(trees_used[0])
+        return response
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    # Accept either a JSON list of patients or {"patients": [...]}
+    with metrics.time('batch_parse'):
+        payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('patients')
+    if not isinstance(payload, list):
+        return jsonify(error='Expected a JSON list of patient records'), 400
+    if len(payload) > MAX_BATCH_SIZE:
+        return jsonify(error=f'Batch too large: at most {MAX_BATCH_SIZE} patients per request'), 413
+
+    # pandas is only needed here, so it is imported on the first batch rather than at startup
+    import pandas as pd
+
+    # Rows that are not JSON objects are reported and skipped
+    errors = {i: ['record must be a JSON object'] for i, row in enumerate(payload) if not isinstance(row, dict)}
+    records = [row if isinstance(row, dict) else {} for row in payload]
+    # Encode every patient in one vectorized pass; bad values come back as NaN
+    with metrics.time('batch_encode'):
+        input_df = pd.DataFrame.from_records(records, columns=feature_cols, index=range(len(records)))
+        input_rows, invalid = schema.encode_frame(input_df)
+
+    # Collect per-row validation errors from the NaN mask
+    for i in np.flatnonzero(invalid.any(axis=1)):
+        if i not in errors:
+            errors[int(i)] = [f'invalid or missing value for {col!r}'
+                              for col, bad in zip(feature_cols, invalid[i]) if bad]
+    valid_index = [i for i in range(len(records)) if i not in errors]
+
+    results = [{'index': i, 'errors': errors[i]} if i in errors else None for i in range(len(records))]
+    if valid_index:
+        # Score every valid patient with a single call each, all with one model
+        model = model_reloader.current
+        valid_rows = input_rows[valid_index]
+        trees_used = None
+        if model.scorer.kind == 'early_exit':
+            with metrics.time('batch_predict_proba'):
+                predictions, probas, trees_used = model.scorer.score(valid_rows)
+        else:
+            with metrics.time('batch_predict'):
+                predictions = model.scorer.predict(valid_rows)
+            with metrics.time('batch_predict_proba'):
+                probas = model.scorer.predict_proba(valid_rows)
+        ckd_probs = probas[:, model.ckd_index]
+        if shadow is not None:
+            shadow.submit(valid_rows, predictions, probas, model.classes)
+
+        for n, (i, pred, prob) in enumerate(zip(valid_index, predictions, ckd_probs)):
+            results[i] = {'index': i, 'is_ckd': bool(pred == model.ckd_class), 'ckd_probability': float(prob)}
+            if trees_used is not None:
+                results[i]['trees_used'] = int(trees_used[n])
+
+    return jsonify(results=results, scored=len(valid_index), failed=len(errors))
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(prediction_cache.stats())
+
+@app.route('/batcher/stats')
+def batcher_stats():
+    if micro_batcher is None:
+        return jsonify(enabled=False)
+    return jsonify(enabled=True, **micro_batcher.stats())
+
+@app.route('/shadow/stats')
+def shadow_stats():
+    if shadow is None:
+        return jsonify(enabled=False)
+    return jsonify(enabled=True, **shadow.stats())
+
+@app.route('/early_exit/stats')
+def early_exit_stats():
+    scorer = model_reloader.current.scorer
+    if scorer.kind != 'early_exit':
+        return jsonify(enabled=False)
+    return jsonify(enabled=True, **scorer.stats())
+
+@app.route('/ready')
+def ready():
+    # Readiness probe: 503 until the first model is loaded, validated and warm
+    status = model_reloader.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/startup/stats')
+def startup_stats():
+    return jsonify(startup.stats())
+
+metrics.attach(app)
+startup.attach(app)
+startup.ready()
 
 if __name__ == "__main__":
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from linear_scorer import LinearSVMScorer
+from scorers import compile_scorer
+from tree_engine import TreeEnsembleScorer
+
+# Where main.py writes the compiled model for the serving apps
+COMPILED_DIR = os.path.join('models', 'compiled')
+MANIFEST = 'manifest.json'
+
+SCORER_KINDS = {cls.kind: cls for cls in (LinearSVMScorer, TreeEnsembleScorer)}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def arrays_digest(arrays):
+    # Content hash of a set of named arrays: names, dtypes, shapes and bytes
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        digest.update(f'{name}:{array.dtype.str}:{array.shape}'.encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def save_artifacts(directory, scorer, sources=(), derived=None):
+    # Write every scorer array as its own uncompressed .npy file so it can be
+    # memory-mapped, plus a manifest recording the scorer kind, its
+    # parameters and the hashes of the joblib files it was compiled from.
+    # `derived` records how a scorer was changed after compiling (trees
+    # dropped or reordered, ...); such artifacts are no longer the joblib
+    # model and are only served from a directory named explicitly
+    if scorer.kind not in SCORER_KINDS:
+        raise ValueError(f"Scorer kind {scorer.kind!r} cannot be saved as compiled artifacts")
+    os.makedirs(directory, exist_ok=True)
+    arrays, params = scorer.to_arrays()
+    # The arrays go into a new directory named after their content, and the
+    # manifest naming it is the only file replaced in place. A reader that
+    # opens the manifest gets arrays from that one version, however the save
+    # interleaves with its loads; files are never rewritten, so servers that
+    # have them memory-mapped are unaffected too
+    arrays_dir = f'arrays-{arrays_digest(arrays)[:16]}'
+    target = os.path.join(directory, arrays_dir)
+    if not os.path.isdir(target):
+        tmp_target = f'{target}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_target, ignore_errors=True)
+        os.makedirs(tmp_target)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_target, f'{name}.npy'), np.ascontiguousarray(array), allow_pickle=False)
+        try:
+            os.replace(tmp_target, target)
+        except OSError:
+            # Another process saved the same arrays first
+            shutil.rmtree(tmp_target, ignore_errors=True)
+
+    try:
+        previous = read_manifest(directory).get('arrays_dir')
+    except (FileNotFoundError, ValueError):
+        previous = None
+    manifest = {
+        'kind': scorer.kind,
+        'params': params,
+        'arrays': sorted(arrays),
+        'arrays_dir': arrays_dir,
+        'sources': {os.path.basename(path): file_sha256(path) for path in sources},
+    }
+    if derived is not None:
+        manifest['derived'] = derived
+    tmp_path = os.path.join(directory, MANIFEST + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST))
+
+    # Keep the arrays the previous manifest named, for readers that opened it
+    # just before the swap; anything older can go, including the .npy files
+    # older manifests kept beside them
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry.startswith('arrays-') and entry not in (arrays_dir, previous) and not entry.endswith('.tmp'):
+            shutil.rmtree(path, ignore_errors=True)
+        elif entry.endswith('.npy') and previous is not None:
+            os.remove(path)
+    return manifest
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return json.load(f)
+
+
+def artifacts_match(directory, sources):
+    # True when the compiled artifacts exist and were built from these exact
+    # files, unchanged
+    try:
+        manifest = read_manifest(directory)
+        if 'derived' in manifest:
+            return False
+        recorded = manifest['sources']
+        return all(recorded.get(os.path.basename(path)) == file_sha256(path) for path in sources)
+    except (FileNotFoundError, KeyError, ValueError):
+        return False
+
+
+def artifacts_version(directory):
+    # Version id of a compiled directory: the hash of its manifest, which
+    # covers the source files and any derivation settings
+    return file_sha256(os.path.join(directory, MANIFEST))[:12]
+
+
+def load_artifacts(directory, mmap_mode='r'):
+    # With mmap_mode='r' the arrays stay in the page cache and every process
+    # that maps them shares one physical copy
+    # Manifests written before arrays_dir existed kept the arrays beside them
+    manifest = read_manifest(directory)
+    arrays_dir = os.path.join(directory, manifest.get('arrays_dir', ''))
+    arrays = {name: np.load(os.path.join(arrays_dir, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+              for name in manifest['arrays']}
+    return SCORER_KINDS[manifest['kind']].from_arrays(arrays, manifest['params'])
+
+
+def load_scorer(model_path, scaler_path, directory=COMPILED_DIR):
+    # Serve from the memory-mapped artifacts when they were compiled from these
+    # exact joblib files; otherwise unpickle the model and compile it in-process
+    if artifacts_match(directory, [model_path, scaler_path]):
+        return load_artifacts(directory)
+    import joblib
+    return compile_scorer(joblib.load(model_path), joblib.load(scaler_path))
@@ -0,0 +1,325 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from serve import cpu_count
+
+# Largest request head and body accepted
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 408: 'Request Timeout',
+           411: 'Length Required', 413: 'Payload Too Large', 429: 'Too Many Requests',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class Overloaded(Exception):
+    # Raised instead of queueing more work; becomes a 429 (admission queue
+    # full) or 503 (waited too long to start) with a Retry-After header
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    # Runs model calls on `workers` threads, with at most `queue_size` more
+    # calls admitted and waiting behind them. Anything beyond that is rejected
+    # straight away, and a call that has waited longer than `queue_timeout`
+    # by the time a thread picks it up is dropped unrun, so a burst costs the
+    # rejected clients a fast error rather than costing everyone latency.
+    # Only ever used from the event loop thread, so the counters need no lock.
+
+    def __init__(self, workers, queue_size, queue_timeout):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        # Moving average of compute time, used to suggest a Retry-After
+        self.compute_ewma = 0.001
+
+    def retry_after(self):
+        # Seconds until the current backlog should have drained, at least 1
+        return max(1, math.ceil(self.admitted * self.compute_ewma / self.workers))
+
+    async def run(self, fn, *args):
+        # (result, seconds queued, seconds computing)
+        if self.admitted >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise Overloaded(429, 'Inference queue is full', self.retry_after())
+
+        enqueued = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            if started - enqueued > self.queue_timeout:
+                return None, started - enqueued, None
+            result = fn(*args)
+            return result, started - enqueued, time.perf_counter() - started
+
+        self.admitted += 1
+        try:
+            result, waited, computed = await asyncio.get_running_loop().run_in_executor(self.pool, job)
+        finally:
+            self.admitted -= 1
+        if computed is None:
+            self.expired += 1
+            raise Overloaded(503, f'Waited {waited * 1000:.0f} ms for an inference thread', self.retry_after())
+        self.completed += 1
+        self.compute_ewma += 0.1 * (computed - self.compute_ewma)
+        return result, waited, computed
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'queue_timeout_ms': self.queue_timeout * 1000,
+            'in_flight': self.admitted,
+            'completed': self.completed,
+            'rejected_queue_full': self.rejected,
+            'expired_in_queue': self.expired,
+            'compute_ewma_ms': self.compute_ewma * 1000,
+        }
+
+
+class AsyncServer:
+    # asyncio HTTP/1.1 front end for app.py's model: the event loop only
+    # parses, encodes and answers requests, and every model call goes through
+    # the bounded InferenceExecutor. /predict answers with JSON.
+
+    def __init__(self, ckd_app, executor):
+        self.ckd_app = ckd_app
+        self.executor = executor
+        self.metrics = ckd_app.metrics
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except asyncio.LimitOverrunError:
+                    await self.send(writer, 400, {'error': 'Request head too large'}, keep_alive=False)
+                    break
+                keep_alive = await self.handle_request(head, reader, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, head, reader, writer):
+        # Parse one request, answer it and say whether the connection stays open
+        start = time.perf_counter()
+        try:
+            request_line, *header_lines = head.decode('latin-1').split('\r\n')
+            method, target, version = request_line.split(' ', 2)
+        except ValueError:
+            await self.send(writer, 400, {'error': 'Malformed request line'}, keep_alive=False)
+            return False
+        headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close')
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            await self.send(writer, 411, {'error': 'Send a Content-Length'}, keep_alive=False)
+            return False
+        try:
+            length = int(headers.get('content-length') or 0)
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            await self.send(writer, 400, {'error': 'Invalid Content-Length'}, keep_alive=False)
+            return False
+        if length > MAX_BODY_BYTES:
+            await self.send(writer, 413, {'error': 'Request body too large'}, keep_alive=False)
+            return False
+        body = await reader.readexactly(length) if length else b''
+
+        path = urlsplit(target).path
+        extra_headers = {}
+        try:
+            status, payload, extra_headers = await self.route(method, path, headers, body)
+        except Overloaded as e:
+            status, payload = e.status, {'error': str(e)}
+            extra_headers = {'Retry-After': str(e.retry_after)}
+        except ValueError as e:
+            status, payload = 400, {'error': str(e)}
+        except Exception as e:
+            status, payload = 500, {'error': f'{type(e).__name__}: {e}'}
+
+        await self.send(writer, status, payload, extra_headers, keep_alive)
+        if path != '/metrics':
+            self.metrics.observe('request', time.perf_counter() - start)
+            self.metrics.count_request(path if status != 404 else 'unmatched', status)
+        return keep_alive
+
+    async def route(self, method, path, headers, body):
+        # (status, JSON payload or text, extra headers)
+        routes = {
+            ('POST', '/predict'): self.predict,
+            ('POST', '/predict/batch'): self.predict_batch,
+            ('GET', '/ready'): self.ready,
+            ('GET', '/metrics'): self.metrics_text,
+            ('GET', '/admission/stats'): self.admission_stats,
+        }
+        handler = routes.get((method, path))
+        if handler is None:
+            known = any(route_path == path for _, route_path in routes)
+            return (405, {'error': f'{method} not allowed'}, {}) if known else (404, {'error': 'Not found'}, {})
+        return await handler(headers, body)
+
+    def parse_body(self, headers, body):
+        # A JSON document or an urlencoded form
+        if headers.get('content-type', '').startswith('application/json'):
+            try:
+                return json.loads(body or b'null')
+            except json.JSONDecodeError as e:
+                raise ValueError(f'Invalid JSON: {e}') from None
+        return dict(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+
+    @staticmethod
+    def score(scorer, rows):
+        # (labels, probabilities) exactly as app.py gets them: the scorer's own
+        # predict (one-vs-one voting for an SVM need not match the argmax of
+        # predict_proba), in one pass for an early-exit forest
+        if scorer.kind == 'early_exit':
+            labels, probas, _ = scorer.score(rows)
+            return labels, probas
+        return scorer.predict(rows), scorer.predict_proba(rows)
+
+    def timing_headers(self, waited, computed):
+        self.metrics.observe('queue_wait', waited)
+        self.metrics.observe('compute', computed)
+        return {'X-Queue-Wait-Ms': f'{waited * 1000:.3f}', 'X-Compute-Ms': f'{computed * 1000:.3f}'}
+
+    async def predict(self, headers, body):
+        with self.metrics.time('parse'):
+            form = self.parse_body(headers, body)
+        if not isinstance(form, dict):
+            raise ValueError('Expected a JSON object or a form with the patient fields')
+        with self.metrics.time('encode'):
+            row = self.ckd_app.schema.encode({key.lower(): str(value) for key, value in form.items()})
+
+        # One model for the whole request, scored on an inference thread
+        model = self.ckd_app.model_reloader.current
+        (labels, probas), waited, computed = await self.executor.run(self.score, model.scorer, row)
+        ckd_prob = float(probas[0][model.ckd_index])
+        return 200, {'is_ckd': bool(labels[0] == model.ckd_class), 'ckd_probability': ckd_prob,
+                     'model_version': model.version}, self.timing_headers(waited, computed)
+
+    async def predict_batch(self, headers, body):
+        with self.metrics.time('batch_parse'):
+            payload = self.parse_body({'content-type': 'application/json'}, body)
+        if isinstance(payload, dict):
+            payload = payload.get('patients')
+        if not isinstance(payload, list):
+            raise ValueError('Expected a JSON list of patient records')
+        if len(payload) > self.ckd_app.MAX_BATCH_SIZE:
+            return 413, {'error': f'Batch too large: at most {self.ckd_app.MAX_BATCH_SIZE} patients per request'}, {}
+
+        # Encode row by row on the loop; invalid rows are reported, not scored
+        results, rows, valid_index = [None] * len(payload), [], []
+        with self.metrics.time('batch_encode'):
+            for i, record in enumerate(payload):
+                if not isinstance(record, dict):
+                    results[i] = {'index': i, 'errors': ['record must be a JSON object']}
+                    continue
+                try:
+                    rows.append(self.ckd_app.schema.encode({key.lower(): str(value) for key, value in record.items()})[0])
+                    valid_index.append(i)
+                except ValueError as e:
+                    results[i] = {'index': i, 'errors': [str(e)]}
+
+        extra_headers = {}
+        if rows:
+            model = self.ckd_app.model_reloader.current
+            (labels, probas), waited, computed = await self.executor.run(self.score, model.scorer, np.vstack(rows))
+            for i, label, prob in zip(valid_index, labels, probas[:, model.ckd_index]):
+                results[i] = {'index': i, 'is_ckd': bool(label == model.ckd_class), 'ckd_probability': float(prob)}
+            extra_headers = self.timing_headers(waited, computed)
+        return 200, {'results': results, 'scored': len(valid_index),
+                     'failed': len(payload) - len(valid_index)}, extra_headers
+
+    async def ready(self, headers, body):
+        status = self.ckd_app.model_reloader.status()
+        return 200 if status['ready'] else 503, status, {}
+
+    async def metrics_text(self, headers, body):
+        return 200, self.metrics.render(), {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    async def admission_stats(self, headers, body):
+        return 200, self.executor.stats(), {}
+
+    async def send(self, writer, status, payload, extra_headers=None, keep_alive=True):
+        if isinstance(payload, str):
+            body = payload.encode('utf-8')
+            content_type = 'text/plain; charset=utf-8'
+        else:
+            body = json.dumps(payload).encode('utf-8')
+            content_type = 'application/json'
+        headers = {'Content-Type': content_type, 'Content-Length': str(len(body)),
+                   'Connection': 'keep-alive' if keep_alive else 'close'}
+        headers.update(extra_headers or {})
+        head = f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+        head += ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+        writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await writer.drain()
+
+
+def parse_args():
+    workers = cpu_count()
+    parser = argparse.ArgumentParser(
+        description="asyncio server for the CKD model with a bounded inference executor and backpressure")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=workers,
+                        help=f"inference threads (default: one per usable CPU, {workers} here)")
+    parser.add_argument('--queue-size', type=int, default=None,
+                        help="model calls allowed to wait for a thread before new ones get 429 (default: 4 per thread)")
+    parser.add_argument('--queue-timeout-ms', type=float, default=500,
+                        help="a call still waiting after this long is dropped with 503")
+    return parser.parse_args()
+
+
+async def serve(args):
+    # Load the model, reloader and metrics exactly as app.py does
+    import app as ckd_app
+
+    executor = InferenceExecutor(args.workers, args.queue_size if args.queue_size is not None else 4 * args.workers,
+                                 args.queue_timeout_ms / 1000)
+    server = AsyncServer(ckd_app, executor)
+    listener = await asyncio.start_server(server.handle_connection, args.host, args.port,
+                                          limit=MAX_HEADER_BYTES, backlog=1024)
+    port = listener.sockets[0].getsockname()[1]
+    print(f"Serving on http://{args.host}:{port} with {executor.workers} inference threads and "
+          f"{executor.queue_size} queue slots")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    args = parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+import warnings
+from urllib.parse import parse_qsl, urlencode
+
+import numpy as np
+import pandas as pd
+
+from feature_schema import FEATURE_COLS, FeatureSchema, label_encoder_codes
+from scorers import compile_scorer
+from training import DATA_PATH, build_models, load_dataset, prepare_data, train_sequential
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+
+
+def parse_sizes(text):
+    return [int(size) for size in text.split(',') if size]
+
+
+def time_stage(fn, repeat, min_time):
+    # timeit-style: pick a loop count that runs for at least `min_time`, then
+    # take `repeat` samples of it; report seconds per call
+    timer = timeit.Timer(fn)
+    loops = 1
+    while True:
+        elapsed = timer.timeit(loops)
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= max(2, int(min_time / max(elapsed, 1e-9)))
+    samples = [elapsed / loops] + [t / loops for t in timer.repeat(repeat - 1, loops)]
+    return {'median_s': float(np.median(samples)), 'min_s': float(np.min(samples)), 'loops': loops,
+            'repeat': repeat}
+
+
+def load_forms(path, n, seed=0):
+    # URL-encoded form bodies built from real patient rows, as the browser posts them
+    raw = pd.read_csv(path)
+    raw.columns = raw.columns.str.lower()
+    raw = raw[FEATURE_COLS].astype(str).apply(lambda col: col.str.strip())
+    records = raw.to_dict('records')
+    picks = np.random.default_rng(seed).integers(0, len(records), size=n)
+    return [urlencode(records[i]) for i in picks]
+
+
+def pipeline_stages(schema, forms, scaler, X_raw):
+    # Stages of the /predict paths that don't depend on the model
+    parsed = [dict(parse_qsl(body)) for body in forms]
+    frame = pd.DataFrame.from_records(parsed, columns=FEATURE_COLS)
+    row = schema.new_row()
+
+    def encode_rows():
+        for form in parsed:
+            schema.encode(form, out=row)
+
+    return {
+        'parse': lambda: [dict(parse_qsl(body)) for body in forms],
+        'encode': encode_rows,
+        'encode_batch': lambda: schema.encode_frame(frame),
+        'scale': lambda: scaler.transform(X_raw),
+    }
+
+
+def model_stages(model, scaler, X_raw):
+    # predict / predict_proba through the original sklearn estimator (on
+    # scaled rows) and through the compiled scorer the apps use (on raw rows)
+    X_scaled = scaler.transform(X_raw)
+    stages = {
+        ('sklearn', 'predict'): lambda: model.predict(X_scaled),
+        ('sklearn', 'predict_proba'): lambda: model.predict_proba(X_scaled),
+    }
+    scorer = compile_scorer(model, scaler)
+    if scorer.kind != 'sklearn':
+        stages[(scorer.kind, 'predict')] = lambda: scorer.predict(X_raw)
+        stages[(scorer.kind, 'predict_proba')] = lambda: scorer.predict_proba(X_raw)
+    return stages
+
+
+def render_stages():
+    # Page rendering exactly as each app does it after a prediction
+    import app as app_module
+    import hello
+    from flask import render_template
+
+    def render_app():
+        with app_module.app.test_request_context():
+            render_template('index.html', prediction=[True], ckd_prob=62.0, non_ckd_prob=38.0, probability=62.0)
+
+    def render_hello():
+        with hello.app.test_request_context():
+            render_template(hello.page_template, result_template=hello.result_template, prediction=np.array([0]),
+                            probability=62.0, ckd_prob=62.0, non_ckd_prob=38.0, error=None)
+
+    return {'render_app': render_app, 'render_hello': render_hello}
+
+
+def record(results, stage, model, engine, batch_size, timing):
+    per_call = timing['median_s']
+    results.append({'stage': stage, 'model': model, 'engine': engine, 'batch_size': batch_size, **timing,
+                    'rows_per_s': batch_size / per_call if per_call > 0 else None})
+    print(f"{stage:>14} {model or '-':>14} {engine or '-':>13} n={batch_size:<7} "
+          f"{per_call * 1e6:12.1f} us/call", file=sys.stderr)
+
+
+def run(args):
+    df = load_dataset(args.data)
+    X, y, scaler, X_train, X_test, y_train, y_test = prepare_data(df)
+    results_by_name = train_sequential(build_models(), X_train, y_train, X_test, y_test)
+    models = {name: model for name, model, _, _ in results_by_name if not args.models or name in args.models}
+
+    schema = FeatureSchema(FEATURE_COLS, label_encoder_codes())
+    X_all = X.to_numpy(dtype=np.float64)
+    rng = np.random.default_rng(0)
+    results = []
+
+    with warnings.catch_warnings():
+        # scaler.transform on a bare ndarray warns about missing feature names
+        warnings.simplefilter('ignore', UserWarning)
+        for batch_size in args.batch_sizes:
+            X_raw = X_all[rng.integers(0, len(X_all), size=batch_size)]
+            forms = load_forms(args.data, batch_size)
+            for stage, fn in pipeline_stages(schema, forms, scaler, X_raw).items():
+                record(results, stage, None, None, batch_size, time_stage(fn, args.repeat, args.min_time))
+            for name, model in models.items():
+                for (engine, stage), fn in model_stages(model, scaler, X_raw).items():
+                    record(results, stage, name, engine, batch_size, time_stage(fn, args.repeat, args.min_time))
+
+        # Rendering happens once per request whatever the batch size, so it is timed once
+        if not args.skip_render:
+            for stage, fn in render_stages().items():
+                record(results, stage, None, None, 1, time_stage(fn, args.repeat, args.min_time))
+
+    report = {
+        'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                 'numpy': np.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+                 'batch_sizes': args.batch_sizes, 'repeat': args.repeat},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} timings to {args.output}", file=sys.stderr)
+
+
+def result_key(result):
+    return (result['stage'], result['model'], result['engine'], result['batch_size'])
+
+
+def compare(args):
+    # Ratio of new to baseline median time for every timing both files share;
+    # ratios above 1 + threshold are regressions and make the exit status 1
+    with open(args.baseline) as f:
+        baseline = {result_key(r): r for r in json.load(f)['results']}
+    with open(args.current) as f:
+        current = {result_key(r): r for r in json.load(f)['results']}
+
+    rows = []
+    for key in sorted(baseline.keys() & current.keys(), key=lambda k: tuple(str(part) for part in k)):
+        old, new = baseline[key]['median_s'], current[key]['median_s']
+        ratio = new / old if old > 0 else float('inf')
+        status = 'regression' if ratio > 1 + args.threshold else 'improvement' if ratio < 1 - args.threshold else 'same'
+        rows.append({'stage': key[0], 'model': key[1], 'engine': key[2], 'batch_size': key[3],
+                     'baseline_s': old, 'current_s': new, 'ratio': ratio, 'status': status})
+
+    if args.json:
+        print(json.dumps({'threshold': args.threshold, 'comparisons': rows}, indent=2))
+    else:
+        for row in rows:
+            print(f"{row['stage']:>14} {row['model'] or '-':>14} {row['engine'] or '-':>13} n={row['batch_size']:<7} "
+                  f"{row['baseline_s'] * 1e6:12.1f} -> {row['current_s'] * 1e6:12.1f} us  "
+                  f"x{row['ratio']:.2f}  {row['status']}")
+    regressions = sum(row['status'] == 'regression' for row in rows)
+    print(f"{len(rows)} timings compared, {regressions} regressions over {args.threshold:.0%}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each stage of the /predict paths in isolation")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the benchmarks and write a JSON report")
+    run_parser.add_argument('--data', default=DATA_PATH)
+    run_parser.add_argument('--output', '-o', default='bench_stages.json')
+    run_parser.add_argument('--batch-sizes', type=parse_sizes, default=BATCH_SIZES,
+                            help="comma-separated batch sizes (default: 1,10,...,100000)")
+    run_parser.add_argument('--models', nargs='*', help="candidate models to include (default: all)")
+    run_parser.add_argument('--repeat', type=int, default=5, help="timing samples per stage")
+    run_parser.add_argument('--min-time', type=float, default=0.05, help="seconds each sample runs for at least")
+    run_parser.add_argument('--skip-render', action='store_true', help="don't import the apps to time rendering")
+
+    compare_parser = commands.add_parser('compare', help="compare two JSON reports")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help="relative slowdown counted as a regression (default 0.10)")
+    compare_parser.add_argument('--json', action='store_true', help="print the comparison as JSON")
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+
+from artifacts import artifacts_version, file_sha256, load_artifacts, save_artifacts
+from model_reloader import ckd_class_for
+from tree_engine import TreeEnsembleScorer
+
+OUTPUT_DIR = os.path.join('models', 'compacted')
+# Where --install writes the forest to serve (CKD_ARTIFACTS_DIR=models/serving/compacted python app.py)
+INSTALL_DIR = os.path.join('models', 'serving', 'compacted')
+
+# Keeps log loss finite when a subset gives a true class zero probability
+EPSILON = 1e-6
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Shrink the trained forest: greedy tree selection, subtree collapsing and float32 nodes")
+    parser.add_argument('--model', default='best_model.joblib')
+    parser.add_argument('--scaler', default='scaler.joblib')
+    parser.add_argument('--data', default='cleaned_ckd_data.csv')
+    parser.add_argument('--sizes', type=lambda s: [int(n) for n in s.split(',')], default=[5, 10, 20, 30, 50],
+                        help="forest sizes to report, comma separated (the full forest is always included)")
+    parser.add_argument('--collapse', choices=['none', 'identical', 'label'], default='label',
+                        help="collapse subtrees whose leaves all have identical distributions, or all the same "
+                             "majority class (label)")
+    parser.add_argument('--dtype', choices=['float32', 'float64'], default='float32',
+                        help="storage for leaf values, and for thresholds when no row changes leaf")
+    parser.add_argument('--tolerance', type=float, default=1e-6,
+                        help="largest probability change float32 storage may cause on any dataset row")
+    parser.add_argument('--repeat', type=int, default=2000, help="single-row calls timed for the p99 latency")
+    parser.add_argument('-o', '--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--install', type=int, default=None, metavar='SIZE',
+                        help="write the compacted forest of this size to --install-dir for app.py to serve")
+    parser.add_argument('--install-dir', default=INSTALL_DIR)
+    return parser.parse_args(argv)
+
+
+def tree_probas(scorer, X):
+    # Every tree's class distribution for every row, shape (n_trees, n_samples, n_classes)
+    return scorer.value.take(scorer.apply(X), axis=0)
+
+
+def greedy_order(scorer, X_val, y_val):
+    # Forward selection: start empty and keep adding the tree that gives the
+    # averaged ensemble the lowest validation log loss. Any prefix of the
+    # returned order is that size's selection
+    probas = tree_probas(scorer, X_val)
+    targets = np.searchsorted(scorer.classes_, y_val)
+    # Probability each tree gives each row's true class, shape (n_trees, n_samples)
+    true_class = probas[:, np.arange(len(y_val)), targets]
+
+    order, remaining = [], list(range(scorer.n_trees))
+    total = np.zeros(len(y_val))
+    while remaining:
+        candidates = (total + true_class[remaining]) / (len(order) + 1)
+        losses = -np.log(np.maximum(candidates, EPSILON)).mean(axis=1)
+        best = remaining.pop(int(np.argmin(losses)))
+        order.append(best)
+        total += true_class[best]
+    return order
+
+
+def is_leaf(scorer, node):
+    return scorer.children[2 * node] == node
+
+
+def collapsed_value(scorer, node, mode, values):
+    # Post-order walk filling `values[node]` with the distribution the subtree
+    # can be replaced by, or None when its leaves disagree
+    if is_leaf(scorer, node):
+        values[node] = scorer.value[node]
+        return values[node]
+    right = collapsed_value(scorer, scorer.children[2 * node], mode, values)
+    left = collapsed_value(scorer, scorer.children[2 * node + 1], mode, values)
+    if right is None or left is None:
+        values[node] = None
+    elif mode == 'identical':
+        values[node] = left if np.array_equal(left, right) else None
+    else:
+        # The node's own value is the training mix of its leaves, so its
+        # majority class is the one every leaf agrees on
+        values[node] = scorer.value[node] if np.argmax(left) == np.argmax(right) else None
+    return values[node]
+
+
+def rebuild(scorer, trees, collapse='none', dtype=np.float64, threshold_dtype=None):
+    # A new TreeEnsembleScorer holding only `trees`, with collapsible subtrees
+    # turned into leaves and unreachable nodes dropped. Leaf values are stored
+    # as `dtype`, thresholds as `threshold_dtype` (default: the same)
+    threshold_dtype = dtype if threshold_dtype is None else threshold_dtype
+    features, thresholds, children, values, roots, depths = [], [], [], [], [], []
+    for tree in trees:
+        root = int(scorer.roots[tree])
+        collapsed = {}
+        if collapse != 'none':
+            collapsed_value(scorer, root, collapse, collapsed)
+
+        # Renumber the reachable nodes breadth first
+        offset = len(features)
+        new_id = {root: offset}
+        queue = [(root, 0)]
+        depth = 0
+        for node, level in queue:
+            depth = max(depth, level)
+            value = collapsed.get(node)
+            if value is not None or is_leaf(scorer, node):
+                this = new_id[node]
+                features.append(0)
+                thresholds.append(np.inf)
+                children.append((this, this))
+                values.append(scorer.value[node] if value is None else value)
+                continue
+            right, left = int(scorer.children[2 * node]), int(scorer.children[2 * node + 1])
+            for child in (right, left):
+                new_id[child] = offset + len(new_id)
+                queue.append((child, level + 1))
+            features.append(scorer.feature[node])
+            thresholds.append(scorer.threshold[node])
+            children.append((new_id[right], new_id[left]))
+            values.append(scorer.value[node])
+        roots.append(offset)
+        depths.append(depth)
+
+    threshold = np.array(thresholds, dtype=np.float64)
+    if threshold_dtype == np.float32:
+        # Round thresholds up so x <= t keeps holding for every x it held for;
+        # only an x in the sliver between the float64 and the float32 value
+        # now goes left instead of right
+        rounded = threshold.astype(np.float32)
+        too_low = rounded.astype(np.float64) < threshold
+        rounded[too_low] = np.nextafter(rounded[too_low], np.float32(np.inf))
+        threshold = rounded
+
+    feature = np.array(features, dtype=np.min_scalar_type(max(int(scorer.feature.max(initial=0)), 1)))
+    return TreeEnsembleScorer(scorer.classes_, feature, threshold,
+                              np.array(children, dtype=np.int32).ravel(), np.array(values, dtype=dtype),
+                              np.array(roots, dtype=np.int32), np.array(depths), scorer.average or len(trees) > 1)
+
+
+def rows_moved(reference, scorer, X):
+    # Rows that reach a different leaf in at least one tree (both scorers hold
+    # the same trees, numbered the same way)
+    return int((reference.apply(X) != scorer.apply(X)).any(axis=0).sum())
+
+
+def compact(scorer, trees, collapse, dtype, X, tolerance):
+    # rebuild() checked against the same trees in float64 on every row of X.
+    # float32 thresholds are only kept when no row changes leaf: raw-space
+    # thresholds can sit closer to real values than float32 resolves. Anything
+    # still off by more than `tolerance` in probability is refused
+    point = rebuild(scorer, trees, collapse, dtype)
+    if dtype != np.float32:
+        return point
+    reference = rebuild(scorer, trees, collapse)
+    moved = rows_moved(reference, point, X)
+    if moved:
+        print(f"{len(trees)} trees: float32 thresholds move {moved} of {len(X)} rows to other leaves; "
+              f"keeping float64 thresholds")
+        point = rebuild(scorer, trees, collapse, dtype, threshold_dtype=np.float64)
+    changed, max_error = check_parity(reference, point, X)
+    print(f"{len(trees)} trees, float32 vs float64 on all {len(X)} rows: {changed} labels changed, "
+          f"max probability error {max_error:.2e}")
+    if changed or max_error > tolerance:
+        raise SystemExit(f"float32 storage changes the {len(trees)}-tree forest by {max_error:.2e} "
+                         f"({changed} labels); use --dtype float64 or raise --tolerance")
+    return point
+
+
+def check_parity(reference, scorer, X):
+    # (rows whose label differs, max probability error) of `scorer` against
+    # the same trees stored as float64
+    labels = reference.predict(X) != scorer.predict(X)
+    return int(labels.sum()), float(np.abs(reference.predict_proba(X) - scorer.predict_proba(X)).max())
+
+
+def evaluate(scorer, X, y):
+    # Accuracy and CKD-vs-rest ROC AUC
+    from sklearn.metrics import roc_auc_score
+
+    probas = scorer.predict_proba(X)
+    ckd_class = ckd_class_for(scorer.classes_)
+    ckd_index = int(np.where(scorer.classes_ == ckd_class)[0][0])
+    accuracy = float((scorer.classes_.take(np.argmax(probas, axis=1)) == y).mean())
+    is_ckd = y == ckd_class
+    auc = roc_auc_score(is_ckd, probas[:, ckd_index]) if 0 < is_ckd.sum() < len(y) else float('nan')
+    return accuracy, auc
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def measure(directory, X, repeat):
+    # Artifact size on disk, time to read it into memory and score one row,
+    # and the p99 of single-row predict_proba calls
+    load_times = []
+    for _ in range(20):
+        start = time.perf_counter()
+        scorer = load_artifacts(directory, mmap_mode=None)
+        scorer.predict_proba(X[:1])
+        load_times.append(time.perf_counter() - start)
+
+    rows = [X[i:i + 1] for i in range(len(X))]
+    for row in rows[:50]:
+        scorer.predict_proba(row)
+    latencies = np.empty(repeat)
+    for i in range(repeat):
+        row = rows[i % len(rows)]
+        start = time.perf_counter()
+        scorer.predict_proba(row)
+        latencies[i] = time.perf_counter() - start
+    return directory_size(directory), float(np.median(load_times)), float(np.percentile(latencies, 99))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    import joblib
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    from training import holdout_indices, read_dataset
+
+    model, scaler = joblib.load(args.model), joblib.load(args.scaler)
+    scorer = TreeEnsembleScorer.from_sklearn(model, scaler)
+
+    # The forest never saw main.py's test split: half of it picks the trees,
+    # the other half measures the result
+    df = read_dataset(args.data)
+    X = df.drop(columns=['classification']).to_numpy(dtype=np.float64)
+    y = df['classification'].to_numpy()
+    _, test = holdout_indices(df['classification'])
+    val, test = train_test_split(test, test_size=0.5, random_state=0)
+    X_val, y_val, X_test, y_test = X[val], y[val], X[test], y[test]
+
+    order = greedy_order(scorer, X_val, y_val)
+    sizes = sorted({n for n in args.sizes if 0 < n < scorer.n_trees} | {scorer.n_trees})
+    dtype = np.float32 if args.dtype == 'float32' else np.float64
+
+    compacted = {n: compact(scorer, order[:n], args.collapse, dtype, X, args.tolerance) for n in sizes}
+    points = [('original', scorer)] + [(f'{n} trees', compacted[n]) for n in sizes]
+
+    print(f"Selection on {len(val)} rows, evaluation on {len(test)} held-out rows; "
+          f"collapse={args.collapse}, {args.dtype} nodes")
+    print(f"{'':<12}{'nodes':>7}{'size KiB':>10}{'load ms':>9}{'p99 us':>8}{'accuracy':>10}{'AUC':>8}")
+    if os.path.isdir(args.output_dir):
+        shutil.rmtree(args.output_dir)
+    results = []
+    for label, point in points:
+        directory = os.path.join(args.output_dir, label.split()[0])
+        save_artifacts(directory, point)
+        size, load_seconds, p99 = measure(directory, X_test if len(X_test) else X, args.repeat)
+        accuracy, auc = evaluate(point, X_test, y_test)
+        results.append({'label': label, 'nodes': len(point.feature), 'size_bytes': size, 'load_ms': load_seconds * 1000,
+                        'p99_us': p99 * 1e6, 'accuracy': accuracy, 'auc': auc})
+        print(f"{label:<12}{len(point.feature):>7}{size / 1024:>10.1f}{load_seconds * 1000:>9.2f}{p99 * 1e6:>8.0f}"
+              f"{accuracy * 100:>9.2f}%{auc:>8.4f}")
+
+    pd.DataFrame(results).to_csv(os.path.join(args.output_dir, 'report.csv'), index=False)
+
+    if args.install is not None:
+        if args.install not in sizes:
+            raise SystemExit(f"--install {args.install} is not one of the reported sizes {sizes}")
+        chosen = compacted[args.install]
+        # Not the joblib model any more: the manifest records how it was cut
+        # down, which also gives it its own version id, and app.py only serves
+        # it when pointed at this directory. The arrays go to a new
+        # directory and the manifest is swapped last, so a server reloading
+        # mid-install loads either the old forest or the new one
+        save_artifacts(args.install_dir, chosen, sources=[args.model, args.scaler], derived={
+            'tool': 'compact_forest',
+            'trees': [int(tree) for tree in order[:args.install]],
+            'collapse': args.collapse,
+            'dtype': args.dtype,
+            'threshold_dtype': str(chosen.threshold.dtype),
+            'data_sha256': file_sha256(args.data),
+        })
+        print(f"✅ Installed the {args.install}-tree forest in {args.install_dir} as version "
+              f"{artifacts_version(args.install_dir)}; serve it with CKD_ARTIFACTS_DIR={args.install_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from artifacts import file_sha256
+
+CACHE_DIR = os.path.join('.cache', 'dataset')
+META = 'meta.json'
+
+# Bump when the encoding in training.read_dataset changes so old entries are ignored
+FORMAT_VERSION = 2
+
+
+class DatasetCache:
+    # Encoded copies of a CSV stored column by column as uncompressed .npy
+    # files, one directory per CSV content hash. Loading memory-maps the
+    # columns, so nothing is parsed or re-encoded until the CSV itself changes.
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    def _entry(self, digest):
+        return os.path.join(self.directory, f'{digest}-v{FORMAT_VERSION}')
+
+    def _stat_path(self, path):
+        name = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()
+        return os.path.join(self.directory, 'stat', f'{name}.json')
+
+    @staticmethod
+    def _stamp(path):
+        info = os.stat(path)
+        return [info.st_size, info.st_mtime_ns, info.st_ino]
+
+    def digest(self, path):
+        # Content hash of the CSV, reused without reading the file while its
+        # size, mtime and inode match the ones recorded when it was last hashed
+        stamp = self._stamp(path)
+        stat_path = self._stat_path(path)
+        try:
+            with open(stat_path) as f:
+                recorded = json.load(f)
+            if recorded['stamp'] == stamp:
+                return recorded['sha256']
+        except (FileNotFoundError, KeyError, ValueError):
+            pass
+        digest = file_sha256(path)
+        os.makedirs(os.path.dirname(stat_path), exist_ok=True)
+        tmp_path = f'{stat_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'path': os.path.abspath(path), 'stamp': stamp, 'sha256': digest}, f)
+        os.replace(tmp_path, stat_path)
+        return digest
+
+    def load(self, digest, mmap_mode='r'):
+        entry = self._entry(digest)
+        try:
+            with open(os.path.join(entry, META)) as f:
+                meta = json.load(f)
+            columns = meta['columns']
+            data = {col: np.load(os.path.join(entry, f'{i}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+                    for i, col in enumerate(columns)}
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+        df = pd.DataFrame(data, columns=columns, copy=False)
+        df.attrs.update(meta.get('attrs', {}))
+        return df
+
+    def save(self, digest, df, source=None):
+        # Build the entry in a scratch directory and rename it into place, so a
+        # reader never sees a partly written dataset
+        entry = self._entry(digest)
+        tmp_entry = f'{entry}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        os.makedirs(tmp_entry)
+        for i, col in enumerate(df.columns):
+            np.save(os.path.join(tmp_entry, f'{i}.npy'), np.ascontiguousarray(df[col].to_numpy()), allow_pickle=False)
+        meta = {'columns': list(df.columns), 'rows': len(df), 'sha256': digest, 'source': source,
+                'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()}, 'attrs': df.attrs}
+        with open(os.path.join(tmp_entry, META), 'w') as f:
+            json.dump(meta, f, indent=2)
+        try:
+            os.replace(tmp_entry, entry)
+        except OSError:
+            # Another process finished the same entry first
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+
+def load_encoded(path, encode, cache=None):
+    # Return encode(path) for this CSV, from the cache when its content hash
+    # has been seen before; `encode` is only called on a miss
+    cache = cache if cache is not None else DatasetCache()
+    digest = cache.digest(path)
+    df = cache.load(digest)
+    if df is None:
+        df = encode(path)
+        cache.save(digest, df, source=os.path.basename(path))
+    df.attrs['sha256'] = digest
+    return df
@@ -0,0 +1,251 @@
+import argparse
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from artifacts import artifacts_version, file_sha256, save_artifacts
+
+# Where --install writes the reordered forest (CKD_ARTIFACTS_DIR=models/serving/early_exit python app.py)
+INSTALL_DIR = os.path.join('models', 'serving', 'early_exit')
+
+
+class EarlyExitScorer:
+    # Evaluates a forest tree by tree, in the order they are stored, and stops
+    # for each row as soon as its class is settled:
+    #   - exactly, once the remaining trees could not overturn the leading
+    #     class even if every one of them voted for the runner-up, or
+    #   - with `delta`, once a Hoeffding bound says the full forest would pick
+    #     the same class with probability at least 1 - delta (trees treated as
+    #     independent draws of the vote margin).
+    # Labels match the full forest in exact mode. Probabilities are the
+    # average over the trees evaluated, so they can differ from the full forest.
+    #
+    # A single row walks the trees in plain Python, checking after every tree.
+    # Batches are walked with NumPy in blocks that double in size (min_trees,
+    # 2 * min_trees, ...), checking between blocks, so rows that stay
+    # undecided cost only a handful of extra passes.
+
+    kind = 'early_exit'
+
+    def __init__(self, scorer, delta=None, min_trees=8):
+        if scorer.kind != 'tree_ensemble' or not scorer.average:
+            raise ValueError("Early exit needs a compiled random forest")
+        self.scorer = scorer
+        self.classes_ = scorer.classes_
+        self.delta = delta
+        self.n_trees = scorer.n_trees
+        self.min_trees = max(1, min(min_trees, self.n_trees))
+
+        # Lead (in votes per tree) that settles a row after t trees; index 0 is unused
+        self.bounds = [math.inf] + [math.sqrt(2 * math.log(1 / delta) / t) if delta is not None else math.inf
+                                    for t in range(1, self.n_trees + 1)]
+
+        # (first tree, end tree, depth) for each NumPy block
+        self.blocks = []
+        start, size = 0, self.min_trees
+        while start < self.n_trees:
+            end = min(start + size, self.n_trees)
+            self.blocks.append((start, end, int(scorer.depths[start:end].max(initial=0))))
+            start, size = end, size * 2
+
+        # Python lists for the single-row walk, where indexing NumPy arrays
+        # element by element would be slower than the whole vectorized pass
+        self.roots = scorer.roots.tolist()
+        self.feature = scorer.feature.tolist()
+        self.threshold = scorer.threshold.tolist()
+        self.right = scorer.children[0::2].tolist()
+        self.left = scorer.children[1::2].tolist()
+        self.value = scorer.value.tolist()
+
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.trees_evaluated = 0
+
+    def _settled(self, first, second, evaluated):
+        gap = first - second
+        return (gap > self.n_trees - evaluated) | (gap / evaluated > self.bounds[evaluated])
+
+    def _score_row(self, x):
+        # Walk one tree at a time; returns (class distribution sums, trees used)
+        feature, threshold, left, right, value = self.feature, self.threshold, self.left, self.right, self.value
+        totals = [0.0] * len(self.classes_)
+        for evaluated, node in enumerate(self.roots, 1):
+            while right[node] != node:
+                node = left[node] if x[feature[node]] <= threshold[node] else right[node]
+            for k, p in enumerate(value[node]):
+                totals[k] += p
+            if evaluated >= self.min_trees and evaluated < self.n_trees:
+                ranked = sorted(totals)
+                if self._settled(ranked[-1], ranked[-2], evaluated):
+                    return totals, evaluated
+        return totals, self.n_trees
+
+    def _block_sum(self, X, start, end, depth):
+        # Sum of the class distributions of trees [start, end) for every row
+        scorer = self.scorer
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = np.tile(np.arange(n_samples) * n_features, end - start)
+        node = np.repeat(scorer.roots[start:end], n_samples)
+        for _ in range(depth):
+            go_left = flat_X.take(row_offsets + scorer.feature.take(node)) <= scorer.threshold.take(node)
+            node = scorer.children.take(node * 2 + go_left)
+        return scorer.value.take(node.reshape(end - start, n_samples), axis=0).sum(axis=0)
+
+    def score(self, X):
+        # (labels, probabilities, trees evaluated per row)
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.shape[0] == 1:
+            totals, used = self._score_row(X[0].tolist())
+            totals, used = np.array([totals]), np.array([used])
+        else:
+            totals = np.zeros((X.shape[0], len(self.classes_)))
+            used = np.zeros(X.shape[0], dtype=np.int64)
+            active = np.arange(X.shape[0])
+            for start, end, depth in self.blocks:
+                totals[active] += self._block_sum(X[active], start, end, depth)
+                used[active] = end
+                if end == self.n_trees:
+                    break
+                ranked = np.sort(totals[active], axis=1)
+                active = active[~self._settled(ranked[:, -1], ranked[:, -2], end)]
+                if not len(active):
+                    break
+
+        with self._lock:
+            self.rows += len(used)
+            self.trees_evaluated += int(used.sum())
+        return self.classes_.take(np.argmax(totals, axis=1)), totals / used[:, np.newaxis], used
+
+    def predict_proba(self, X):
+        return self.score(X)[1]
+
+    def predict(self, X):
+        return self.score(X)[0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': 'exact' if self.delta is None else f'delta={self.delta}',
+                'trees': self.n_trees,
+                'rows': self.rows,
+                'mean_trees_evaluated': self.trees_evaluated / self.rows if self.rows else 0.0,
+            }
+
+
+def early_exit_setting(value):
+    # CKD_EARLY_EXIT / --mode values: "exact" or a delta such as 0.01
+    if value == 'exact':
+        return None
+    delta = float(value)
+    if not 0 < delta < 1:
+        raise ValueError(f"Early exit delta must be between 0 and 1, got {value!r}")
+    return delta
+
+
+def wrap_scorer(scorer, setting, min_trees=8):
+    # Early-exit version of a compiled forest; any other scorer is returned as-is
+    if not setting or scorer.kind != 'tree_ensemble' or not scorer.average:
+        return scorer
+    return EarlyExitScorer(scorer, delta=early_exit_setting(setting), min_trees=min_trees)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Learn a tree order for early-exit forest evaluation and benchmark it")
+    parser.add_argument('--model', default='best_model.joblib')
+    parser.add_argument('--scaler', default='scaler.joblib')
+    parser.add_argument('--data', default='cleaned_ckd_data.csv')
+    parser.add_argument('--modes', type=lambda s: s.split(','), default=['exact', '0.05', '0.01', '0.001'],
+                        help="comma separated: exact and/or Hoeffding deltas")
+    parser.add_argument('--min-trees', type=int, default=8, help="trees always evaluated before the first exit check")
+    parser.add_argument('--repeat', type=int, default=2000, help="single-row calls timed per mode")
+    parser.add_argument('--install', action='store_true',
+                        help="write the forest in the learned order to --install-dir for CKD_EARLY_EXIT serving")
+    parser.add_argument('--install-dir', default=INSTALL_DIR)
+    return parser.parse_args(argv)
+
+
+def time_rows(scorer, X, repeat):
+    # Mean and p99 single-row predict_proba latency, in seconds
+    rows = [X[i:i + 1] for i in range(len(X))]
+    for row in rows[:50]:
+        scorer.predict_proba(row)
+    latencies = np.empty(repeat)
+    for i in range(repeat):
+        row = rows[i % len(rows)]
+        start = time.perf_counter()
+        scorer.predict_proba(row)
+        latencies[i] = time.perf_counter() - start
+    return float(latencies.mean()), float(np.percentile(latencies, 99))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    import joblib
+    from sklearn.model_selection import train_test_split
+
+    from compact_forest import greedy_order, rebuild
+    from training import holdout_indices, read_dataset
+    from tree_engine import TreeEnsembleScorer
+
+    model, scaler = joblib.load(args.model), joblib.load(args.scaler)
+    full = TreeEnsembleScorer.from_sklearn(model, scaler)
+    if not full.average:
+        raise SystemExit("Early exit needs a random forest, not a single decision tree")
+
+    # Learn the order on half of main.py's test split: the trees that best
+    # predict the held-out labels go first, so most rows settle early
+    df = read_dataset(args.data)
+    X = df.drop(columns=['classification']).to_numpy(dtype=np.float64)
+    y = df['classification'].to_numpy()
+    _, test = holdout_indices(df['classification'])
+    val, _ = train_test_split(test, test_size=0.5, random_state=0)
+    order = greedy_order(full, X[val], y[val])
+    learned = rebuild(full, order)
+
+    full_labels, full_probas = full.predict(X), full.predict_proba(X)
+    base_mean, base_p99 = time_rows(full, X, args.repeat)
+    start = time.perf_counter()
+    full.predict_proba(X)
+    base_batch = time.perf_counter() - start
+
+    print(f"{full.n_trees}-tree forest on {len(X)} rows, exit checks from tree {args.min_trees}")
+    print(f"{'order':<9}{'mode':<13}{'avg trees':>10}{'labels =':>10}{'max |dp|':>10}"
+          f"{'mean us':>9}{'p99 us':>8}{'saved':>8}{'batch trees':>13}{'batch ms':>10}")
+    print(f"{'-':<9}{'full forest':<13}{full.n_trees:>10.1f}{'100.00%':>10}{0:>10.4f}"
+          f"{base_mean * 1e6:>9.0f}{base_p99 * 1e6:>8.0f}{'-':>8}{full.n_trees:>13.1f}{base_batch * 1000:>10.2f}")
+    for order_name, ordered in (('original', full), ('learned', learned)):
+        for mode in args.modes:
+            scorer = EarlyExitScorer(ordered, delta=early_exit_setting(mode), min_trees=args.min_trees)
+            # One row at a time, as /predict scores, checking after every tree
+            rows = [scorer.score(X[i:i + 1]) for i in range(len(X))]
+            labels = np.concatenate([row[0] for row in rows])
+            probas = np.vstack([row[1] for row in rows])
+            used = np.concatenate([row[2] for row in rows])
+            mean, p99 = time_rows(scorer, X, args.repeat)
+            # The whole dataset in one call, checking between blocks
+            start = time.perf_counter()
+            batch_used = scorer.score(X)[2]
+            batch = time.perf_counter() - start
+            print(f"{order_name:<9}{mode:<13}{used.mean():>10.1f}{(labels == full_labels).mean() * 100:>9.2f}%"
+                  f"{np.abs(probas - full_probas).max():>10.4f}{mean * 1e6:>9.0f}{p99 * 1e6:>8.0f}"
+                  f"{1 - mean / base_mean:>8.0%}{batch_used.mean():>13.1f}{batch * 1000:>10.2f}")
+
+    if args.install:
+        # The manifest records the tree order, giving the reordered forest its
+        # own version id; app.py only serves it when pointed at this directory
+        save_artifacts(args.install_dir, learned, sources=[args.model, args.scaler], derived={
+            'tool': 'early_exit',
+            'order': [int(tree) for tree in order],
+            'data_sha256': file_sha256(args.data),
+        })
+        print(f"✅ Installed the forest in learned order in {args.install_dir} as version "
+              f"{artifacts_version(args.install_dir)}; serve it with CKD_ARTIFACTS_DIR={args.install_dir}")
+
+
+if __name__ == "__main__":
+    main()
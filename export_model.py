@@ -0,0 +1,318 @@
+import argparse
+import base64
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from feature_schema import FEATURE_COLS, FeatureSchema, label_encoder_codes
+from model_reloader import ckd_class_for
+
+DEFAULT_OUTPUT = os.path.join('models', 'exported', 'ckd_model.py')
+
+# Python refuses to compile much deeper nesting than this
+MAX_STDLIB_DEPTH = 90
+
+HEADER = '''\
+# Generated by export_model.py from {source}: {description}.
+# Do not edit; export again after retraining. The StandardScaler is folded into
+# the thresholds, so rows are raw encoded features in FEATURE_COLS order.
+'''
+
+COMMON = '''
+FEATURE_COLS = {feature_cols!r}
+
+# The codes app.py gives each categorical form value
+CATEGORY_CODES = {category_codes!r}
+
+CLASSES = {classes!r}
+N_TREES = {n_trees!r}
+# A forest averages its trees; a single tree is used as-is
+AVERAGE = {average!r}
+CKD_CLASS = {ckd_class!r}
+CKD_INDEX = {ckd_index!r}
+
+
+def encode(form):
+    # Raw features of one patient, in FEATURE_COLS order
+    row = []
+    for col in FEATURE_COLS:
+        value = form.get(col)
+        if value is None or value == '':
+            raise ValueError(f"Missing value for '{{col}}'")
+        codes = CATEGORY_CODES.get(col)
+        if codes is None:
+            row.append(float(value))
+        elif value in codes:
+            row.append(float(codes[value]))
+        else:
+            raise ValueError(f"Unknown value {{value!r}} for '{{col}}'")
+    return row
+
+
+def score(form):
+    # (is_ckd, CKD probability) for one patient
+    probas = predict_proba([encode(form)])[0]
+    return bool(predict_label(probas) == CKD_CLASS), float(probas[CKD_INDEX])
+'''
+
+STDLIB_RUNTIME = '''
+
+def predict_proba(rows):
+    # Sum each tree's leaf distribution in tree order, as sklearn does
+    result = []
+    for x in rows:
+        total = [0.0] * len(CLASSES)
+        for tree in TREES:
+            for k, p in enumerate(tree(x)):
+                total[k] += p
+        result.append([p / N_TREES for p in total] if AVERAGE else total)
+    return result
+
+
+def predict_label(probas):
+    # First class with the highest probability, like numpy's argmax
+    return CLASSES[max(range(len(probas)), key=probas.__getitem__)]
+
+
+def predict(rows):
+    return [predict_label(probas) for probas in predict_proba(rows)]
+'''
+
+NUMPY_RUNTIME = '''
+
+def _array(data, dtype, shape):
+    return np.frombuffer(base64.b64decode(data), dtype=dtype).reshape(shape)
+
+
+# Every tree's nodes in one set of arrays. children[2 * node] is the right
+# child and children[2 * node + 1] the left one; leaves point at themselves
+FEATURE = _array({feature})
+THRESHOLD = _array({threshold})
+CHILDREN = _array({children})
+VALUE = _array({value})
+ROOTS = _array({roots})
+MAX_DEPTH = {max_depth}
+CLASS_ARRAY = np.array(CLASSES)
+
+
+def predict_proba(rows):
+    # Walk all trees one level per step over the whole batch, then sum the
+    # leaf distributions tree by tree
+    X = np.ascontiguousarray(rows, dtype=np.float64).reshape(-1, len(FEATURE_COLS))
+    n_samples, n_features = X.shape
+    flat_X = X.ravel()
+    row_offsets = np.tile(np.arange(n_samples) * n_features, N_TREES)
+    node = np.repeat(ROOTS, n_samples)
+    for _ in range(MAX_DEPTH):
+        go_left = flat_X.take(row_offsets + FEATURE.take(node)) <= THRESHOLD.take(node)
+        node = CHILDREN.take(node * 2 + go_left)
+    proba = VALUE.take(node.reshape(N_TREES, n_samples), axis=0).sum(axis=0)
+    return proba / N_TREES if AVERAGE else proba
+
+
+def predict_label(probas):
+    return CLASS_ARRAY[np.argmax(probas)]
+
+
+def predict(rows):
+    return CLASS_ARRAY.take(np.argmax(predict_proba(rows), axis=1))
+'''
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export the trained tree model as a standalone Python module (NumPy or standard library only)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--version', help="registry version or reference to export (default: best_model.joblib)")
+    source.add_argument('--model', default='best_model.joblib')
+    parser.add_argument('--scaler', default='scaler.joblib')
+    parser.add_argument('--target', choices=['numpy', 'stdlib'], default='numpy',
+                        help="numpy: node arrays and a vectorized walk; stdlib: one if/else function per tree")
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--data', default='cleaned_ckd_data.csv', help="rows for the parity check")
+    parser.add_argument('--no-check', action='store_true', help="skip the parity check against the sklearn model")
+    parser.add_argument('--measure', action='store_true',
+                        help="compare import time and peak RSS of the module with loading the joblib model")
+    return parser.parse_args(argv)
+
+
+def load_model(args):
+    # (model, scaler, source description) from the registry or joblib files
+    import joblib
+    if args.version:
+        from model_registry import MODEL_FILE, SCALER_FILE, resolve, version_dir
+        version = resolve(args.version)
+        directory = version_dir(version)
+        return (joblib.load(os.path.join(directory, MODEL_FILE)), joblib.load(os.path.join(directory, SCALER_FILE)),
+                f'registry version {version}')
+    return joblib.load(args.model), joblib.load(args.scaler), os.path.basename(args.model)
+
+
+def _float(value):
+    # repr round-trips a float64 exactly
+    return repr(float(value))
+
+
+def _tree_source(scorer, index, root):
+    # One nested if/else function per tree, returning the leaf's class distribution
+    lines = [f'def _tree_{index}(x):']
+
+    def emit(node, depth):
+        indent = '    ' * depth
+        right, left = scorer.children[2 * node], scorer.children[2 * node + 1]
+        if right == node:
+            lines.append(f"{indent}return ({', '.join(_float(p) for p in scorer.value[node])},)")
+            return
+        if depth > MAX_STDLIB_DEPTH:
+            raise ValueError(f"Tree {index} is too deep for the stdlib target; use --target numpy")
+        lines.append(f'{indent}if x[{scorer.feature[node]}] <= {_float(scorer.threshold[node])}:')
+        emit(left, depth + 1)
+        lines.append(f'{indent}else:')
+        emit(right, depth + 1)
+
+    emit(int(root), 1)
+    return '\n'.join(lines)
+
+
+def _encoded_array(array):
+    array = np.ascontiguousarray(array)
+    data = base64.b64encode(array.tobytes()).decode('ascii')
+    return f"'{data}', '{array.dtype.str}', {array.shape!r}"
+
+
+def generate_source(scorer, target, source):
+    # Module text for a compiled tree scorer
+    if scorer.kind != 'tree_ensemble':
+        raise ValueError(f"Only decision tree and random forest models can be exported (got {scorer.kind})")
+    classes = scorer.classes_.tolist()
+    ckd_class = ckd_class_for(classes)
+    description = (f"{scorer.n_trees} {'trees' if scorer.n_trees != 1 else 'tree'}, {len(scorer.feature)} nodes, "
+                   f"{target} target")
+    common = COMMON.format(feature_cols=FEATURE_COLS, category_codes=label_encoder_codes(), classes=classes,
+                           n_trees=scorer.n_trees, average=scorer.average, ckd_class=ckd_class,
+                           ckd_index=classes.index(ckd_class))
+    parts = [HEADER.format(source=source, description=description)]
+
+    if target == 'stdlib':
+        parts += [common, STDLIB_RUNTIME]
+        for index, root in enumerate(scorer.roots):
+            parts.append('\n\n' + _tree_source(scorer, index, root))
+        parts.append(f"\n\nTREES = ({', '.join(f'_tree_{i}' for i in range(scorer.n_trees))},)\n")
+    else:
+        parts += ['import base64\n\nimport numpy as np\n', common, NUMPY_RUNTIME.format(
+            feature=_encoded_array(scorer.feature.astype(np.int32)), threshold=_encoded_array(scorer.threshold),
+            children=_encoded_array(scorer.children.astype(np.int32)), value=_encoded_array(scorer.value),
+            roots=_encoded_array(scorer.roots.astype(np.int32)), max_depth=int(scorer.depths.max(initial=0)))]
+    return ''.join(parts)
+
+
+def import_path(path):
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def check_parity(module, model, scaler, data_path):
+    # The generated module must reproduce scaler + sklearn model exactly on
+    # every dataset row, and encode forms the way app.py does
+    import pandas as pd
+
+    df = pd.read_csv(data_path)
+    df.columns = df.columns.str.lower()
+    forms = [{col: str(value).strip() for col, value in record.items()}
+             for record in df[FEATURE_COLS].to_dict('records')]
+    schema = FeatureSchema(FEATURE_COLS, label_encoder_codes())
+    rows = []
+    for form in forms:
+        try:
+            expected_row = schema.encode(form)[0]
+        except ValueError:
+            continue
+        if module.encode(form) != expected_row.tolist():
+            raise AssertionError(f"encode() differs from app.py's encoder for {form}")
+        rows.append(expected_row)
+    X = np.vstack(rows)
+
+    expected = model.predict_proba(scaler.transform(pd.DataFrame(X, columns=FEATURE_COLS)))
+    actual = np.asarray(module.predict_proba(X.tolist()))
+    max_error = float(np.abs(expected - actual).max())
+    if max_error > 1e-12:
+        raise AssertionError(f"Generated probabilities differ from sklearn by {max_error:.3g}")
+    expected_labels = model.predict(scaler.transform(pd.DataFrame(X, columns=FEATURE_COLS)))
+    mismatched = int((np.asarray(module.predict(X.tolist())) != expected_labels).sum())
+    if mismatched:
+        raise AssertionError(f"Generated labels differ from sklearn on {mismatched} rows")
+    return len(X), max_error
+
+
+# Run in a fresh interpreter: import (or load) the model and score one row
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+{load}
+elapsed = time.perf_counter() - start
+predict_proba([[1.0] * 24])
+# ru_maxrss survives exec on Linux and would include the exporter's own peak
+with open('/proc/self/status') as f:
+    status = dict(line.split(':', 1) for line in f)
+print(json.dumps({{'import_ms': elapsed * 1000, 'max_rss_mb': int(status['VmHWM'].split()[0]) / 1024,
+                  'modules': len(sys.modules)}}))
+'''
+
+
+def measure(output, model_path, scaler_path):
+    directory, module_name = os.path.split(os.path.abspath(output))
+    loads = {
+        'generated module': (f"sys.path.insert(0, {directory!r})\nfrom {module_name[:-3]} import predict_proba"),
+        'joblib + sklearn': (f"import joblib\nmodel = joblib.load({model_path!r})\n"
+                             f"scaler = joblib.load({scaler_path!r})\n"
+                             "predict_proba = lambda X: model.predict_proba(scaler.transform(X))"),
+    }
+    for label, load in loads.items():
+        completed = subprocess.run([sys.executable, '-c', PROBE.format(load=load)],
+                                   capture_output=True, text=True, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"{label:<18} import {result['import_ms']:8.1f} ms   peak RSS {result['max_rss_mb']:6.1f} MB   "
+              f"{result['modules']} modules")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from scorers import compile_scorer
+
+    model, scaler, source = load_model(args)
+    scorer = compile_scorer(model, scaler)
+    text = generate_source(scorer, args.target, source)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    tmp_path = f'{args.output}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, args.output)
+    print(f"✅ Wrote {args.output} ({len(text.encode()) / 1024:.0f} KiB, {args.target} target)")
+
+    if not args.no_check:
+        start = time.perf_counter()
+        module = import_path(args.output)
+        import_ms = (time.perf_counter() - start) * 1000
+        n_rows, max_error = check_parity(module, model, scaler, args.data)
+        print(f"✅ Parity with sklearn on {n_rows} rows (max probability error {max_error:.2e}); "
+              f"module imported in {import_ms:.1f} ms")
+
+    if args.measure:
+        if args.version:
+            from model_registry import MODEL_FILE, SCALER_FILE, resolve, version_dir
+            directory = version_dir(resolve(args.version))
+            measure(args.output, os.path.join(directory, MODEL_FILE), os.path.join(directory, SCALER_FILE))
+        else:
+            measure(args.output, args.model, args.scaler)
+
+
+if __name__ == "__main__":
+    main()
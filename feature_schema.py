@@ -0,0 +1,94 @@
+import numpy as np
+
+# Column order the models are trained on (see training.py)
+FEATURE_COLS = ['age', 'bp', 'sg', 'al', 'su', 'rbc', 'pc', 'pcc', 'ba',
+                'bgr', 'bu', 'sc', 'sod', 'pot', 'hemo', 'pcv', 'wc', 'rc',
+                'htn', 'dm', 'cad', 'appet', 'pe', 'ane']
+
+# Categorical columns and the values the app.py form accepts for each
+CATEGORICAL_COLS = ['rbc', 'pc', 'pcc', 'ba', 'htn', 'dm', 'cad', 'appet', 'pe', 'ane']
+FORM_CATEGORIES = {
+    'rbc': ['normal', 'abnormal'],
+    'pc': ['normal', 'abnormal'],
+    'pcc': ['present', 'not present'],
+    'ba': ['present', 'not present'],
+    'htn': ['yes', 'no'],
+    'dm': ['yes', 'no'],
+    'cad': ['yes', 'no'],
+    'appet': ['good', 'poor'],
+    'pe': ['yes', 'no'],
+    'ane': ['yes', 'no'],
+}
+
+
+def label_encoder_codes(categories=FORM_CATEGORIES):
+    # The codes a LabelEncoder fitted on each value list assigns (sorted
+    # order), which is how app.py encodes the form
+    return {col: {value: code for code, value in enumerate(sorted(values))}
+            for col, values in categories.items()}
+
+
+class FeatureSchema:
+    # Compiled description of the model input: the column order and a code
+    # lookup table for every categorical column. Built once at startup so a
+    # submitted form can be written straight into a float64 row without going
+    # through a pandas DataFrame.
+
+    def __init__(self, feature_cols, category_mappings):
+        self.feature_cols = list(feature_cols)
+        self.n_features = len(self.feature_cols)
+
+        # One (position, column, lookup) entry per feature; lookup is None for numbers
+        self.fields = []
+        for position, col in enumerate(self.feature_cols):
+            lookup = category_mappings.get(col)
+            if lookup is not None:
+                lookup = {value: float(code) for value, code in lookup.items()}
+            self.fields.append((position, col, lookup))
+
+    def new_row(self):
+        return np.empty((1, self.n_features), dtype=np.float64)
+
+    def encode(self, form, out=None):
+        # Write the raw (unscaled) features of one patient into a (1, n) row
+        row = self.new_row() if out is None else out
+        values = row[0]
+        for position, col, lookup in self.fields:
+            value = form.get(col)
+            if value is None or value == '':
+                raise ValueError(f"Missing value for '{col}'")
+            if lookup is None:
+                try:
+                    values[position] = float(value)
+                except TypeError:
+                    raise ValueError(f"Expected a number for '{col}', got {value!r}") from None
+                if not np.isfinite(values[position]):
+                    raise ValueError(f"Expected a finite number for '{col}', got {value!r}")
+            else:
+                try:
+                    values[position] = lookup[value]
+                except (KeyError, TypeError):
+                    raise ValueError(f"Unknown value {value!r} for '{col}'") from None
+        return row
+
+    def encode_frame(self, df):
+        # Vectorized encoding of many patients at once. Returns the raw
+        # (n, n_features) float64 matrix and a boolean mask of the cells that
+        # were missing, unparseable, not finite, not a single value (a list or
+        # object from JSON) or not a known category (those are NaN)
+        import pandas as pd
+
+        rows = np.empty((len(df), self.n_features), dtype=np.float64)
+        for position, col, lookup in self.fields:
+            if col not in df:
+                rows[:, position] = np.nan
+                continue
+            column = df[col]
+            if column.dtype == object:
+                column = column.where(column.map(pd.api.types.is_scalar))
+            if lookup is None:
+                rows[:, position] = pd.to_numeric(column, errors='coerce')
+            else:
+                rows[:, position] = column.map(lookup)
+        rows[np.isinf(rows)] = np.nan
+        return rows, np.isnan(rows)
@@ -1,26 +1,103 @@
-from flask import Flask, request, jsonify, render_template_string
-import pandas as pd
+import os
+from startup_timer import StartupTimer
+
+# Cold-start timing (CKD_STARTUP_BUDGET_MS warns when startup takes longer)
+startup = StartupTimer(budget_ms=float(os.environ.get('CKD_STARTUP_BUDGET_MS', 0)) or None)
+
+from flask import Flask, request, jsonify, render_template
+from markupsafe import escape
 import numpy as np
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-import pickle
-import joblib
+from feature_schema import FeatureSchema
+from scorers import compile_scorer
+from artifacts import load_scorer
+from model_registry import load_version
+from shadow_scoring import ShadowScorer
+from metrics import Metrics
+from static_page import PrecompressedPage
+from model_reloader import ckd_class_for
 
 app = Flask(__name__)
+metrics = Metrics('hello')
+startup.mark('imports')
 
 # Load the trained model and scaler
-try:
-    model = joblib.load('best_model.joblib')
-    scaler = joblib.load('scaler.joblib')
-except:
-    # If model files don't exist, train the model
-    from main import models, best_model_name, scaler, X
-    model = models[best_model_name]
-    # Save the model and scaler
-    joblib.dump(model, 'best_model.joblib')
-    joblib.dump(scaler, 'scaler.joblib')
+if os.environ.get('CKD_MODEL_VERSION'):
+    # A specific version (or reference such as "latest") from the model registry
+    scorer, _ = load_version(os.environ['CKD_MODEL_VERSION'])
+else:
+    try:
+        # Memory-mapped compiled arrays when main.py wrote them, else the joblib files
+        scorer = load_scorer('best_model.joblib', 'scaler.joblib')
+    except:
+        # If model files don't exist, train the model
+        from main import train_headless
+        models, best_model_name, scaler, X = train_headless()
+        model = models[best_model_name]
+        scorer = compile_scorer(model, scaler)
+
+# Which class (and probability column) means CKD for this model, as in app.py
+ckd_class = ckd_class_for(scorer.classes_)
+ckd_index = int(np.where(scorer.classes_ == ckd_class)[0][0])
+
+# Candidate registry version scored in the background for comparison (CKD_SHADOW_VERSION)
+shadow = None
+if os.environ.get('CKD_SHADOW_VERSION'):
+    shadow_scorer, shadow_entry = load_version(os.environ['CKD_SHADOW_VERSION'])
+    shadow = ShadowScorer(shadow_scorer, shadow_entry['version'])
+startup.mark('model')
+
+# Feature order matching the training data
+column_order = ['age', 'bp', 'sg', 'al', 'su', 'rbc', 'pc', 'pcc', 'ba', 'bgr', 
+               'bu', 'sc', 'sod', 'pot', 'hemo', 'pcv', 'wc', 'rc', 
+               'htn', 'dm', 'cad', 'appet', 'pe', 'ane']
 
-# Initialize label encoder
-le = LabelEncoder()
+# Create a mapping dictionary for each categorical variable
+category_mappings = {
+    'rbc': {'normal': 0, 'abnormal': 1},
+    'pc': {'normal': 0, 'abnormal': 1},
+    'pcc': {'not present': 0, 'present': 1},
+    'ba': {'not present': 0, 'present': 1},
+    'htn': {'no': 0, 'yes': 1},
+    'dm': {'no': 0, 'yes': 1},
+    'cad': {'no': 0, 'yes': 1},
+    'appet': {'poor': 0, 'good': 1},
+    'pe': {'no': 0, 'yes': 1},
+    'ane': {'no': 0, 'yes': 1}
+}
+
+# Compiled encoder built once from the column order and mappings above
+schema = FeatureSchema(column_order, category_mappings)
+
+# Result card, rendered inside the page and on its own for in-page updates
+RESULT_FRAGMENT = '''
+<div id="result" class="{% if is_ckd %}result-high{% else %}result-low{% endif %} mt-5 card shadow-sm">
+    <div class="card-body">
+        <div class="mb-3">
+            <h4>
+            {% if is_ckd %}
+                <i class="bi bi-exclamation-triangle-fill me-2"></i> High Risk of Chronic Kidney Disease
+            {% else %}
+                <i class="bi bi-shield-check me-2"></i> Risk of Chronic Kidney Disease
+            {% endif %}
+            </h4>
+        </div>
+        
+        <div class="mt-4">
+            <div class="probability-bar">
+                <div class="probability-fill" style="width: {{ "%.1f"|format(ckd_prob) }}%;"></div>
+                <div class="probability-marker" style="left: {{ ckd_prob }}%;"></div>
+            </div>
+            <div class="probability-labels">
+                <span>0%</span>
+                <span>100%</span>
+            </div>
+            <div class="text-center mt-3">
+                <strong>CKD Risk: {{ "%.1f"|format(ckd_prob) }}%</strong>
+            </div>
+        </div>
+    </div>
+</div>
+'''
 
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -537,35 +614,9 @@ HTML_TEMPLATE = '''
                     </div>
                 </form>
                 
-                {% if prediction is not none %}
-                <div id="result" class="{% if prediction[0] == 1 %}result-high{% else %}result-low{% endif %} mt-5 card shadow-sm">
-                    <div class="card-body">
-                        <div class="mb-3">
-                            <h4>
-                            {% if prediction[0] == 1 %}
-                                <i class="bi bi-exclamation-triangle-fill me-2"></i> High Risk of Chronic Kidney Disease
-                            {% else %}
-                                <i class="bi bi-shield-check me-2"></i> Risk of Chronic Kidney Disease
-                            {% endif %}
-                            </h4>
-                        </div>
-                        
-                        <div class="mt-4">
-                            <div class="probability-bar">
-                                <div class="probability-fill" style="width: {{ "%.1f"|format(non_ckd_prob) }}%;"></div>
-                                <div class="probability-marker" style="left: {{ ckd_prob }}%;"></div>
-                            </div>
-                            <div class="probability-labels">
-                                <span>0%</span>
-                                <span>100%</span>
-                            </div>
-                            <div class="text-center mt-3">
-                                <strong>CKD Risk: {{ "%.1f"|format(non_ckd_prob) }}%</strong>
-                            </div>
-                        </div>
-                    </div>
+                <div id="result-container">
+                {% if prediction is not none %}{% include result_template %}{% endif %}
                 </div>
-                {% endif %}
 
                 <!-- Add this modal right before closing the container div -->
                 <div class="modal fade" id="resultModal" tabindex="-1" aria-labelledby="resultModalLabel" aria-hidden="true">
@@ -578,8 +629,8 @@ HTML_TEMPLATE = '''
                             <div class="modal-body">
                                 {% if prediction is not none %}
                                 <div class="mb-3">
-                                    <h4 class="text-center {% if prediction[0] == 1 %}text-danger{% else %}text-primary{% endif %}">
-                                    {% if prediction[0] == 1 %}
+                                    <h4 class="text-center {% if is_ckd %}text-danger{% else %}text-primary{% endif %}">
+                                    {% if is_ckd %}
                                         <i class="bi bi-exclamation-triangle-fill me-2"></i> High Risk of Chronic Kidney Disease
                                     {% else %}
                                         <i class="bi bi-shield-check me-2"></i> Risk of Chronic Kidney Disease
@@ -589,7 +640,7 @@ HTML_TEMPLATE = '''
                                 
                                 <div class="mt-4">
                                     <div class="probability-bar">
-                                        <div class="probability-fill" style="width: {{ "%.1f"|format(non_ckd_prob) }}%;"></div>
+                                        <div class="probability-fill" style="width: {{ "%.1f"|format(ckd_prob) }}%;"></div>
                                         <div class="probability-marker" style="left: {{ ckd_prob }}%;"></div>
                                     </div>
                                     <div class="probability-labels">
@@ -597,7 +648,7 @@ HTML_TEMPLATE = '''
                                         <span>100%</span>
                                     </div>
                                     <div class="text-center mt-3">
-                                        <strong>CKD Risk: {{ "%.1f"|format(non_ckd_prob) }}%</strong>
+                                        <strong>CKD Risk: {{ "%.1f"|format(ckd_prob) }}%</strong>
                                     </div>
                                 </div>
                                 {% endif %}
@@ -646,11 +697,37 @@ HTML_TEMPLATE = '''
             const form = document.getElementById('ckd-form');
             if (form) {
                 form.addEventListener('submit', function(event) {
+                    form.classList.add('was-validated');
+                    event.preventDefault();
                     if (!form.checkValidity()) {
-                        event.preventDefault();
                         event.stopPropagation();
+                        return;
                     }
-                    form.classList.add('was-validated');
+
+                    // Fetch just the result card (or the error card of a 400) and swap it
+                    // in; fall back to a full page post only when the request itself fails
+                    fetch('/predict?fragment=1', {method: 'POST', body: new FormData(form)})
+                        .catch(() => null)
+                        .then(response => {
+                            if (response === null) {
+                                form.submit();
+                                return;
+                            }
+                            return response.text().then(html => {
+                                const container = document.getElementById('result-container');
+                                container.innerHTML = html;
+                                const fillElement = container.querySelector('.probability-fill');
+                                if (fillElement) {
+                                    const targetWidth = fillElement.style.width;
+                                    fillElement.style.width = '0%';
+                                    setTimeout(() => {
+                                        fillElement.style.transition = 'width 1s ease-in-out';
+                                        fillElement.style.width = targetWidth;
+                                    }, 50);
+                                }
+                                container.scrollIntoView({behavior: 'smooth'});
+                            });
+                        });
                 });
             }
             
@@ -820,101 +897,96 @@ HTML_TEMPLATE = '''
 </html>
 '''
 
+# Compile the page and the result card once at startup rather than per request
+page_template = app.jinja_env.from_string(HTML_TEMPLATE)
+result_template = app.jinja_env.from_string(RESULT_FRAGMENT)
+
+def response_format():
+    # JSON for API clients (JSON body or Accept preferring JSON), the bare
+    # result card for the page's in-page update, the full page otherwise
+    if request.is_json or request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+        return 'json'
+    if request.args.get('fragment'):
+        return 'fragment'
+    return 'page'
+
+# The empty form never changes while the process runs: render and compress it once
+with app.test_request_context('/'):
+    home_page = PrecompressedPage(render_template(page_template, 
+                                                  prediction=None,
+                                                  probability=None,
+                                                  ckd_prob=None,
+                                                  non_ckd_prob=None,
+                                                  error=None))
+
 @app.route('/')
 def home():
-    return render_template_string(HTML_TEMPLATE, 
-                                prediction=None,
-                                probability=None,
-                                ckd_prob=None,
-                                non_ckd_prob=None,
-                                error=None)
+    return home_page.response()
 
 @app.route('/predict', methods=['POST'])
 def predict():
+    output = response_format()
     try:
-        # Get form data
-        data = {
-            'age': float(request.form['age']),
-            'bp': float(request.form['bp']),
-            'sg': float(request.form['sg']),
-            'al': float(request.form['al']),
-            'su': float(request.form['su']),
-            'rbc': request.form['rbc'],
-            'pc': request.form['pc'],
-            'pcc': request.form['pcc'],
-            'ba': request.form['ba'],
-            'bgr': float(request.form['bgr']),
-            'bu': float(request.form['bu']),
-            'sc': float(request.form['sc']),
-            'sod': float(request.form['sod']),
-            'pot': float(request.form['pot']),
-            'hemo': float(request.form['hemo']),
-            'pcv': float(request.form['pcv']),
-            'wc': float(request.form['wc']),
-            'rc': float(request.form['rc']),
-            'htn': request.form['htn'],
-            'dm': request.form['dm'],
-            'cad': request.form['cad'],
-            'appet': request.form['appet'],
-            'pe': request.form['pe'],
-            'ane': request.form['ane']
-        }
-
-        # Create DataFrame with ordered columns matching training data
-        column_order = ['age', 'bp', 'sg', 'al', 'su', 'rbc', 'pc', 'pcc', 'ba', 'bgr', 
-                       'bu', 'sc', 'sod', 'pot', 'hemo', 'pcv', 'wc', 'rc', 
-                       'htn', 'dm', 'cad', 'appet', 'pe', 'ane']
-        
-        input_df = pd.DataFrame([data])[column_order]
-
-        # Encode categorical variables
-        categorical_cols = ['rbc', 'pc', 'pcc', 'ba', 'htn', 'dm', 'cad', 'appet', 'pe', 'ane']
-        
-        # Create a mapping dictionary for each categorical variable
-        category_mappings = {
-            'rbc': {'normal': 0, 'abnormal': 1},
-            'pc': {'normal': 0, 'abnormal': 1},
-            'pcc': {'not present': 0, 'present': 1},
-            'ba': {'not present': 0, 'present': 1},
-            'htn': {'no': 0, 'yes': 1},
-            'dm': {'no': 0, 'yes': 1},
-            'cad': {'no': 0, 'yes': 1},
-            'appet': {'poor': 0, 'good': 1},
-            'pe': {'no': 0, 'yes': 1},
-            'ane': {'no': 0, 'yes': 1}
-        }
-        
-        # Apply the mappings
-        for col in categorical_cols:
-            input_df[col] = input_df[col].map(category_mappings[col])
-
-        # Scale numerical features
-        input_scaled = scaler.transform(input_df)
+        # Parse the form (or JSON) body and encode it straight into a NumPy row
+        with metrics.time('parse'):
+            form = request.get_json(silent=True) if request.is_json else request.form
+            if not isinstance(form, dict):
+                raise ValueError("Expected a JSON object of patient fields")
+        with metrics.time('encode'):
+            input_row = schema.encode(form)
 
         # Make prediction and get probability scores
-        prediction = model.predict(input_scaled)
-        probabilities = model.predict_proba(input_scaled)[0]
+        with metrics.time('predict'):
+            prediction = scorer.predict(input_row)
+        with metrics.time('predict_proba'):
+            probabilities = scorer.predict_proba(input_row)[0]
+        if shadow is not None:
+            shadow.submit(input_row, prediction, probabilities[None], scorer.classes_)
         
-        # Calculate confidence percentage
-        ckd_probability = probabilities[1] * 100
-        non_ckd_probability = probabilities[0] * 100
-        confidence = ckd_probability if prediction[0] == 1 else non_ckd_probability
+        # CKD is decided by the model's CKD class, and its probability read
+        # from that class's column, on every response format
+        is_ckd = bool(prediction[0] == ckd_class)
+        ckd_fraction = float(probabilities[ckd_index])
+        confidence = ckd_fraction if is_ckd else 1 - ckd_fraction
+
+        # API clients get the numbers without any HTML rendering
+        if output == 'json':
+            return jsonify(prediction=int(prediction[0]),
+                           is_ckd=is_ckd,
+                           ckd_probability=ckd_fraction,
+                           non_ckd_probability=1 - ckd_fraction,
+                           confidence=confidence)
 
-        return render_template_string(HTML_TEMPLATE, 
+        with metrics.time('render'):
+            return render_template(result_template if output == 'fragment' else page_template,
+                                   result_template=result_template,
                                    prediction=prediction,
-                                   probability=confidence,
-                                   ckd_prob=ckd_probability,
-                                   non_ckd_prob=non_ckd_probability,
+                                   is_ckd=is_ckd,
+                                   probability=confidence * 100,
+                                   ckd_prob=ckd_fraction * 100,
+                                   non_ckd_prob=(1 - ckd_fraction) * 100,
                                    error=None)
 
     except Exception as e:
         print("Error occurred:", str(e))
-        return render_template_string(HTML_TEMPLATE, 
-                                   prediction=None,
-                                   probability=None,
-                                   ckd_prob=None,
-                                   non_ckd_prob=None,
-                                   error=str(e))
+        if output == 'json':
+            return jsonify(error=str(e)), 400
+        if output == 'fragment':
+            return f'<div id="result" class="alert alert-danger mt-5">{escape(str(e))}</div>', 400
+        return render_template(page_template, 
+                               prediction=None,
+                               probability=None,
+                               ckd_prob=None,
+                               non_ckd_prob=None,
+                               error=str(e))
+
+@app.route('/startup/stats')
+def startup_stats():
+    return jsonify(startup.stats())
+
+metrics.attach(app)
+startup.attach(app)
+startup.ready()
 
 if __name__ == '__main__':
     app.run(debug=True)
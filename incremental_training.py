@@ -0,0 +1,200 @@
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from artifacts import file_sha256
+from model_registry import MODEL_FILE, SCALER_FILE, publish, read_entry, resolve, version_dir
+from training import (DATA_PATH, MODEL_PATH, SCALER_PATH, categorical_cols, holdout_indices, load_dataset,
+                      save_best_model)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Grow the current random forest with trees fitted on newly labelled patients")
+    parser.add_argument('new_data', nargs='+', help="CSV file(s) of new patients, in the cleaned_ckd_data.csv format")
+    parser.add_argument('--base', default='latest', help="registry version or reference to grow (default: latest)")
+    parser.add_argument('--base-data', default=None,
+                        help="CSV the base model was trained on (default: the path recorded in its registry entry)")
+    parser.add_argument('--add-trees', type=int, default=20, help="trees to fit on the new data")
+    parser.add_argument('--max-trees', type=int, default=None,
+                        help="age out the oldest trees so that at most this many remain")
+    parser.add_argument('--recent', type=int, default=0,
+                        help="also fit the new trees on the last N rows of the base data")
+    parser.add_argument('--holdout', type=float, default=0.2,
+                        help="fraction of the new rows held out for the accuracy comparison")
+    parser.add_argument('--no-compare', action='store_true', help="skip the full retrain used for comparison")
+    parser.add_argument('--tag', action='append', default=None,
+                        help="registry reference(s) to point at the grown model (default: latest)")
+    parser.add_argument('--no-publish', action='store_true', help="don't publish the grown model to the registry")
+    parser.add_argument('--save', action='store_true',
+                        help=f"also overwrite {MODEL_PATH}/{SCALER_PATH} and the compiled artifacts used by app.py")
+    return parser.parse_args(argv)
+
+
+def load_base(name):
+    # The forest and scaler to grow, from the registry or, when nothing has
+    # been published yet, from the files main.py saves
+    try:
+        version = resolve(name)
+    except KeyError:
+        if name != 'latest' or not os.path.exists(MODEL_PATH):
+            raise
+        print(f"No registry version {name!r}, growing {MODEL_PATH}")
+        return joblib.load(MODEL_PATH), joblib.load(SCALER_PATH), None, {}
+    directory = version_dir(version)
+    model = joblib.load(os.path.join(directory, MODEL_FILE))
+    scaler = joblib.load(os.path.join(directory, SCALER_FILE))
+    return model, scaler, version, read_entry(version)
+
+
+def encode_new_rows(path, encodings):
+    # Encode new patients with the codes the base model was trained on;
+    # refitting a LabelEncoder could give the same value a different code
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.lower()
+    for col in categorical_cols:
+        codes = df[col].astype(str).map(encodings[col])
+        unknown = sorted(df.loc[codes.isna(), col].astype(str).unique())
+        if unknown:
+            raise ValueError(f"{path}: column '{col}' has values the base model never saw: {unknown}")
+        df[col] = codes.astype(np.int64)
+    return df
+
+
+def pad_missing_classes(X_fit, y_fit, X_pool, y_pool, classes):
+    # Every tree in a forest must vote over the same classes, so a class the
+    # new rows lack is filled in from the base training rows
+    missing = [c for c in classes if c not in set(y_fit)]
+    if missing:
+        mask = np.isin(y_pool, missing)
+        X_fit = np.vstack([X_fit, X_pool[mask]])
+        y_fit = np.concatenate([y_fit, y_pool[mask]])
+        print(f"New rows have no class {np.array(missing).tolist()}: added {int(mask.sum())} base rows of it")
+    return X_fit, y_fit
+
+
+def scaled(scaler, X, feature_cols):
+    # The scaler was fitted on a DataFrame, so give it the column names back
+    return scaler.transform(pd.DataFrame(X, columns=feature_cols))
+
+
+def grow_forest(model, X_fit, y_fit, add_trees, max_trees=None):
+    # warm_start keeps the fitted trees and only fits the extra estimators
+    n_before = len(model.estimators_)
+    model.set_params(warm_start=True, n_estimators=n_before + add_trees)
+    model.fit(X_fit, y_fit)
+
+    # Age out the oldest trees (they were fitted first) beyond the window
+    dropped = 0
+    if max_trees is not None and len(model.estimators_) > max_trees:
+        dropped = len(model.estimators_) - max_trees
+        model.estimators_ = model.estimators_[dropped:]
+        model.n_estimators = len(model.estimators_)
+    model.set_params(warm_start=False)
+    return model, dropped
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    model, scaler, base_version, entry = load_base(args.base)
+    if not isinstance(model, RandomForestClassifier):
+        raise SystemExit(f"Base model is a {type(model).__name__}; incremental training needs a random forest")
+    print(f"Base model: {base_version or MODEL_PATH} ({len(model.estimators_)} trees)")
+
+    # Base data (cached) and the new rows encoded the same way
+    base_path = args.base_data or entry.get('training_data', {}).get('path') or DATA_PATH
+    base_df = load_dataset(base_path)
+    encodings = entry.get('encodings') or base_df.attrs['encodings']
+    new_df = pd.concat([encode_new_rows(path, encodings) for path in args.new_data], ignore_index=True)
+    feature_cols = [col for col in base_df.columns if col != 'classification']
+
+    X_base = base_df[feature_cols].to_numpy(dtype=np.float64)
+    y_base = base_df['classification'].to_numpy()
+    X_new = new_df[feature_cols].to_numpy(dtype=np.float64)
+    y_new = new_df['classification'].to_numpy()
+
+    # Held out for the comparison: the base model's own test rows plus a
+    # slice of the new ones; neither model trains on them
+    base_train, base_test = holdout_indices(base_df['classification'])
+    new_train, new_test = train_test_split(np.arange(len(new_df)), test_size=args.holdout, random_state=42)
+    print(f"{len(new_df)} new rows: {len(new_train)} to train on, {len(new_test)} held out")
+
+    # Incremental: new trees on the new rows (plus optionally the most recent
+    # base rows), scaled with the scaler the existing trees expect
+    start = time.perf_counter()
+    X_fit, y_fit = X_new[new_train], y_new[new_train]
+    if args.recent:
+        recent = base_train[base_train >= len(base_df) - args.recent]
+        X_fit, y_fit = np.vstack([X_base[recent], X_fit]), np.concatenate([y_base[recent], y_fit])
+    X_fit, y_fit = pad_missing_classes(X_fit, y_fit, X_base[base_train], y_base[base_train], model.classes_)
+    model, dropped = grow_forest(model, scaled(scaler, X_fit, feature_cols), y_fit, args.add_trees, args.max_trees)
+    incremental_seconds = time.perf_counter() - start
+    print(f"Incremental: +{args.add_trees} trees, -{dropped} aged out, {len(model.estimators_)} total "
+          f"in {incremental_seconds:.2f}s")
+
+    test_sets = {
+        'base holdout': (X_base[base_test], y_base[base_test]),
+        'new holdout': (X_new[new_test], y_new[new_test]),
+        'combined': (np.vstack([X_base[base_test], X_new[new_test]]),
+                     np.concatenate([y_base[base_test], y_new[new_test]])),
+    }
+    accuracies = {'incremental': {name: accuracy_score(y, model.predict(scaled(scaler, X, feature_cols)))
+                                  for name, (X, y) in test_sets.items() if len(y)}}
+
+    # Full retrain on the same rows, as main.py would: fresh scaler, fresh
+    # forest of the same size and parameters
+    if not args.no_compare:
+        start = time.perf_counter()
+        X_all = np.vstack([X_base[base_train], X_new[new_train]])
+        y_all = np.concatenate([y_base[base_train], y_new[new_train]])
+        full_scaler = StandardScaler().fit(pd.DataFrame(X_all, columns=feature_cols))
+        full_model = clone(model).set_params(warm_start=False, n_estimators=len(model.estimators_))
+        full_model.fit(scaled(full_scaler, X_all, feature_cols), y_all)
+        full_seconds = time.perf_counter() - start
+        accuracies['full retrain'] = {name: accuracy_score(y, full_model.predict(scaled(full_scaler, X, feature_cols)))
+                                      for name, (X, y) in test_sets.items() if len(y)}
+
+        print(f"\n{'':<14}{'fit time':>10}" + ''.join(f'{name:>15}' for name in accuracies['incremental']))
+        for label, seconds in (('incremental', incremental_seconds), ('full retrain', full_seconds)):
+            print(f"{label:<14}{seconds:>9.2f}s" + ''.join(f'{acc * 100:>14.2f}%' for acc in accuracies[label].values()))
+        print(f"Incremental fit took {incremental_seconds / full_seconds:.0%} of the full retrain time")
+
+    if args.save:
+        save_best_model(model, scaler, pd.DataFrame(np.vstack([X_base, X_new]), columns=feature_cols))
+
+    if not args.no_publish:
+        version = publish(model, scaler, {
+            'model_name': 'Random Forest',
+            'params': model.get_params(),
+            'feature_cols': feature_cols,
+            'encodings': encodings,
+            'metrics': {'accuracy': accuracies['incremental']['combined'],
+                        'holdout_accuracies': accuracies},
+            'training_data': entry.get('training_data') or {'path': base_path, 'rows': len(base_df),
+                                                            'sha256': file_sha256(base_path)},
+            'incremental': {
+                'base_version': base_version,
+                'trees_added': args.add_trees,
+                'trees_dropped': dropped,
+                'recent_base_rows': args.recent,
+                'new_data': [{'path': path, 'sha256': file_sha256(path)} for path in args.new_data],
+                'new_rows': len(new_df),
+                'history': entry.get('incremental', {}).get('history', []) + [base_version],
+            },
+        }, tags=args.tag or ['latest'])
+        print(f"✅ Published to the model registry as version {version}")
+    return model
+
+
+if __name__ == "__main__":
+    main()
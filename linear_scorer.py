@@ -0,0 +1,124 @@
+import warnings
+
+import numpy as np
+
+# libsvm clips pairwise probabilities to [MIN_PROB, 1 - MIN_PROB]
+MIN_PROB = 1e-7
+
+
+class LinearSVMScorer:
+    # A fitted SVC(kernel='linear', probability=True) compiled down to plain
+    # arrays. The StandardScaler is folded into the weights, so scoring raw
+    # features is one matrix product for the one-vs-one decision values plus
+    # libsvm's Platt sigmoids and pairwise coupling.
+
+    kind = 'linear_svm'
+
+    def __init__(self, classes, weights, intercepts, prob_a, prob_b):
+        self.classes_ = np.asarray(classes)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.intercepts = np.asarray(intercepts, dtype=np.float64)
+        self.prob_a = np.asarray(prob_a, dtype=np.float64)
+        self.prob_b = np.asarray(prob_b, dtype=np.float64)
+
+        # Class pairs in libsvm's one-vs-one order: (0, 1), (0, 2), ..., (1, 2), ...
+        n_classes = len(self.classes_)
+        self.pairs = np.array([(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)],
+                              dtype=np.intp).reshape(-1, 2)
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None):
+        if getattr(model, 'kernel', None) != 'linear':
+            raise ValueError("Only SVC(kernel='linear') models can be compiled")
+        if not getattr(model, 'probability', False):
+            raise ValueError("The SVC must be fitted with probability=True")
+
+        # Undo sklearn's sign flip so we work with libsvm's raw decision values
+        weights = np.array(model.coef_, dtype=np.float64)
+        intercepts = np.array(model.intercept_, dtype=np.float64)
+        if len(model.classes_) == 2:
+            weights, intercepts = -weights, -intercepts
+
+        # Fold (x - mean) / scale into the weights and intercepts
+        if scaler is not None:
+            mean = scaler.mean_ if scaler.with_mean else np.zeros(weights.shape[1])
+            scale = scaler.scale_ if scaler.with_std else np.ones(weights.shape[1])
+            weights = weights / scale
+            intercepts = intercepts - weights @ mean
+
+        with warnings.catch_warnings():
+            # probA_/probB_ are deprecated along with probability=True in newer sklearn
+            warnings.simplefilter('ignore', FutureWarning)
+            prob_a, prob_b = model.probA_, model.probB_
+
+        return cls(model.classes_, weights, intercepts, prob_a, prob_b)
+
+    def decision_values(self, X):
+        # Raw one-vs-one decision values, shape (n_samples, n_pairs)
+        return np.asarray(X, dtype=np.float64) @ self.weights.T + self.intercepts
+
+    def predict(self, X):
+        # One-vs-one voting, ties going to the lower class index like libsvm
+        dec = self.decision_values(X)
+        votes = np.zeros((dec.shape[0], len(self.classes_)), dtype=np.intp)
+        positive = dec > 0
+        for p, (i, j) in enumerate(self.pairs):
+            votes[:, i] += positive[:, p]
+            votes[:, j] += ~positive[:, p]
+        return self.classes_.take(votes.argmax(axis=1))
+
+    def predict_proba(self, X):
+        dec = self.decision_values(X)
+
+        # Platt sigmoid per pair, written the same numerically stable way as libsvm
+        f = dec * self.prob_a + self.prob_b
+        pairwise = np.where(f >= 0, np.exp(-np.abs(f)) / (1.0 + np.exp(-np.abs(f))),
+                            1.0 / (1.0 + np.exp(np.minimum(f, 0))))
+        pairwise = np.clip(pairwise, MIN_PROB, 1 - MIN_PROB)
+
+        # r[:, i, j] is the probability of class i against class j
+        n_classes = len(self.classes_)
+        r = np.zeros((dec.shape[0], n_classes, n_classes))
+        for p, (i, j) in enumerate(self.pairs):
+            r[:, i, j] = pairwise[:, p]
+            r[:, j, i] = 1 - pairwise[:, p]
+        return _couple_pairwise(r)
+
+    def to_arrays(self):
+        # Everything needed to rebuild the scorer, as plain arrays and parameters
+        arrays = {'classes': self.classes_, 'weights': self.weights, 'intercepts': self.intercepts,
+                  'prob_a': self.prob_a, 'prob_b': self.prob_b}
+        return arrays, {}
+
+    @classmethod
+    def from_arrays(cls, arrays, params):
+        return cls(arrays['classes'], arrays['weights'], arrays['intercepts'],
+                   arrays['prob_a'], arrays['prob_b'])
+
+
+def _couple_pairwise(r):
+    # Vectorized port of libsvm's multiclass_probability (Wu, Lin and Weng,
+    # method 2), iterating each sample until it meets libsvm's own stopping rule.
+    # sklearn's libsvm runs this for binary problems too, so there is no shortcut
+    n_samples, k = r.shape[:2]
+    Q = -r.transpose(0, 2, 1) * r
+    diag = np.arange(k)
+    Q[:, diag, diag] = (r ** 2).sum(axis=1)
+    p = np.full((n_samples, k), 1.0 / k)
+    eps = 0.005 / k
+    active = np.ones(n_samples, dtype=bool)
+
+    for _ in range(max(100, k)):
+        Qp = np.einsum('ntj,nj->nt', Q, p)
+        pQp = (p * Qp).sum(axis=1)
+        active &= np.abs(Qp - pQp[:, None]).max(axis=1) >= eps
+        if not active.any():
+            break
+
+        for t in range(k):
+            diff = np.where(active, (-Qp[:, t] + pQp) / Q[:, t, t], 0.0)
+            p[:, t] += diff
+            pQp = (pQp + diff * (diff * Q[:, t, t] + 2 * Qp[:, t])) / (1 + diff) / (1 + diff)
+            Qp = (Qp + diff[:, None] * Q[:, t, :]) / (1 + diff)[:, None]
+            p /= (1 + diff)[:, None]
+    return p
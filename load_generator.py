@@ -0,0 +1,308 @@
+import argparse
+import http.client
+import importlib
+import itertools
+import json
+import math
+import re
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from bench_stages import load_forms
+from training import DATA_PATH
+
+# Fewest sender threads an open-loop level starts, however low its rate
+MIN_OPEN_LOOP_THREADS = 16
+
+# Request line of an access log entry, as werkzeug (app.run, serve.py) prints it:
+# 127.0.0.1 - - [18/Oct/2026 10:00:00] "POST /predict HTTP/1.1" 200 -
+ACCESS_LOG_REQUEST = re.compile(r'"([A-Z]+) (\S+) HTTP/[\d.]+"')
+
+# Patients per replayed /predict/batch request when the log has no bodies
+REPLAY_BATCH_SIZE = 16
+
+# Histogram resolution: 2**SUB_BUCKET_BITS linear sub-buckets per power of two
+# (under 1% relative error), as in HdrHistogram
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF = SUB_BUCKETS >> 1
+
+
+class LatencyHistogram:
+    # Log-linear histogram of latencies in microseconds. Recording is O(1) and
+    # the memory use is fixed whatever the run length; percentiles are
+    # reported as the upper edge of their bucket.
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    @staticmethod
+    def _index(value):
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return SUB_BUCKETS + (shift - 1) * HALF + ((value >> shift) - HALF)
+
+    @staticmethod
+    def _upper(index):
+        if index < SUB_BUCKETS:
+            return index
+        shift, offset = divmod(index - SUB_BUCKETS, HALF)
+        return ((offset + HALF + 1) << (shift + 1)) - 1
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1e6))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum_us += value
+        self.max_us = max(self.max_us, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, pct):
+        if not self.total:
+            return 0
+        target = max(1, math.ceil(self.total * pct / 100.0))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._upper(index), self.max_us)
+        return self.max_us
+
+    def summary_ms(self):
+        summary = {f'p{label}': self.percentile(pct) / 1000 for label, pct in
+                   (('50', 50), ('95', 95), ('99', 99), ('999', 99.9))}
+        summary['mean'] = self.sum_us / self.total / 1000 if self.total else 0.0
+        summary['max'] = self.max_us / 1000
+        return summary
+
+
+def sample_payloads(path, n, endpoint):
+    # Form posts built from real patient rows in the CSV
+    return [('POST', endpoint, body.encode(), 'application/x-www-form-urlencoded') for body in load_forms(path, n)]
+
+
+def replay_payloads(path, forms):
+    # Each line is either a recorded request as JSON, {"path": ..., "method":
+    # ..., "form": {...}} or {"json": ...} for JSON bodies (method defaults to
+    # POST), or a werkzeug access log line. Access logs carry no bodies, so
+    # their POSTs are filled with the sampled patient `forms` in turn: one per
+    # /predict, REPLAY_BATCH_SIZE as a JSON list per /predict/batch. Lines that
+    # are neither (startup messages in a captured log) are skipped
+    patients = itertools.cycle(forms)
+    payloads = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if not line.lstrip().startswith('{'):
+                match = ACCESS_LOG_REQUEST.search(line)
+                if match is None:
+                    continue
+                method, target = match.groups()
+                if method != 'POST':
+                    payloads.append((method, target, b'', 'application/x-www-form-urlencoded'))
+                elif urlsplit(target).path == '/predict/batch':
+                    batch = [dict(parse_qsl(next(patients))) for _ in range(REPLAY_BATCH_SIZE)]
+                    payloads.append((method, target, json.dumps(batch).encode(), 'application/json'))
+                else:
+                    payloads.append((method, target, next(patients).encode(), 'application/x-www-form-urlencoded'))
+                continue
+            entry = json.loads(line)
+            if 'json' in entry:
+                body, content_type = json.dumps(entry['json']).encode(), 'application/json'
+            else:
+                body, content_type = urlencode(entry.get('form', {})).encode(), 'application/x-www-form-urlencoded'
+            payloads.append((entry.get('method', 'POST'), entry.get('path', '/predict'), body, content_type))
+    if not payloads:
+        raise ValueError(f"No requests found in {path}")
+    return payloads
+
+
+class InProcessTarget:
+    # Calls the Flask app through its test client, one client per thread
+
+    def __init__(self, module_name):
+        self.app = importlib.import_module(module_name).app
+        self._local = threading.local()
+
+    def send(self, method, path, body, content_type):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client.open(path, method=method, data=body, content_type=content_type).status_code
+
+
+class HttpTarget:
+    # Keep-alive HTTP connection per thread to a running server
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self._local = threading.local()
+
+    def send(self, method, path, body, content_type):
+        for attempt in range(2):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                conn.request(method, path, body=body, headers={'Content-Type': content_type})
+                response = conn.getresponse()
+                response.read()
+                if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                    conn.close()
+                    self._local.conn = None
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                # The server dropped an idle keep-alive connection; reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+
+def run_level(target, payloads, concurrency, rate, duration, warmup):
+    # Closed loop (rate is None): each of `concurrency` threads sends its next
+    # request as soon as the previous one returns. Open loop: requests are
+    # scheduled every 1/rate seconds and latency is measured from the scheduled
+    # time, so a backed-up server is not hidden by coordinated omission.
+    payload_iter = itertools.cycle(payloads)
+    lock = threading.Lock()
+    tick = itertools.count()
+    start = time.perf_counter() + 0.05
+    measure_from = start + warmup
+    stop = measure_from + duration
+    histograms, statuses = [], {}
+
+    def worker():
+        histogram = LatencyHistogram()
+        local_statuses = {}
+        while True:
+            with lock:
+                payload = next(payload_iter)
+                n = next(tick)
+            scheduled = start + n / rate if rate else None
+            now = time.perf_counter()
+            if scheduled is not None:
+                if scheduled >= stop:
+                    break
+                if scheduled > now:
+                    time.sleep(scheduled - now)
+            elif now >= stop:
+                break
+            sent = time.perf_counter()
+            try:
+                status = target.send(*payload)
+            except Exception as e:
+                status = type(e).__name__
+            done = time.perf_counter()
+            began = scheduled if scheduled is not None else sent
+            if began >= measure_from:
+                histogram.record(done - began)
+                local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            histograms.append(histogram)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = max(time.perf_counter(), stop) - measure_from
+
+    histogram = LatencyHistogram()
+    for part in histograms:
+        histogram.merge(part)
+    errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+    return {
+        'mode': 'open' if rate else 'closed',
+        'concurrency': concurrency,
+        'target_rate': rate,
+        'requests': histogram.total,
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'throughput_rps': histogram.total / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': histogram.summary_ms(),
+    }
+
+
+def open_loop_threads(rate, latency_budget):
+    # Sender threads for an open-loop level: enough for `rate` requests/sec to
+    # keep leaving on schedule while each takes up to `latency_budget` seconds
+    return max(MIN_OPEN_LOOP_THREADS, math.ceil(rate * latency_budget))
+
+
+def parse_list(kind):
+    return lambda text: [kind(item) for item in text.split(',') if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the CKD apps and report latency percentiles")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--app', default='app', help="import this module and call its Flask app in-process")
+    target.add_argument('--url', help="send real HTTP requests to a running server, e.g. http://127.0.0.1:5000")
+    parser.add_argument('--concurrency', type=parse_list(int), default=None,
+                        help="worker threads (default 1); a comma-separated list runs one level per value. "
+                             "With --rate, the largest value is the open-loop thread count")
+    parser.add_argument('--rate', type=parse_list(float), default=None,
+                        help="open loop: requests/sec to schedule (comma-separated list for a sweep)")
+    parser.add_argument('--latency-budget', type=float, default=1.0,
+                        help="open loop without --concurrency: start rate x this many seconds of threads "
+                             f"(at least {MIN_OPEN_LOOP_THREADS}) so responses this slow don't delay later sends")
+    parser.add_argument('--duration', type=float, default=10.0, help="measured seconds per level")
+    parser.add_argument('--warmup', type=float, default=2.0, help="unmeasured seconds before each level")
+    parser.add_argument('--data', default=DATA_PATH, help="CSV to sample patient rows from")
+    parser.add_argument('--samples', type=int, default=1000, help="distinct patient rows to cycle through")
+    parser.add_argument('--endpoint', default='/predict', help="path sampled rows are posted to")
+    parser.add_argument('--replay',
+                        help="replay requests from a JSON-lines file or a werkzeug access log instead of sampling")
+    parser.add_argument('--output', '-o', help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        payloads = replay_payloads(args.replay, load_forms(args.data, args.samples))
+    else:
+        payloads = sample_payloads(args.data, args.samples, args.endpoint)
+    client = HttpTarget(args.url) if args.url else InProcessTarget(args.app)
+
+    if args.rate:
+        # Open loop: enough threads that a slow server can't throttle the schedule
+        levels = [(max(args.concurrency) if args.concurrency else open_loop_threads(rate, args.latency_budget), rate)
+                  for rate in args.rate]
+    else:
+        levels = [(concurrency, None) for concurrency in args.concurrency or [1]]
+
+    results = []
+    for concurrency, rate in levels:
+        result = run_level(client, payloads, concurrency, rate, args.duration, args.warmup)
+        results.append(result)
+        latency = result['latency_ms']
+        print(f"{result['mode']:>6} c={concurrency:<4} rate={rate or '-':<8} {result['requests']:>8} req "
+              f"{result['throughput_rps']:9.1f} req/s  p50 {latency['p50']:8.2f}  p95 {latency['p95']:8.2f}  "
+              f"p99 {latency['p99']:8.2f}  p999 {latency['p999']:8.2f}  max {latency['max']:8.2f} ms  "
+              f"errors {result['errors']}", file=sys.stderr)
+
+    report = {'target': args.url or f'in-process:{args.app}', 'payloads': len(payloads), 'levels': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
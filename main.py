@@ -1,101 +1,142 @@
 # Import required libraries
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.svm import SVC
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.metrics import accuracy_score, confusion_matrix
-import joblib
-
-# Load the cleaned dataset
-df = pd.read_csv("cleaned_ckd_data.csv")
-
-# Convert all column names to lowercase (to avoid inconsistency)
-df.columns = df.columns.str.lower()
-
-# Encode categorical variables
-le = LabelEncoder()
-categorical_cols = ['rbc', 'pc', 'pcc', 'ba', 'htn', 'dm', 'cad', 'appet', 'pe', 'ane', 'classification']
-for col in categorical_cols:
-    df[col] = le.fit_transform(df[col])
-
-# Check if all data types are correct
-df.info()
-
-# Split features and target
-X = df.drop(columns=['classification'])
-y = df['classification']
-
-# Standardize numerical features
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-
-# Split into train and test sets (stratified sampling to balance classes)
-X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42, stratify=y)
-
-# Define models for comparison
-models = {
-    "Random Forest": RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42),
-    "SVM": SVC(kernel='linear', probability=True),
-    "Decision Tree": DecisionTreeClassifier(max_depth=10, random_state=42)
-}
-
-# Train models and evaluate accuracy
-accuracy_scores = {}
-conf_matrices = {}
-
-for name, model in models.items():
-    model.fit(X_train, y_train)
-    y_pred = model.predict(X_test)
-    accuracy_scores[name] = accuracy_score(y_test, y_pred) * 100  # Convert to percentage
-    conf_matrices[name] = confusion_matrix(y_test, y_pred)
-
-# Print accuracy scores
-print("Model Accuracies:")
-for model, acc in accuracy_scores.items():
-    print(f"{model}: {acc:.2f}%")  # Display accuracy in percentage format
-
-# Find the best model based on accuracy
-best_model_name = max(accuracy_scores, key=accuracy_scores.get)
-best_model = models[best_model_name]
-best_cm = conf_matrices[best_model_name]
-
-# Save the best model and scaler
-joblib.dump(best_model, 'best_model.joblib')
-joblib.dump(scaler, 'scaler.joblib')
-
-print(f"\n✅ Best Model: {best_model_name} with Accuracy: {accuracy_scores[best_model_name]:.2f}%")
-print("✅ Model and scaler have been saved for web application use")
-
-# Display the confusion matrix of the best model
-plt.figure(figsize=(6, 5))
-sns.heatmap(best_cm, annot=True, fmt='d', cmap='Blues', xticklabels=['Not CKD', 'CKD'], yticklabels=['Not CKD', 'CKD'])
-plt.xlabel("Predicted")
-plt.ylabel("Actual")
-plt.title(f"Confusion Matrix - Best Model ({best_model_name})")
-plt.show()
-
-# Plot accuracy comparison (Bar Graph)
-plt.figure(figsize=(6, 5))
-sns.barplot(x=list(accuracy_scores.keys()), y=list(accuracy_scores.values()), palette='viridis')
-plt.xlabel("Model")
-plt.ylabel("Accuracy (%)")  # Update y-axis label
-plt.title("Comparison of Models (Bar Graph)")
-plt.ylim(80, 100)  # Adjust y-axis range for better visualization
-plt.show()
-
-# Plot accuracy comparison (Line Graph)
-plt.figure(figsize=(6, 5))
-plt.plot(list(accuracy_scores.keys()), list(accuracy_scores.values()), marker='o', linestyle='-', color='b')
-plt.xlabel("Model")
-plt.ylabel("Accuracy (%)")  # Update y-axis label
-plt.title("Comparison of Models (Line Graph)")
-plt.ylim(80, 100)  # Adjust y-axis range
-plt.grid()
-plt.show()
-
-print(f"\n✅ Best Model: {best_model_name} with Accuracy: {accuracy_scores[best_model_name]:.2f}%")  # Display as percentage
+import argparse
+import time
+
+from artifacts import file_sha256
+from model_registry import publish
+from model_search import search_models
+from training import (DATA_PATH, build_models, load_dataset, prepare_data, save_best_model,
+                      train_parallel, train_sequential)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train and compare CKD prediction models")
+    parser.add_argument('--data', default=DATA_PATH, help="cleaned CKD dataset (CSV)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="re-parse the CSV instead of loading the cached encoded copy")
+    parser.add_argument('--parallel', action='store_true',
+                        help="fit the candidate models concurrently in a process pool")
+    parser.add_argument('--cores', type=int, default=None,
+                        help="core budget for --parallel (default: all cores)")
+    parser.add_argument('--search', action='store_true',
+                        help="tune each model with cached successive-halving cross-validation first")
+    parser.add_argument('--folds', type=int, default=5, help="cross-validation folds for --search")
+    parser.add_argument('--tag', action='append', default=[],
+                        help="extra registry reference to point at the new model (repeatable), e.g. candidate")
+    parser.add_argument('--no-publish', action='store_true', help="don't publish the best model to the registry")
+    parser.add_argument('--no-plots', action='store_true',
+                        help="headless run: save the best model without importing or showing any plots")
+    return parser.parse_args(argv)
+
+
+def plot_results(best_model_name, best_cm, accuracy_scores):
+    # Plotting libraries are only imported when plots are actually shown
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Display the confusion matrix of the best model
+    plt.figure(figsize=(6, 5))
+    sns.heatmap(best_cm, annot=True, fmt='d', cmap='Blues', xticklabels=['Not CKD', 'CKD'], yticklabels=['Not CKD', 'CKD'])
+    plt.xlabel("Predicted")
+    plt.ylabel("Actual")
+    plt.title(f"Confusion Matrix - Best Model ({best_model_name})")
+    plt.show()
+
+    # Plot accuracy comparison (Bar Graph)
+    plt.figure(figsize=(6, 5))
+    sns.barplot(x=list(accuracy_scores.keys()), y=list(accuracy_scores.values()), palette='viridis')
+    plt.xlabel("Model")
+    plt.ylabel("Accuracy (%)")  # Update y-axis label
+    plt.title("Comparison of Models (Bar Graph)")
+    plt.ylim(80, 100)  # Adjust y-axis range for better visualization
+    plt.show()
+
+    # Plot accuracy comparison (Line Graph)
+    plt.figure(figsize=(6, 5))
+    plt.plot(list(accuracy_scores.keys()), list(accuracy_scores.values()), marker='o', linestyle='-', color='b')
+    plt.xlabel("Model")
+    plt.ylabel("Accuracy (%)")  # Update y-axis label
+    plt.title("Comparison of Models (Line Graph)")
+    plt.ylim(80, 100)  # Adjust y-axis range
+    plt.grid()
+    plt.show()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Load and encode the cleaned dataset
+    df = load_dataset(args.data, use_cache=not args.no_cache)
+
+    # Check if all data types are correct
+    df.info()
+
+    X, y, scaler, X_train, X_test, y_train, y_test = prepare_data(df)
+
+    # Tune hyperparameters on the training split only, reusing cached fold results
+    params = None
+    if args.search:
+        best = search_models(build_models(), X_train, y_train, n_splits=args.folds, n_jobs=args.cores)
+        for name, result in best.items():
+            print(f"{name}: best CV accuracy {result['score'] * 100:.2f}% with {result['params']}")
+        params = {name: result['params'] for name, result in best.items()}
+
+    # Train models and evaluate accuracy
+    models = build_models(params=params)
+    start = time.perf_counter()
+    if args.parallel:
+        results = train_parallel(models, X_train, y_train, X_test, y_test, cores=args.cores)
+    else:
+        results = train_sequential(models, X_train, y_train, X_test, y_test)
+    print(f"Training took {time.perf_counter() - start:.2f}s")
+
+    models = {name: model for name, model, _, _ in results}
+    accuracy_scores = {name: accuracy for name, _, accuracy, _ in results}
+    conf_matrices = {name: cm for name, _, _, cm in results}
+
+    # Print accuracy scores
+    print("Model Accuracies:")
+    for model, acc in accuracy_scores.items():
+        print(f"{model}: {acc:.2f}%")  # Display accuracy in percentage format
+
+    # Find the best model based on accuracy
+    best_model_name = max(accuracy_scores, key=accuracy_scores.get)
+    best_model = models[best_model_name]
+    best_cm = conf_matrices[best_model_name]
+
+    # Save the best model and scaler (plus the compiled serving artifacts)
+    save_best_model(best_model, scaler, X)
+
+    print(f"\n✅ Best Model: {best_model_name} with Accuracy: {accuracy_scores[best_model_name]:.2f}%")
+    print("✅ Model and scaler have been saved for web application use")
+
+    # Publish the model, scaler and everything needed to reproduce its inputs to the registry
+    if not args.no_publish:
+        version = publish(best_model, scaler, {
+            'model_name': best_model_name,
+            'params': best_model.get_params(),
+            'feature_cols': list(X.columns),
+            'encodings': df.attrs.get('encodings'),
+            'metrics': {'accuracy': accuracy_scores[best_model_name] / 100,
+                        'confusion_matrix': best_cm.tolist(),
+                        'candidate_accuracies': {name: acc / 100 for name, acc in accuracy_scores.items()}},
+            'training_data': {'path': args.data, 'rows': len(df),
+                              'sha256': df.attrs.get('sha256') or file_sha256(args.data)},
+        }, tags=['latest', *args.tag])
+        print(f"✅ Published to the model registry as version {version}")
+
+    if not args.no_plots:
+        plot_results(best_model_name, best_cm, accuracy_scores)
+
+    print(f"\n✅ Best Model: {best_model_name} with Accuracy: {accuracy_scores[best_model_name]:.2f}%")  # Display as percentage
+    return models, best_model_name, scaler, X
+
+
+def train_headless(argv=()):
+    # Entry point for the web apps when no saved model exists: train and save
+    # without matplotlib/seaborn and without blocking on plot windows
+    return main(['--no-plots', *argv])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, request
+
+# Histogram bucket upper bounds in seconds (the last bucket is +Inf)
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+class _StageTimer:
+    # `with metrics.time('encode'):` records the block's duration under the
+    # stage, and counts an error for the stage if the block raises
+
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.metrics.count_error(self.stage, exc_type.__name__)
+        return False
+
+
+class Metrics:
+    # Per-stage latency histograms plus error and request counters for one
+    # process. Recording is a bisect and a few integer increments; the text
+    # exposition is only built when /metrics is scraped.
+
+    def __init__(self, app_name):
+        self.app_name = app_name
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._errors = {}
+        self._requests = {}
+
+    def time(self, stage):
+        return _StageTimer(self, stage)
+
+    def observe(self, stage, seconds):
+        index = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [[0] * (len(BUCKETS) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+
+    def count_error(self, stage, error):
+        with self._lock:
+            self._errors[(stage, error)] = self._errors.get((stage, error), 0) + 1
+
+    def count_request(self, endpoint, status):
+        with self._lock:
+            self._requests[(endpoint, status)] = self._requests.get((endpoint, status), 0) + 1
+
+    def attach(self, flask_app):
+        # Time every request end to end, count responses by endpoint and
+        # status, and serve the exposition at /metrics
+        @flask_app.before_request
+        def start_request_timer():
+            request.environ['metrics.start'] = time.perf_counter()
+
+        @flask_app.after_request
+        def record_request(response):
+            start = request.environ.get('metrics.start')
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            if start is not None and endpoint != '/metrics':
+                self.observe('request', time.perf_counter() - start)
+                self.count_request(endpoint, response.status_code)
+            return response
+
+        @flask_app.route('/metrics')
+        def metrics_endpoint():
+            return Response(self.render(), content_type=CONTENT_TYPE)
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        with self._lock:
+            histograms = {stage: (list(counts), total) for stage, (counts, total) in self._histograms.items()}
+            errors = dict(self._errors)
+            requests = dict(self._requests)
+
+        lines = ['# HELP ckd_stage_duration_seconds Time spent in each prediction pipeline stage.',
+                 '# TYPE ckd_stage_duration_seconds histogram']
+        for stage, (counts, total) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                labels = _labels(app=self.app_name, stage=stage, le=bound)
+                lines.append(f'ckd_stage_duration_seconds_bucket{{{labels}}} {cumulative}')
+            labels = _labels(app=self.app_name, stage=stage)
+            lines.append(f'ckd_stage_duration_seconds_sum{{{labels}}} {total:.9g}')
+            lines.append(f'ckd_stage_duration_seconds_count{{{labels}}} {cumulative}')
+
+        lines += ['# HELP ckd_errors_total Exceptions raised inside a pipeline stage.',
+                  '# TYPE ckd_errors_total counter']
+        for (stage, error), count in sorted(errors.items()):
+            lines.append(f'ckd_errors_total{{{_labels(app=self.app_name, stage=stage, error=error)}}} {count}')
+
+        lines += ['# HELP ckd_requests_total HTTP responses by endpoint and status code.',
+                  '# TYPE ckd_requests_total counter']
+        for (endpoint, status), count in sorted(requests.items()):
+            lines.append(f'ckd_requests_total{{{_labels(app=self.app_name, endpoint=endpoint, status=status)}}} {count}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+def _bucket(n):
+    # Power-of-two histogram bucket label: 1, 2, 4, 8, ...
+    return 1 << max(int(n) - 1, 0).bit_length()
+
+
+class MicroBatcher:
+    # Coalesces concurrent single-row requests into one batched call. The first
+    # queued row opens a window of `max_wait` seconds; everything queued before
+    # the window closes (up to `max_batch` rows) is scored together and each
+    # waiting request gets its own row of the result back.
+
+    def __init__(self, score_batch, max_wait=0.002, max_batch=64):
+        # score_batch takes a (n, n_features) array and returns a sequence of n results
+        self.score_batch = score_batch
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._worker_pid = None
+
+        self.batches = 0
+        self.rows = 0
+        self.batch_size_histogram = {}
+        self.queue_depth_histogram = {}
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, so (re)start the dispatcher in each process
+        if self._worker_pid != os.getpid():
+            self._worker_pid = os.getpid()
+            threading.Thread(target=self._run, name='micro-batcher', daemon=True).start()
+
+    def submit(self, row):
+        # Queue one feature row and block until its batch has been scored
+        future = Future()
+        with self._cond:
+            self._ensure_worker()
+            self._pending.append((np.asarray(row, dtype=np.float64).reshape(-1), future))
+            depth = len(self._pending)
+            self.queue_depth_histogram[_bucket(depth)] = self.queue_depth_histogram.get(_bucket(depth), 0) + 1
+            self._cond.notify()
+        return future.result()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._pending), self.max_batch)
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            rows = np.vstack([row for row, _ in batch])
+            try:
+                results = self.score_batch(rows)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._cond:
+                self.batches += 1
+                self.rows += len(batch)
+                size = _bucket(len(batch))
+                self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_wait_ms': self.max_wait * 1000,
+                'max_batch': self.max_batch,
+                'queued': len(self._pending),
+                'batches': self.batches,
+                'rows': self.rows,
+                'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self.batch_size_histogram.items())},
+                'queue_depth_histogram': {str(k): v for k, v in sorted(self.queue_depth_histogram.items())},
+            }
@@ -0,0 +1,173 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from artifacts import artifacts_match, load_artifacts, save_artifacts
+
+# Local model registry: one directory per version, named by the content hash
+# of its model and scaler, plus named references (latest, production, ...)
+REGISTRY_DIR = os.path.join('models', 'registry')
+ENTRY = 'entry.json'
+MODEL_FILE = 'model.joblib'
+SCALER_FILE = 'scaler.joblib'
+
+
+def _versions_dir(registry):
+    return os.path.join(registry, 'versions')
+
+
+def _refs_dir(registry):
+    return os.path.join(registry, 'refs')
+
+
+def version_dir(version, registry=REGISTRY_DIR):
+    return os.path.join(_versions_dir(registry), version)
+
+
+def _write_atomic(path, text):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def publish(model, scaler, metadata, tags=('latest',), registry=REGISTRY_DIR):
+    # Store model + scaler (and their compiled arrays) under a version id
+    # derived from their bytes, with `metadata` (feature order, encodings,
+    # metrics, training data hash, ...) in entry.json. Publishing identical
+    # files again reuses the existing version. Returns the version id.
+    import joblib
+    from scorers import compile_scorer
+
+    os.makedirs(_versions_dir(registry), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=_versions_dir(registry), prefix='.publish-')
+    try:
+        model_path = os.path.join(tmp_dir, MODEL_FILE)
+        scaler_path = os.path.join(tmp_dir, SCALER_FILE)
+        joblib.dump(model, model_path)
+        joblib.dump(scaler, scaler_path)
+
+        digest = hashlib.sha256()
+        for path in (model_path, scaler_path):
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        version = digest.hexdigest()[:16]
+
+        target = version_dir(version, registry)
+        if not os.path.exists(target):
+            scorer = compile_scorer(model, scaler)
+            if scorer.kind != 'sklearn':
+                save_artifacts(os.path.join(tmp_dir, 'compiled'), scorer, sources=[model_path, scaler_path])
+            entry = dict(metadata, version=version, created=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                         scorer_kind=scorer.kind, classes=[c.item() if hasattr(c, 'item') else c for c in model.classes_])
+            with open(os.path.join(tmp_dir, ENTRY), 'w') as f:
+                json.dump(entry, f, indent=2, default=str)
+            try:
+                os.replace(tmp_dir, target)
+            except OSError:
+                # Another publisher stored the same version first
+                pass
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for name in tags:
+        tag(version, name, registry)
+    return version
+
+
+def tag(version, name, registry=REGISTRY_DIR):
+    # Point a named reference at a version
+    if not os.path.exists(os.path.join(version_dir(version, registry), ENTRY)):
+        raise KeyError(f"Unknown model version {version!r}")
+    os.makedirs(_refs_dir(registry), exist_ok=True)
+    _write_atomic(os.path.join(_refs_dir(registry), name), version + '\n')
+
+
+def ref_path(name, registry=REGISTRY_DIR):
+    return os.path.join(_refs_dir(registry), name)
+
+
+def resolve(name, registry=REGISTRY_DIR):
+    # A reference name, a full version id or an unambiguous version prefix
+    try:
+        with open(ref_path(name, registry)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    try:
+        matches = [v for v in os.listdir(_versions_dir(registry)) if v.startswith(name) and not v.startswith('.')]
+    except FileNotFoundError:
+        matches = []
+    if len(matches) != 1:
+        raise KeyError(f"No single model version matches {name!r}" + (f" ({len(matches)} do)" if matches else ""))
+    return matches[0]
+
+
+def read_entry(version, registry=REGISTRY_DIR):
+    with open(os.path.join(version_dir(version, registry), ENTRY)) as f:
+        return json.load(f)
+
+
+def load_version(name, registry=REGISTRY_DIR):
+    # Scorer and metadata for a named version, memory-mapping its compiled
+    # arrays when it has them
+    version = resolve(name, registry)
+    directory = version_dir(version, registry)
+    model_path = os.path.join(directory, MODEL_FILE)
+    scaler_path = os.path.join(directory, SCALER_FILE)
+    compiled_dir = os.path.join(directory, 'compiled')
+    if artifacts_match(compiled_dir, [model_path, scaler_path]):
+        scorer = load_artifacts(compiled_dir)
+    else:
+        import joblib
+        from scorers import compile_scorer
+        scorer = compile_scorer(joblib.load(model_path), joblib.load(scaler_path))
+    return scorer, read_entry(version, registry)
+
+
+def list_versions(registry=REGISTRY_DIR):
+    # Every stored entry, newest first, with the references pointing at it
+    refs = {}
+    if os.path.isdir(_refs_dir(registry)):
+        for name in os.listdir(_refs_dir(registry)):
+            if not name.endswith('.tmp'):
+                refs.setdefault(resolve(name, registry), []).append(name)
+    entries = []
+    if os.path.isdir(_versions_dir(registry)):
+        for version in os.listdir(_versions_dir(registry)):
+            if not version.startswith('.'):
+                entry = read_entry(version, registry)
+                entry['refs'] = sorted(refs.get(version, []))
+                entries.append(entry)
+    return sorted(entries, key=lambda entry: entry['created'], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and tag models in the local registry")
+    parser.add_argument('--registry', default=REGISTRY_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="list stored versions")
+    show = commands.add_parser('show', help="print one version's entry")
+    show.add_argument('name')
+    tag_parser = commands.add_parser('tag', help="point a reference (e.g. production) at a version")
+    tag_parser.add_argument('version')
+    tag_parser.add_argument('name')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for entry in list_versions(args.registry):
+            accuracy = entry.get('metrics', {}).get('accuracy')
+            print(f"{entry['version']}  {entry['created']}  {entry.get('model_name', '?'):<14} "
+                  f"acc={accuracy if accuracy is not None else '?'}  {' '.join(entry['refs'])}")
+    elif args.command == 'show':
+        print(json.dumps(read_entry(resolve(args.name, args.registry), args.registry), indent=2))
+    else:
+        tag(resolve(args.version, args.registry), args.name, args.registry)
+
+
+if __name__ == "__main__":
+    main()
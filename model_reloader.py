@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def ckd_class_for(classes):
+    # With the stray third label in the training data class 0 is "ckd";
+    # a clean binary model uses 1 (see app.py)
+    return 0 if len(classes) == 3 else 1
+
+
+class ModelBundle:
+    # Everything a request needs from one model version. A bundle is never
+    # modified after it is built; swapping models means replacing the whole
+    # bundle, so a request that picked one up sees a consistent set.
+
+    __slots__ = ('scorer', 'classes', 'ckd_class', 'non_ckd_class', 'ckd_index', 'version', 'loaded_at')
+
+    def __init__(self, scorer, version):
+        self.scorer = scorer
+        self.classes = scorer.classes_
+        self.ckd_class = ckd_class_for(self.classes)
+        self.non_ckd_class = 1 - self.ckd_class
+        self.ckd_index = int(np.where(self.classes == self.ckd_class)[0][0])
+        self.version = version
+        self.loaded_at = time.time()
+
+
+class ModelReloader:
+    # Serves one ModelBundle at a time and replaces it when the watched model
+    # files change. A background thread notices the change, waits until the
+    # files have stopped changing, loads the new model, validates it, warms it
+    # with the given rows and only then swaps it in with a single reference
+    # assignment. A model that fails to load or validate is logged and the
+    # current one keeps serving.
+
+    def __init__(self, load_model, watch_paths, warmup_rows, check_interval=2.0, warmup_rounds=3):
+        # load_model() returns (scorer, version id)
+        self.load_model = load_model
+        self.watch_paths = list(watch_paths)
+        self.warmup_rows = np.asarray(warmup_rows, dtype=np.float64)
+        self.check_interval = check_interval
+        self.warmup_rounds = warmup_rounds
+
+        self.current = None
+        self.state = 'starting'
+        self.reloading = False
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self._stamp = None
+        self._watch_pid = None
+        self._fork_hook = False
+        self._lock = threading.Lock()
+
+    def _artifact_stamp(self):
+        stamp = []
+        for path in self.watch_paths:
+            try:
+                info = os.stat(path)
+                stamp.append((info.st_mtime_ns, info.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _build(self, initial=False):
+        # Load, validate and warm a new bundle without touching self.current
+        if initial:
+            self.state = 'loading'
+        scorer, version = self.load_model()
+        bundle = ModelBundle(scorer, version)
+
+        # Validate: well-formed probabilities and labels the model knows about
+        probas = scorer.predict_proba(self.warmup_rows)
+        labels = scorer.predict(self.warmup_rows)
+        if probas.shape != (len(self.warmup_rows), len(bundle.classes)):
+            raise ValueError(f"predict_proba returned shape {probas.shape}")
+        if not np.all(np.isfinite(probas)) or not np.allclose(probas.sum(axis=1), 1.0, atol=1e-6):
+            raise ValueError("predict_proba returned invalid probabilities")
+        if not np.isin(labels, bundle.classes).all():
+            raise ValueError("predict returned labels outside classes_")
+
+        # Warm up: fault in memory-mapped arrays and run the single-row and
+        # batch paths a few times before any request depends on them
+        if initial:
+            self.state = 'warming'
+        for _ in range(self.warmup_rounds):
+            for row in self.warmup_rows[:8]:
+                scorer.predict_proba(row.reshape(1, -1))
+            scorer.predict_proba(self.warmup_rows)
+        return bundle
+
+    def load(self):
+        # Initial, blocking load at startup
+        with self._lock:
+            self._stamp = self._artifact_stamp()
+            self.current = self._build(initial=True)
+            self.state = 'ready'
+        return self.current
+
+    def reload(self):
+        # Build the new bundle off the request path, then swap it in whole
+        with self._lock:
+            self.reloading = True
+            try:
+                stamp = self._artifact_stamp()
+                bundle = self._build()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f'{type(e).__name__}: {e}'
+                print(f"Model reload failed, still serving {self.current.version}: {self.last_error}")
+                return False
+            finally:
+                self.reloading = False
+            self._stamp = stamp
+            previous, self.current = self.current, bundle
+            self.reloads += 1
+            self.last_error = None
+        print(f"Model reloaded: {previous.version} -> {bundle.version}")
+        return True
+
+    def start(self):
+        # Threads don't survive fork, so each process (re)starts its own watcher
+        if self._watch_pid != os.getpid():
+            self._watch_pid = os.getpid()
+            threading.Thread(target=self._watch, name='model-reloader', daemon=True).start()
+        if not self._fork_hook and hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.start)
+            self._fork_hook = True
+
+    def _watch(self):
+        pending = None
+        while True:
+            time.sleep(self.check_interval)
+            stamp = self._artifact_stamp()
+            if stamp == self._stamp or stamp[0] is None:
+                pending = None
+                continue
+            # Only reload once the files have stopped changing for a whole
+            # interval, so a half-written model is never picked up
+            if stamp != pending:
+                pending = stamp
+                continue
+            pending = None
+            if not self.reload():
+                # Don't retry the same broken files until they change again
+                self._stamp = stamp
+
+    def status(self):
+        bundle = self.current
+        return {
+            'ready': self.state == 'ready',
+            'state': self.state,
+            'reloading': self.reloading,
+            'version': bundle.version if bundle else None,
+            'loaded_at': bundle.loaded_at if bundle else None,
+            'classes': bundle.classes.tolist() if bundle else None,
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,171 @@
+import itertools
+import json
+import math
+import os
+import warnings
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+CACHE_DIR = os.path.join('.cache', 'search')
+
+# Hyperparameter grids searched for each candidate in training.build_models()
+PARAM_GRIDS = {
+    "Random Forest": {'n_estimators': [50, 100, 200], 'max_depth': [4, 6, 10, None], 'min_samples_leaf': [1, 2, 4]},
+    "SVM": {'C': [0.01, 0.1, 1, 10, 100]},
+    "Decision Tree": {'max_depth': [3, 5, 10, None], 'min_samples_leaf': [1, 2, 5, 10], 'criterion': ['gini', 'entropy']},
+}
+
+
+def expand_grid(grid):
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+class FoldCache:
+    # One small JSON file per evaluated (data, model and all its parameters,
+    # fold, resources) cell, so re-runs and extended grids only fit the cells
+    # they haven't seen
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as f:
+                score = json.load(f)['score']
+        except (FileNotFoundError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return score
+
+    def put(self, key, score):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'score': score}, f)
+        os.replace(tmp_path, path)
+
+
+def estimator_hash(estimator, params):
+    # Everything about the estimator that can change a fold's score: its class
+    # and the full parameters it is fitted with, including the fixed settings
+    # from build_models (kernel, probability, random_state, ...). n_jobs only
+    # changes speed, so it is left out
+    settings = clone(estimator).set_params(**params).get_params(deep=True)
+    settings.pop('n_jobs', None)
+    return joblib.hash((type(estimator).__module__, type(estimator).__name__, settings))
+
+
+def _fit_fold(estimator, params, X, y, train, test):
+    # Scale inside the fold so the held-out rows never leak into the scaler
+    model = make_pipeline(StandardScaler(), clone(estimator).set_params(**params))
+    model.fit(X[train], y[train])
+    return accuracy_score(y[test], model.predict(X[test]))
+
+
+def successive_halving(estimators, X, y, grids=PARAM_GRIDS, n_splits=5, factor=3,
+                       min_resources=40, random_state=42, cache=None, n_jobs=None, verbose=True):
+    # Successive halving over every (candidate, params) pair: all of them are
+    # cross-validated on a small sample of rows, the best 1/factor move on to a
+    # sample `factor` times larger, until the last round uses every row.
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    cache = cache if cache is not None else FoldCache()
+    data_hash = joblib.hash((X, y))
+
+    candidates = [(name, params) for name in grids if name in estimators for params in expand_grid(grids[name])]
+    if not candidates:
+        raise ValueError("No parameter grid matches the given estimators")
+
+    # Resource levels come from a fixed ladder n, n/factor, n/factor^2, ... so
+    # cached cells stay valid when the grid (and so the number of rounds) changes
+    n_rounds = 1 + max(0, math.ceil(math.log(len(candidates), factor)))
+    n_rows = len(y)
+    ladder = [n_rows // factor ** level for level in range(n_rounds)]
+    ladder = [n for n in ladder if n >= min_resources] or [n_rows]
+    resources = ladder[::-1]
+
+    # Rows are added in a fixed shuffled order, so each round's sample contains the previous one
+    order = np.random.default_rng(random_state).permutation(n_rows)
+
+    history = []
+    scores = {}
+    for round_index, n_resources in enumerate(resources):
+        rows = np.sort(order[:n_resources])
+        X_round, y_round = X[rows], y[rows]
+        with warnings.catch_warnings():
+            # Tiny classes (the stray 'ckd\t' label) trigger StratifiedKFold's size warning
+            warnings.simplefilter('ignore', UserWarning)
+            folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(X_round, y_round))
+
+        # Work out which cells still need fitting
+        cells, pending = {}, []
+        for name, params in candidates:
+            for fold_index, (train, test) in enumerate(folds):
+                key = joblib.hash((data_hash, name, estimator_hash(estimators[name], params), n_splits, fold_index,
+                                   n_resources, random_state))
+                score = cache.get(key)
+                if score is None:
+                    pending.append((key, name, params, train, test))
+                cells[(name, repr(params), fold_index)] = (key, score)
+
+        fitted = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_fold)(estimators[name], params, X_round, y_round, train, test)
+            for _, name, params, train, test in pending)
+        new_scores = {}
+        for (key, *_), score in zip(pending, fitted):
+            cache.put(key, float(score))
+            new_scores[key] = float(score)
+
+        # Mean accuracy across folds for every candidate still in the race
+        scores = {}
+        for name, params in candidates:
+            fold_scores = []
+            for fold_index in range(n_splits):
+                key, score = cells[(name, repr(params), fold_index)]
+                fold_scores.append(score if score is not None else new_scores[key])
+            scores[(name, repr(params))] = float(np.mean(fold_scores))
+
+        history.append({'round': round_index, 'resources': int(n_resources), 'candidates': len(candidates),
+                        'fitted': len(pending), 'cached': len(cells) - len(pending)})
+        if verbose:
+            print(f"Round {round_index}: {len(candidates)} candidates on {n_resources} rows "
+                  f"({len(pending)} folds fitted, {len(cells) - len(pending)} from cache)")
+
+        # Keep the top 1/factor (at least one) for the next round
+        ranked = sorted(candidates, key=lambda c: scores[(c[0], repr(c[1]))], reverse=True)
+        if round_index < len(resources) - 1:
+            candidates = ranked[:max(1, math.ceil(len(ranked) / factor))]
+        else:
+            candidates = ranked
+
+    results = [{'model': name, 'params': params, 'score': scores[(name, repr(params))]} for name, params in candidates]
+    return results, history
+
+
+def search_models(estimators, X, y, grids=PARAM_GRIDS, **kwargs):
+    # Race each model family separately so every candidate comes out with its
+    # own tuned parameters; returns {name: {'params': ..., 'score': ...}}
+    best = {}
+    for name, estimator in estimators.items():
+        if name not in grids:
+            continue
+        if kwargs.get('verbose', True):
+            print(f"Searching {name} ({len(expand_grid(grids[name]))} parameter sets)")
+        results, _ = successive_halving({name: estimator}, X, y, {name: grids[name]}, **kwargs)
+        best[name] = {'params': results[0]['params'], 'score': results[0]['score']}
+    return best
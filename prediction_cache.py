@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    # Bounded LRU cache of prediction results keyed on the encoded feature row.
+    # Rows are rounded to `decimals` before hashing so resubmitted panels that
+    # differ only by float noise share an entry. Entries expire after `ttl`
+    # seconds, and the whole cache is dropped when any watched model file
+    # changes on disk.
+
+    def __init__(self, maxsize=4096, ttl=300.0, decimals=6, watch_paths=(), check_interval=1.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.decimals = decimals
+        self.watch_paths = list(watch_paths)
+        self.check_interval = check_interval
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = self._artifact_stamp()
+        self._next_check = time.monotonic() + check_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _artifact_stamp(self):
+        stamp = []
+        for path in self.watch_paths:
+            try:
+                info = os.stat(path)
+                stamp.append((info.st_mtime_ns, info.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def key(self, row):
+        # Adding 0.0 turns -0.0 into 0.0 so both round to the same bytes
+        return (np.round(np.asarray(row, dtype=np.float64), self.decimals) + 0.0).tobytes()
+
+    def _check_artifacts(self, now):
+        # Called with the lock held; stat the model files at most once per interval
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        stamp = self._artifact_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._entries.clear()
+            self.invalidations += 1
+
+    def get(self, key):
+        if self.maxsize <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._check_artifacts(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires < now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
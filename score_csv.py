@@ -0,0 +1,81 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from artifacts import load_scorer
+from feature_schema import FEATURE_COLS, FeatureSchema, label_encoder_codes
+from model_reloader import ckd_class_for
+from training import MODEL_PATH, SCALER_PATH
+
+# Output columns, named like the fields of app.py's /predict/batch results
+RESULT_COLS = ['index', 'is_ckd', 'ckd_probability', 'errors']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score a patient CSV in constant memory with the saved best model")
+    parser.add_argument('input', help="patient CSV with the same columns as cleaned_ckd_data.csv")
+    parser.add_argument('output', help="CSV to write one result row per input row to")
+    parser.add_argument('--chunksize', type=int, default=10000, help="rows read, encoded and scored at a time")
+    parser.add_argument('--keep-columns', action='store_true',
+                        help="copy the input feature columns into the output (not its classification column)")
+    return parser.parse_args(argv)
+
+
+def score_chunk(scorer, schema, chunk, ckd):
+    # Normalize headers and stray whitespace the way the cleaned CSV needs
+    chunk.columns = chunk.columns.str.lower()
+    for col in chunk.columns:
+        if not pd.api.types.is_numeric_dtype(chunk[col]):
+            chunk[col] = chunk[col].str.strip()
+
+    rows, invalid = schema.encode_frame(chunk)
+    bad = invalid.any(axis=1)
+
+    is_ckd = np.full(len(chunk), None, dtype=object)
+    ckd_probability = np.full(len(chunk), np.nan)
+    errors = np.full(len(chunk), '', dtype=object)
+    if not bad.all():
+        # One vectorized call per chunk for every row that encoded cleanly
+        valid = ~bad
+        ckd_index = np.where(scorer.classes_ == ckd)[0][0]
+        is_ckd[valid] = scorer.predict(rows[valid]) == ckd
+        ckd_probability[valid] = scorer.predict_proba(rows[valid])[:, ckd_index]
+    for i in np.flatnonzero(bad):
+        errors[i] = '; '.join(f'invalid or missing value for {col!r}'
+                              for col, invalid_col in zip(FEATURE_COLS, invalid[i]) if invalid_col)
+
+    result = pd.DataFrame(dict(zip(RESULT_COLS, [chunk.index, is_ckd, ckd_probability, errors])))
+    return result, int(bad.sum())
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scorer = load_scorer(MODEL_PATH, SCALER_PATH)
+    schema = FeatureSchema(FEATURE_COLS, label_encoder_codes())
+    ckd = ckd_class_for(scorer.classes_)
+
+    total = failed = 0
+    start = time.perf_counter()
+    with open(args.output, 'w', newline='') as out:
+        # Only one chunk is in memory at a time; results are appended as they are scored
+        for chunk in pd.read_csv(args.input, chunksize=args.chunksize):
+            result, n_failed = score_chunk(scorer, schema, chunk, ckd)
+            if args.keep_columns:
+                # is_ckd is the only label in the output; a classification
+                # column in the input would read as a second one
+                features = chunk[[col for col in chunk.columns if col not in RESULT_COLS + ['classification']]]
+                result = pd.concat([features.reset_index(drop=True), result.reset_index(drop=True)], axis=1)
+            result.to_csv(out, header=total == 0, index=False)
+            total += len(result)
+            failed += n_failed
+    elapsed = time.perf_counter() - start
+
+    rate = total / elapsed if elapsed > 0 else float('inf')
+    print(f"Scored {total} rows ({failed} failed) in {elapsed:.2f}s: {rate:,.0f} rows/sec", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
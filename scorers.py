@@ -0,0 +1,62 @@
+import numpy as np
+
+from linear_scorer import LinearSVMScorer
+from tree_engine import TreeEnsembleScorer
+
+
+class SklearnScorer:
+    # Fallback scorer for models we cannot compile: standardize the raw rows
+    # with the fitted StandardScaler statistics, then defer to the estimator
+
+    kind = 'sklearn'
+
+    def __init__(self, model, scaler):
+        self.model = model
+        self.classes_ = model.classes_
+        self.mean = scaler.mean_ if scaler.with_mean else None
+        self.scale = scaler.scale_ if scaler.with_std else None
+
+    def standardize(self, X):
+        # Same arithmetic as StandardScaler.transform, without its input checks
+        X = np.array(X, dtype=np.float64)
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+    def predict(self, X):
+        return self.model.predict(self.standardize(X))
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(self.standardize(X))
+
+
+def compile_scorer(model, scaler):
+    # Pick the fastest scorer that reproduces model + scaler on raw features.
+    # sklearn is imported here rather than at module level so that serving
+    # from compiled artifacts never pays for importing it
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+    from sklearn.tree import DecisionTreeClassifier
+
+    if getattr(model, 'kernel', None) == 'linear' and getattr(model, 'probability', False):
+        return LinearSVMScorer.from_sklearn(model, scaler)
+    if isinstance(model, (DecisionTreeClassifier, RandomForestClassifier, ExtraTreesClassifier)):
+        return TreeEnsembleScorer.from_sklearn(model, scaler)
+    return SklearnScorer(model, scaler)
+
+
+def check_against_sklearn(scorer, model, scaler, X_raw, atol=1e-6):
+    # Compare a compiled scorer with scaler + estimator on raw feature rows and
+    # fail loudly if the probabilities or labels drift apart
+    X_raw = np.asarray(X_raw, dtype=np.float64)
+    X_scaled = (X_raw - scaler.mean_) / scaler.scale_ if scaler is not None else X_raw
+    expected = model.predict_proba(X_scaled)
+    actual = scorer.predict_proba(X_raw)
+    max_error = float(np.abs(expected - actual).max()) if len(X_raw) else 0.0
+    if max_error > atol:
+        raise AssertionError(f"Compiled probabilities differ from sklearn by {max_error:.3g} (atol={atol})")
+    mismatched = int((scorer.predict(X_raw) != model.predict(X_scaled)).sum())
+    if mismatched:
+        raise AssertionError(f"Compiled labels differ from sklearn on {mismatched} rows")
+    return max_error
@@ -0,0 +1,227 @@
+import argparse
+import gc
+import importlib
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+
+from werkzeug.serving import make_server
+
+# How often an idle worker wakes up to check whether it should stop
+POLL_INTERVAL = 1.0
+
+# A worker that dies sooner than this after starting counts towards a crash loop
+MIN_WORKER_LIFETIME = 2.0
+
+
+def cpu_count():
+    # CPUs this process may actually use: its affinity mask, capped by a
+    # cgroup v2 CPU quota when it runs in a container
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) // int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-fork server for the CKD prediction apps (POSIX only)")
+    parser.add_argument('--app', default='app', help="module holding the Flask `app` (app or hello)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('CKD_WORKERS', 0)) or None,
+                        help="number of forked worker processes (default: one per usable CPU)")
+    parser.add_argument('--backlog', type=int, default=1024, help="listen queue shared by all workers")
+    parser.add_argument('--max-requests', type=int, default=0,
+                        help="recycle a worker after this many requests (0: never)")
+    parser.add_argument('--max-requests-jitter', type=int, default=0,
+                        help="add up to this many requests to each worker's limit so they don't all restart at once")
+    parser.add_argument('--max-worker-age', type=float, default=0,
+                        help="recycle a worker after this many seconds (0: never), with up to 10%% jitter")
+    parser.add_argument('--graceful-timeout', type=float, default=30,
+                        help="seconds a stopping worker may spend finishing its request before it is killed")
+    return parser.parse_args()
+
+
+class Worker:
+    # One forked process serving requests from the shared listening socket.
+    # It stops between requests, never in the middle of one: on SIGTERM, or
+    # once it has served its request or age limit
+
+    def __init__(self, flask_app, host, sock, max_requests=0, max_age=0):
+        self.flask_app = flask_app
+        self.host = host
+        self.sock = sock
+        self.max_requests = max_requests
+        self.deadline = time.monotonic() + max_age if max_age else None
+        self.requests = 0
+        self.stopping = False
+
+    def count_requests(self, environ, start_response):
+        self.requests += 1
+        return self.flask_app(environ, start_response)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def should_stop(self):
+        return (self.stopping
+                or (self.max_requests and self.requests >= self.max_requests)
+                or (self.deadline is not None and time.monotonic() >= self.deadline))
+
+    def run(self):
+        # SIGTERM from the parent stops gracefully; Ctrl-C and SIGHUP are the
+        # parent's to handle
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        server = make_server(self.host, self.sock.getsockname()[1], self.count_requests, fd=self.sock.fileno())
+        server.timeout = POLL_INTERVAL
+        while not self.should_stop():
+            # Accepts and answers at most one connection, or times out
+            server.handle_request()
+
+
+class Arbiter:
+    # Forks the workers from a parent that has already imported the app (and
+    # so loaded the model), replaces any worker that exits, and handles:
+    #   SIGHUP           recycle every worker, one at a time
+    #   SIGTERM/SIGINT   stop the workers gracefully, then exit
+
+    def __init__(self, flask_app, args, sock):
+        self.flask_app = flask_app
+        self.args = args
+        self.sock = sock
+        self.workers = {}
+        self.recycle_queue = []
+        self.recycling = None
+        self.stopping = False
+        self.recent_crashes = 0
+
+    def spawn(self):
+        args = self.args
+        max_requests = args.max_requests + random.randint(0, args.max_requests_jitter) if args.max_requests else 0
+        max_age = args.max_worker_age * random.uniform(1.0, 1.1) if args.max_worker_age else 0
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                Worker(self.flask_app, args.host, self.sock, max_requests, max_age).run()
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os._exit(status)
+        self.workers[pid] = time.monotonic()
+        return pid
+
+    def handle_hup(self, signum, frame):
+        self.recycle_queue = list(self.workers)
+
+    def handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def reap(self):
+        # Collect exited workers; returns [(pid, status, seconds alive)]
+        exited = []
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            started = self.workers.pop(pid, None)
+            if started is not None:
+                exited.append((pid, status, time.monotonic() - started))
+        return exited
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self.handle_hup)
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        for _ in range(self.args.workers):
+            self.spawn()
+
+        while not self.stopping:
+            for pid, status, alive in self.reap():
+                code = os.waitstatus_to_exitcode(status)
+                if code != 0:
+                    print(f"Worker {pid} exited with {code} after {alive:.1f}s")
+                self.recent_crashes = self.recent_crashes + 1 if code != 0 and alive < MIN_WORKER_LIFETIME else 0
+                if pid == self.recycling:
+                    self.recycling = None
+
+            # Refill the pool, backing off if new workers keep dying at startup
+            while len(self.workers) < self.args.workers and not self.stopping:
+                if self.recent_crashes:
+                    time.sleep(min(30, 0.5 * 2 ** self.recent_crashes))
+                self.spawn()
+
+            # Rolling recycle: the next old worker is only stopped once the
+            # previous one has been replaced, so capacity drops by at most one
+            if self.recycling is None and self.recycle_queue:
+                pid = self.recycle_queue.pop(0)
+                if pid in self.workers:
+                    self.recycling = pid
+                    os.kill(pid, signal.SIGTERM)
+            time.sleep(0.1)
+
+        self.shutdown()
+
+    def shutdown(self):
+        # Ask every worker to finish its current request, then kill stragglers
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.args.graceful_timeout + POLL_INTERVAL
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.workers:
+            print(f"Worker {pid} did not stop within {self.args.graceful_timeout:.0f}s, killing it")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+
+
+def main():
+    args = parse_args()
+    if args.workers is None:
+        args.workers = cpu_count()
+
+    # Import the app in the parent: the model is loaded (or memory-mapped) once
+    # and every forked worker shares those pages instead of loading its own copy
+    flask_app = importlib.import_module(args.app).app
+
+    sock = socket.create_server((args.host, args.port), backlog=args.backlog, reuse_port=False)
+    sock.set_inheritable(True)
+    # Non-blocking, so a worker that loses the race for a connection goes back
+    # to waiting (and can notice it should stop) instead of blocking in accept()
+    sock.setblocking(False)
+
+    # Move everything loaded so far out of the collector's reach, so garbage
+    # collection in the workers doesn't write to (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+
+    arbiter = Arbiter(flask_app, args, sock)
+    print(f"Serving {args.app}:app on http://{args.host}:{sock.getsockname()[1]} with {args.workers} workers "
+          f"(pid {os.getpid()}; SIGHUP recycles them)")
+    arbiter.run()
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
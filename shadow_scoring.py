@@ -0,0 +1,94 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class ShadowScorer:
+    # Scores the rows the live model has just scored with a candidate model on
+    # a small background pool, off the response path, and tracks how often
+    # the two disagree. When more than `max_pending` batches are waiting, new
+    # ones are dropped rather than queued, so a slow candidate can never back
+    # up into serving.
+
+    def __init__(self, scorer, version, max_workers=1, max_pending=64, log_every=1000):
+        self.scorer = scorer
+        self.version = version
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.log_every = log_every
+
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._pending = 0
+        self._next_log = log_every
+
+        self.rows = 0
+        self.disagreements = 0
+        self.abs_proba_diff = 0.0
+        self.dropped = 0
+        self.errors = 0
+
+    def _executor(self):
+        # Called with the lock held; pool threads don't survive fork, so each
+        # process gets its own pool
+        if self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='shadow')
+            self._pool_pid = os.getpid()
+            self._pending = 0
+        return self._pool
+
+    def submit(self, rows, live_labels, live_probas=None, live_classes=None):
+        with self._lock:
+            pool = self._executor()
+            if self._pending >= self.max_pending:
+                self.dropped += len(rows)
+                return
+            self._pending += 1
+        pool.submit(self._compare, np.array(rows, dtype=np.float64), np.asarray(live_labels),
+                    None if live_probas is None else np.array(live_probas), live_classes)
+
+    def _compare(self, rows, live_labels, live_probas, live_classes):
+        try:
+            labels = self.scorer.predict(rows)
+            diff = 0.0
+            if live_probas is not None and np.array_equal(live_classes, self.scorer.classes_):
+                diff = float(np.abs(self.scorer.predict_proba(rows) - live_probas).sum(axis=1).sum())
+            disagreements = int((labels != live_labels).sum())
+        except Exception as e:
+            with self._lock:
+                self._pending -= 1
+                self.errors += 1
+            print(f"Shadow scoring with {self.version} failed: {type(e).__name__}: {e}")
+            return
+
+        with self._lock:
+            self._pending -= 1
+            self.rows += len(rows)
+            self.disagreements += disagreements
+            self.abs_proba_diff += diff
+            should_log = self.rows >= self._next_log
+            if should_log:
+                self._next_log = self.rows + self.log_every
+                stats = self._stats()
+        if should_log:
+            print(f"Shadow {self.version}: {stats['disagreement_rate']:.2%} label disagreement over "
+                  f"{stats['rows']} rows (mean |dp| {stats['mean_abs_proba_diff']:.4f}, {stats['dropped']} dropped)")
+
+    def _stats(self):
+        return {
+            'version': self.version,
+            'rows': self.rows,
+            'disagreements': self.disagreements,
+            'disagreement_rate': self.disagreements / self.rows if self.rows else 0.0,
+            'mean_abs_proba_diff': self.abs_proba_diff / self.rows if self.rows else 0.0,
+            'pending_batches': self._pending,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
+
+    def stats(self):
+        with self._lock:
+            return self._stats()
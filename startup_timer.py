@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+
+def process_age():
+    # Seconds since this process was started by the OS, so interpreter start-up
+    # counts towards cold start too (Linux only; 0.0 elsewhere)
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class StartupTimer:
+    # Measures how long an app takes from process start to being ready to
+    # serve, split into named phases, and how long until its first response
+    # went out. A budget (milliseconds) turns a slow start into a warning.
+
+    def __init__(self, budget_ms=None):
+        self.budget_ms = budget_ms
+        self.started = time.perf_counter() - process_age()
+        self.phases = {}
+        self.ready_ms = None
+        self.first_request_ms = None
+
+        self._last = self.started
+        self._lock = threading.Lock()
+        self._first_request_pid = None
+
+    def _since_start(self, now=None):
+        return ((now or time.perf_counter()) - self.started) * 1000
+
+    def mark(self, phase):
+        # Record the time spent since the previous mark under `phase`
+        now = time.perf_counter()
+        self.phases[phase] = (now - self._last) * 1000
+        self._last = now
+
+    def ready(self):
+        self.ready_ms = self._since_start()
+        phases = ', '.join(f'{name} {ms:.0f} ms' for name, ms in self.phases.items())
+        print(f"Startup took {self.ready_ms:.0f} ms ({phases})")
+        if self.over_budget():
+            print(f"Warning: startup exceeded its {self.budget_ms:.0f} ms budget", file=sys.stderr)
+
+    def over_budget(self):
+        return bool(self.budget_ms) and self.ready_ms is not None and self.ready_ms > self.budget_ms
+
+    def attach(self, flask_app):
+        # Time-to-first-request is recorded once per process (each forked
+        # serve.py worker reports its own)
+        @flask_app.after_request
+        def record_first_request(response):
+            if self._first_request_pid != os.getpid():
+                with self._lock:
+                    if self._first_request_pid != os.getpid():
+                        self._first_request_pid = os.getpid()
+                        self.first_request_ms = self._since_start()
+                        print(f"First request answered {self.first_request_ms:.0f} ms after process start")
+            return response
+
+    def stats(self):
+        return {
+            'budget_ms': self.budget_ms,
+            'ready_ms': self.ready_ms,
+            'over_budget': self.over_budget(),
+            'first_request_ms': self.first_request_ms,
+            'phases_ms': dict(self.phases),
+        }
+
+
+# Run in a fresh interpreter: import the app, send it one request, report the timings
+PROBE = """
+import json, sys
+module = __import__(sys.argv[1])
+module.app.test_client().get('/')
+print('STARTUP ' + json.dumps(module.startup.stats()))
+"""
+
+
+def measure(app_module, runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE, app_module], capture_output=True, text=True,
+                                check=True).stdout
+        line = next(line for line in output.splitlines() if line.startswith('STARTUP '))
+        samples.append(json.loads(line[len('STARTUP '):]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start of a CKD app against a time budget")
+    parser.add_argument('--app', default='app', help="module holding the Flask `app` and its `startup` timer")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="fail (exit 1) when the median time-to-first-request exceeds this")
+    args = parser.parse_args()
+
+    samples = measure(args.app, args.runs)
+    ready = statistics.median(s['ready_ms'] for s in samples)
+    first = statistics.median(s['first_request_ms'] for s in samples)
+    phases = {name: statistics.median(s['phases_ms'][name] for s in samples) for name in samples[0]['phases_ms']}
+    print(json.dumps({'app': args.app, 'runs': args.runs, 'median_ready_ms': ready,
+                      'median_first_request_ms': first, 'median_phases_ms': phases}, indent=2))
+    if args.budget_ms is not None and first > args.budget_ms:
+        print(f"Time to first request {first:.0f} ms is over the {args.budget_ms:.0f} ms budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import gzip
+import hashlib
+import zlib
+
+from flask import Response, request
+
+ENCODINGS = ('gzip', 'deflate', 'identity')
+
+
+class PrecompressedPage:
+    # A page that never changes while the process runs, rendered once and
+    # kept as identity, gzip and deflate bytes. Each encoding gets its own
+    # strong ETag; a matching If-None-Match is answered with 304 and no body.
+
+    def __init__(self, body, content_type='text/html; charset=utf-8'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.content_type = content_type
+        digest = hashlib.sha256(body).hexdigest()[:32]
+
+        # mtime=0 keeps the gzip bytes (and so the ETag) identical across restarts
+        self.variants = {
+            'identity': (body, f'"{digest}"'),
+            'gzip': (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gz"'),
+            'deflate': (zlib.compress(body, 9), f'"{digest}-df"'),
+        }
+
+    def response(self):
+        # Pick the encoding the client prefers (ties go to the smaller gzip)
+        encoding = request.accept_encodings.best_match(ENCODINGS, default='identity')
+        body, etag = self.variants[encoding]
+        headers = {
+            'ETag': etag,
+            'Vary': 'Accept-Encoding',
+            # Cacheable, but revalidated so a redeploy is picked up straight away
+            'Cache-Control': 'no-cache',
+        }
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+
+        if request.if_none_match.contains(etag.strip('"')):
+            return Response(status=304, headers=headers)
+        return Response(body, content_type=self.content_type, headers=headers)
@@ -0,0 +1,68 @@
+import csv
+import importlib
+import os
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(**env):
+    # Import app.py fresh from the repo root (it reads the model files by
+    # relative path) with the given CKD_* settings and no reload thread
+    cwd = os.getcwd()
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update({'CKD_RELOAD_INTERVAL': '0', **env})
+    try:
+        os.chdir(ROOT)
+        import app
+        return importlib.reload(app)
+    finally:
+        os.chdir(cwd)
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def patient_forms(n=None):
+    with open(os.path.join(ROOT, 'cleaned_ckd_data.csv'), newline='') as f:
+        records = list(csv.DictReader(f))[:n]
+    return [{key.lower(): value.strip() for key, value in record.items() if key != 'classification'}
+            for record in records]
+
+
+class PredictBatchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = load_app()
+        cls.client = cls.app.app.test_client()
+        cls.form = patient_forms(1)[0]
+
+    def test_error_text(self):
+        response = self.client.post('/predict/batch', json=[
+            dict(self.form, age='abc'),
+            dict(self.form, rbc=['normal']),
+            dict(self.form, bp='inf'),
+            'not a record',
+            self.form,
+        ])
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual((body['scored'], body['failed']), (1, 4))
+        results = body['results']
+        self.assertEqual(results[0], {'index': 0, 'errors': ["invalid or missing value for 'age'"]})
+        self.assertEqual(results[1], {'index': 1, 'errors': ["invalid or missing value for 'rbc'"]})
+        self.assertEqual(results[2], {'index': 2, 'errors': ["invalid or missing value for 'bp'"]})
+        self.assertEqual(results[3], {'index': 3, 'errors': ['record must be a JSON object']})
+        self.assertEqual(set(results[4]), {'index', 'is_ckd', 'ckd_probability'})
+
+    def test_missing_fields_listed_in_column_order(self):
+        form = {key: value for key, value in self.form.items() if key not in ('sod', 'age')}
+        errors = self.client.post('/predict/batch', json=[form]).get_json()['results'][0]['errors']
+        self.assertEqual(errors, ["invalid or missing value for 'age'", "invalid or missing value for 'sod'"])
+
+
+if __name__ == '__main__':
+    unittest.main()
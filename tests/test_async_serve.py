@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from async_serve import InferenceExecutor, Overloaded
+
+
+class InferenceExecutorTest(unittest.TestCase):
+    def test_full_queue_rejected_with_429(self):
+        async def scenario():
+            executor = InferenceExecutor(workers=1, queue_size=1, queue_timeout=5)
+            release = threading.Event()
+            running = asyncio.ensure_future(executor.run(release.wait))
+            queued = asyncio.ensure_future(executor.run(lambda: 'queued'))
+            await asyncio.sleep(0)
+            with self.assertRaises(Overloaded) as caught:
+                await executor.run(lambda: 'rejected')
+            release.set()
+            results = [(await running)[0], (await queued)[0]]
+            return executor, caught.exception, results
+
+        executor, error, results = asyncio.run(scenario())
+        self.assertEqual((error.status, str(error)), (429, 'Inference queue is full'))
+        self.assertGreaterEqual(error.retry_after, 1)
+        self.assertEqual(results, [True, 'queued'])
+        stats = executor.stats()
+        self.assertEqual((stats['rejected_queue_full'], stats['completed'], stats['in_flight']), (1, 2, 0))
+
+    def test_stale_call_dropped_with_503(self):
+        ran = []
+
+        async def scenario():
+            executor = InferenceExecutor(workers=1, queue_size=4, queue_timeout=0.05)
+            busy = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+            await asyncio.sleep(0)
+            with self.assertRaises(Overloaded) as caught:
+                await executor.run(ran.append, 'late')
+            await busy
+            return executor, caught.exception
+
+        executor, error = asyncio.run(scenario())
+        self.assertEqual(error.status, 503)
+        self.assertIn('for an inference thread', str(error))
+        # The call that waited too long never ran
+        self.assertEqual(ran, [])
+        self.assertEqual((executor.stats()['expired_in_queue'], executor.stats()['completed']), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
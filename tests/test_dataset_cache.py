@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import dataset_cache
+from dataset_cache import DatasetCache, load_encoded
+
+
+class DatasetCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = DatasetCache(os.path.join(self.tmp.name, 'cache'))
+        self.csv = os.path.join(self.tmp.name, 'data.csv')
+        self.write_csv('a,b\n1,2\n3,4\n')
+
+    def write_csv(self, text, mtime_ns=None):
+        with open(self.csv, 'w') as f:
+            f.write(text)
+        if mtime_ns is not None:
+            os.utime(self.csv, ns=(mtime_ns, mtime_ns))
+
+    def test_unchanged_stat_skips_rehash(self):
+        with mock.patch.object(dataset_cache, 'file_sha256', wraps=dataset_cache.file_sha256) as sha256:
+            first = self.cache.digest(self.csv)
+            self.assertEqual(self.cache.digest(self.csv), first)
+            self.assertEqual(sha256.call_count, 1)
+
+            # Same size, new mtime: hashed again, and the new content is seen
+            mtime_ns = os.stat(self.csv).st_mtime_ns
+            self.write_csv('a,b\n5,6\n7,8\n', mtime_ns=mtime_ns + 1_000_000_000)
+            self.assertNotEqual(self.cache.digest(self.csv), first)
+            self.assertEqual(sha256.call_count, 2)
+
+    def test_encode_runs_once_per_content(self):
+        calls = []
+
+        def encode(path):
+            calls.append(path)
+            return pd.read_csv(path)
+
+        first = load_encoded(self.csv, encode, self.cache)
+        second = load_encoded(self.csv, encode, self.cache)
+        self.assertEqual(len(calls), 1)
+        # The cached copy is memory-mapped, so compare values rather than array types
+        self.assertEqual(list(second.columns), list(first.columns))
+        np.testing.assert_array_equal(second.to_numpy(), first.to_numpy())
+
+
+if __name__ == '__main__':
+    unittest.main()
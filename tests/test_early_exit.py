@@ -0,0 +1,62 @@
+import os
+import unittest
+
+import joblib
+import numpy as np
+
+from early_exit import EarlyExitScorer, wrap_scorer
+from feature_schema import FEATURE_COLS
+from linear_scorer import LinearSVMScorer
+from training import read_dataset
+from tree_engine import TreeEnsembleScorer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(ROOT, 'cleaned_ckd_data.csv')
+
+
+class EarlyExitTest(unittest.TestCase):
+    # Stopping early must not change what the full forest would have said
+
+    @classmethod
+    def setUpClass(cls):
+        cls.X = read_dataset(DATA_PATH)[FEATURE_COLS].to_numpy(dtype=np.float64)
+        cls.forest = TreeEnsembleScorer.from_sklearn(joblib.load(os.path.join(ROOT, 'best_model.joblib')),
+                                                     joblib.load(os.path.join(ROOT, 'scaler.joblib')))
+        cls.labels = cls.forest.predict(cls.X)
+        cls.probas = cls.forest.predict_proba(cls.X)
+
+    def test_exact_mode_agrees_with_full_forest(self):
+        scorer = EarlyExitScorer(self.forest, min_trees=4)
+        labels, probas, used = scorer.score(self.X)
+        np.testing.assert_array_equal(labels, self.labels)
+        self.assertLess(used.mean(), self.forest.n_trees)
+        # Rows that needed every tree get the full forest's probabilities
+        full = used == self.forest.n_trees
+        np.testing.assert_allclose(probas[full], self.probas[full], rtol=0, atol=1e-12)
+        np.testing.assert_allclose(probas.sum(axis=1), 1.0)
+
+    def test_single_row_walk_matches_batch(self):
+        scorer = EarlyExitScorer(self.forest, min_trees=4)
+        batch_labels, _, _ = scorer.score(self.X)
+        for i in range(0, len(self.X), 7):
+            labels, probas, used = scorer.score(self.X[i:i + 1])
+            self.assertEqual(labels[0], batch_labels[i])
+            self.assertLessEqual(used[0], self.forest.n_trees)
+
+    def test_delta_mode_mostly_agrees_and_stops_sooner(self):
+        exact = EarlyExitScorer(self.forest, min_trees=4)
+        loose = EarlyExitScorer(self.forest, delta=0.01, min_trees=4)
+        labels, _, used = loose.score(self.X)
+        self.assertGreaterEqual((labels == self.labels).mean(), 0.99)
+        self.assertLessEqual(used.mean(), exact.score(self.X)[2].mean())
+
+    def test_wrap_scorer_only_wraps_forests(self):
+        self.assertIsInstance(wrap_scorer(self.forest, 'exact'), EarlyExitScorer)
+        self.assertIs(wrap_scorer(self.forest, ''), self.forest)
+        linear = LinearSVMScorer(self.forest.classes_[:2], np.zeros((1, len(FEATURE_COLS))), np.zeros(1),
+                                 np.zeros(1), np.zeros(1))
+        self.assertIs(wrap_scorer(linear, 'exact'), linear)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from export_model import check_parity, generate_source, import_path
+from feature_schema import FEATURE_COLS, FeatureSchema, label_encoder_codes
+from scorers import compile_scorer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(ROOT, 'cleaned_ckd_data.csv')
+
+
+class ExportedModuleParityTest(unittest.TestCase):
+    # The generated modules must score dataset rows (and encode the same
+    # forms) exactly as scaler + sklearn model and app.py's encoder do
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = joblib.load(os.path.join(ROOT, 'best_model.joblib'))
+        cls.scaler = joblib.load(os.path.join(ROOT, 'scaler.joblib'))
+        cls.scorer = compile_scorer(cls.model, cls.scaler)
+
+        df = pd.read_csv(DATA_PATH)
+        df.columns = df.columns.str.lower()
+        schema = FeatureSchema(FEATURE_COLS, label_encoder_codes())
+        cls.forms, rows = [], []
+        for record in df[FEATURE_COLS].to_dict('records'):
+            form = {col: str(value).strip() for col, value in record.items()}
+            try:
+                rows.append(schema.encode(form)[0])
+            except ValueError:
+                continue
+            cls.forms.append(form)
+        cls.X = np.vstack(rows)
+
+        X_scaled = cls.scaler.transform(pd.DataFrame(cls.X, columns=FEATURE_COLS))
+        cls.labels = cls.model.predict(X_scaled)
+        cls.probas = cls.model.predict_proba(X_scaled)
+
+    def generate(self, target, directory):
+        path = os.path.join(directory, f'ckd_model_{target}.py')
+        with open(path, 'w') as f:
+            f.write(generate_source(self.scorer, target, 'best_model.joblib'))
+        return import_path(path)
+
+    def test_targets_match_sklearn(self):
+        for target in ('numpy', 'stdlib'):
+            with self.subTest(target=target), tempfile.TemporaryDirectory() as directory:
+                module = self.generate(target, directory)
+                np.testing.assert_array_equal(np.asarray(module.predict_proba(self.X.tolist())), self.probas)
+                np.testing.assert_array_equal(np.asarray(module.predict(self.X.tolist())), self.labels)
+                self.assertEqual([module.encode(form) for form in self.forms], self.X.tolist())
+                self.assertEqual(check_parity(module, self.model, self.scaler, DATA_PATH), (len(self.X), 0.0))
+
+    def test_stdlib_target_needs_no_numpy(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.generate('stdlib', directory)
+            with open(os.path.join(directory, 'ckd_model_stdlib.py')) as f:
+                source = f.read()
+        self.assertNotIn('import numpy', source)
+
+
+if __name__ == '__main__':
+    unittest.main()
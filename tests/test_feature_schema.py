@@ -0,0 +1,46 @@
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from feature_schema import FEATURE_COLS, FeatureSchema, label_encoder_codes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(ROOT, 'cleaned_ckd_data.csv')
+
+
+class FeatureSchemaTest(unittest.TestCase):
+    # The single-patient encoder (app.py's /predict) and the vectorized one
+    # (/predict/batch and score_csv.py) must give the same rows
+
+    @classmethod
+    def setUpClass(cls):
+        cls.schema = FeatureSchema(FEATURE_COLS, label_encoder_codes())
+        raw = pd.read_csv(DATA_PATH)
+        raw.columns = raw.columns.str.lower()
+        # Stray whitespace stripped as score_csv.py does
+        cls.frame = raw[FEATURE_COLS].apply(lambda col: col if pd.api.types.is_numeric_dtype(col) else col.str.strip())
+        cls.forms = [{col: str(value) for col, value in record.items()}
+                     for record in cls.frame.to_dict('records')]
+
+    def test_encode_matches_encode_frame(self):
+        rows, invalid = self.schema.encode_frame(self.frame)
+        self.assertFalse(invalid.any())
+        encoded = np.vstack([self.schema.encode(form) for form in self.forms])
+        np.testing.assert_array_equal(encoded, rows)
+
+    def test_invalid_values(self):
+        # encode raises where encode_frame flags the cell and writes NaN
+        form = dict(self.forms[0], rbc='purple', age='')
+        with self.assertRaises(ValueError):
+            self.schema.encode(form)
+        rows, invalid = self.schema.encode_frame(pd.DataFrame([form, self.forms[1]]))
+        flagged = [col for col, bad in zip(FEATURE_COLS, invalid[0]) if bad]
+        self.assertEqual(flagged, ['age', 'rbc'])
+        self.assertTrue(np.isnan(rows[0][invalid[0]]).all())
+        self.assertFalse(invalid[1].any())
+
+
+if __name__ == '__main__':
+    unittest.main()
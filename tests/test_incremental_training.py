@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+
+from incremental_training import encode_new_rows, grow_forest, pad_missing_classes
+from training import categorical_cols
+
+
+class GrowForestTest(unittest.TestCase):
+    def setUp(self):
+        self.X, self.y = make_classification(n_samples=150, n_features=5, random_state=0)
+        self.model = RandomForestClassifier(n_estimators=10, random_state=0).fit(self.X[:100], self.y[:100])
+
+    def test_new_trees_are_added_and_old_ones_kept(self):
+        old = list(self.model.estimators_)
+        model, dropped = grow_forest(self.model, self.X[100:], self.y[100:], add_trees=5)
+        self.assertEqual((len(model.estimators_), dropped), (15, 0))
+        self.assertTrue(all(a is b for a, b in zip(model.estimators_[:10], old)))
+        self.assertFalse(model.warm_start)
+
+    def test_oldest_trees_age_out(self):
+        old = list(self.model.estimators_)
+        model, dropped = grow_forest(self.model, self.X[100:], self.y[100:], add_trees=5, max_trees=12)
+        self.assertEqual((len(model.estimators_), model.n_estimators, dropped), (12, 12, 3))
+        self.assertTrue(all(a is b for a, b in zip(model.estimators_[:7], old[3:])))
+        self.assertEqual(model.predict_proba(self.X).shape, (len(self.X), 2))
+
+    def test_missing_class_padded_from_base_rows(self):
+        X_fit, y_fit = self.X[self.y == 0][:10], np.zeros(10, dtype=int)
+        X_padded, y_padded = pad_missing_classes(X_fit, y_fit, self.X, self.y, np.array([0, 1]))
+        self.assertEqual(set(y_padded), {0, 1})
+        self.assertEqual(len(X_padded), 10 + int((self.y == 1).sum()))
+
+
+class EncodeNewRowsTest(unittest.TestCase):
+    def test_unknown_category_rejected(self):
+        encodings = {col: {'a': 0, 'b': 1} for col in categorical_cols}
+        header = ','.join(categorical_cols)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'new.csv')
+            with open(path, 'w') as f:
+                f.write(f"{header}\n{','.join(['a'] * len(categorical_cols))}\n"
+                        f"{','.join(['b'] * (len(categorical_cols) - 1) + ['c'])}\n")
+            with self.assertRaisesRegex(ValueError, rf"'{categorical_cols[-1]}' has values .*\['c'\]"):
+                encode_new_rows(path, encodings)
+
+            with open(path, 'w') as f:
+                f.write(f"{header}\n{','.join(['b'] * len(categorical_cols))}\n")
+            df = encode_new_rows(path, encodings)
+            self.assertTrue((df[categorical_cols] == 1).all().all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from micro_batcher import MicroBatcher
+
+
+class MicroBatcherTest(unittest.TestCase):
+    def test_each_request_gets_its_own_row(self):
+        # Rows coalesced into one batch come back to the request that sent them
+        started = threading.Barrier(32)
+
+        def score_batch(rows):
+            return [f'row {int(row[0])}' for row in rows]
+
+        batcher = MicroBatcher(score_batch, max_wait=0.05, max_batch=64)
+
+        def request(i):
+            started.wait()
+            return batcher.submit([i, 0.0])
+
+        with ThreadPoolExecutor(32) as pool:
+            results = list(pool.map(request, range(32)))
+        self.assertEqual(results, [f'row {i}' for i in range(32)])
+        stats = batcher.stats()
+        self.assertEqual(stats['rows'], 32)
+        self.assertLess(stats['batches'], 32)
+
+    def test_batches_respect_max_batch(self):
+        sizes = []
+
+        def score_batch(rows):
+            sizes.append(len(rows))
+            return rows[:, 0]
+
+        batcher = MicroBatcher(score_batch, max_wait=0.05, max_batch=4)
+        with ThreadPoolExecutor(10) as pool:
+            results = list(pool.map(lambda i: batcher.submit([i]), range(10)))
+        np.testing.assert_array_equal(results, np.arange(10))
+        self.assertLessEqual(max(sizes), 4)
+
+    def test_scoring_error_reaches_every_request(self):
+        def score_batch(rows):
+            raise ValueError('bad batch')
+
+        batcher = MicroBatcher(score_batch, max_wait=0.01)
+        with self.assertRaisesRegex(ValueError, 'bad batch'):
+            batcher.submit([1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
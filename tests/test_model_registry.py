@@ -0,0 +1,70 @@
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+from sklearn.datasets import make_classification
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from model_registry import list_versions, load_version, publish, resolve, tag
+from shadow_scoring import ShadowScorer
+
+
+class RegistryTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        X, cls.y = make_classification(n_samples=200, n_features=5, random_state=0)
+        cls.scaler = StandardScaler().fit(X)
+        cls.X = X
+        cls.live = DecisionTreeClassifier(max_depth=4, random_state=0).fit(cls.scaler.transform(X), cls.y)
+        cls.candidate = DecisionTreeClassifier(max_depth=1, random_state=0).fit(cls.scaler.transform(X), cls.y)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.registry = os.path.join(self.tmp.name, 'registry')
+
+    def test_publish_and_resolve(self):
+        version = publish(self.live, self.scaler, {'model_name': 'Decision Tree'}, registry=self.registry)
+        self.assertEqual(resolve('latest', self.registry), version)
+        self.assertEqual(resolve(version[:6], self.registry), version)
+        # Same bytes, same version
+        self.assertEqual(publish(self.live, self.scaler, {}, tags=(), registry=self.registry), version)
+
+        scorer, entry = load_version('latest', self.registry)
+        self.assertEqual((entry['version'], entry['model_name']), (version, 'Decision Tree'))
+        np.testing.assert_array_equal(scorer.predict(self.X), self.live.predict(self.scaler.transform(self.X)))
+
+        other = publish(self.candidate, self.scaler, {}, tags=(), registry=self.registry)
+        tag(other, 'production', self.registry)
+        self.assertEqual(resolve('production', self.registry), other)
+        self.assertEqual(resolve('latest', self.registry), version)
+        self.assertEqual(len(list_versions(self.registry)), 2)
+        with self.assertRaises(KeyError):
+            resolve('no-such-version', self.registry)
+
+    def test_shadow_scoring_counts_disagreements(self):
+        publish(self.live, self.scaler, {}, tags=('production',), registry=self.registry)
+        candidate = publish(self.candidate, self.scaler, {}, tags=('candidate',), registry=self.registry)
+        live, _ = load_version('production', self.registry)
+        shadow_scorer, _ = load_version('candidate', self.registry)
+
+        shadow = ShadowScorer(shadow_scorer, candidate)
+        for rows in np.array_split(self.X, 4):
+            shadow.submit(rows, live.predict(rows), live.predict_proba(rows), live.classes_)
+        deadline = time.monotonic() + 5
+        while shadow.stats()['rows'] < len(self.X) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        stats = shadow.stats()
+        expected = int((live.predict(self.X) != shadow_scorer.predict(self.X)).sum())
+        self.assertEqual((stats['version'], stats['rows'], stats['disagreements']), (candidate, len(self.X), expected))
+        self.assertGreater(expected, 0)
+        diff = np.abs(live.predict_proba(self.X) - shadow_scorer.predict_proba(self.X)).sum(axis=1).mean()
+        self.assertAlmostEqual(stats['mean_abs_proba_diff'], diff)
+
+
+if __name__ == '__main__':
+    unittest.main()
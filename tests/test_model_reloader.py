@@ -0,0 +1,69 @@
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from model_reloader import ModelReloader
+
+
+class ConstantScorer:
+    # Predicts the same probabilities for every row
+    def __init__(self, probas, classes=(0, 1)):
+        self.classes_ = np.array(classes)
+        self.probas = np.asarray(probas, dtype=np.float64)
+
+    def predict_proba(self, X):
+        return np.tile(self.probas, (len(X), 1))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class ModelReloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'model.bin')
+        self.touch(1)
+        self.models = [(ConstantScorer([0.2, 0.8]), 'v1')]
+        self.reloader = ModelReloader(lambda: self.models[-1], [self.path], np.zeros((4, 3)),
+                                      check_interval=0.02, warmup_rounds=1)
+
+    def touch(self, generation):
+        with open(self.path, 'w') as f:
+            f.write(str(generation) * generation)
+
+    def test_reload_swaps_whole_bundle(self):
+        first = self.reloader.load()
+        self.assertEqual((first.version, first.ckd_class, first.ckd_index), ('v1', 1, 1))
+        self.models.append((ConstantScorer([0.1, 0.2, 0.7], classes=(0, 1, 2)), 'v2'))
+        self.assertTrue(self.reloader.reload())
+        second = self.reloader.current
+        self.assertEqual((second.version, second.ckd_class, second.ckd_index), ('v2', 0, 0))
+        # A request still holding the old bundle sees it unchanged
+        self.assertEqual((first.version, first.ckd_class), ('v1', 1))
+
+    def test_invalid_model_keeps_current(self):
+        self.reloader.load()
+        self.models.append((ConstantScorer([np.nan, 1.0]), 'broken'))
+        self.assertFalse(self.reloader.reload())
+        status = self.reloader.status()
+        self.assertEqual((status['version'], status['failures']), ('v1', 1))
+        self.assertIn('invalid probabilities', status['last_error'])
+
+    def test_watcher_reloads_after_files_settle(self):
+        self.reloader.load()
+        self.reloader.start()
+        self.models.append((ConstantScorer([0.6, 0.4]), 'v2'))
+        self.touch(2)
+        deadline = time.monotonic() + 5
+        while self.reloader.current.version != 'v2' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.reloader.current.version, 'v2')
+        self.assertEqual(self.reloader.reloads, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import tempfile
+import unittest
+
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from model_search import FoldCache, estimator_hash, successive_halving
+
+GRID = {"Decision Tree": {'max_depth': [2, 3, 4]}}
+
+
+class FoldCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.X, cls.y = make_classification(n_samples=120, n_features=6, random_state=0)
+
+    def search(self, estimator, cache):
+        _, history = successive_halving({"Decision Tree": estimator}, self.X, self.y, GRID, n_splits=3,
+                                        min_resources=30, cache=cache, verbose=False)
+        return sum(entry['fitted'] for entry in history), sum(entry['cached'] for entry in history)
+
+    def test_key_follows_estimator_params(self):
+        tree = DecisionTreeClassifier(random_state=42)
+        self.assertEqual(estimator_hash(tree, {'max_depth': 3}), estimator_hash(tree, {'max_depth': 3}))
+        self.assertNotEqual(estimator_hash(tree, {'max_depth': 3}), estimator_hash(tree, {'max_depth': 4}))
+        # Fixed settings outside the grid count too
+        self.assertNotEqual(estimator_hash(tree, {'max_depth': 3}),
+                            estimator_hash(DecisionTreeClassifier(random_state=0), {'max_depth': 3}))
+        # n_jobs only changes speed
+        self.assertEqual(estimator_hash(RandomForestClassifier(n_jobs=1), {}),
+                         estimator_hash(RandomForestClassifier(n_jobs=4), {}))
+
+    def test_rerun_fits_only_changed_estimators(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FoldCache(directory)
+            fitted, cached = self.search(DecisionTreeClassifier(random_state=42), cache)
+            self.assertGreater(fitted, 0)
+            self.assertEqual(cached, 0)
+
+            self.assertEqual(self.search(DecisionTreeClassifier(random_state=42), cache), (0, fitted))
+            self.assertEqual(self.search(DecisionTreeClassifier(random_state=42, criterion='entropy'), cache)[1], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
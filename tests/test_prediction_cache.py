@@ -0,0 +1,46 @@
+import os
+import tempfile
+import time
+import unittest
+
+from prediction_cache import PredictionCache
+
+
+class PredictionCacheTest(unittest.TestCase):
+    def test_entries_expire_after_ttl(self):
+        cache = PredictionCache(ttl=0.05)
+        key = cache.key([1.0, 2.0])
+        cache.put(key, 'ckd')
+        self.assertEqual(cache.get(key), 'ckd')
+        time.sleep(0.1)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_model_file_change_drops_entries(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'manifest.json')
+            with open(path, 'w') as f:
+                f.write('{}')
+            cache = PredictionCache(watch_paths=[path], check_interval=0)
+            key = cache.key([1.0, 2.0])
+            cache.put(key, 'ckd')
+            self.assertEqual(cache.get(key), 'ckd')
+
+            # Same size, newer mtime: still a different model
+            with open(path, 'w') as f:
+                f.write('[]')
+            info = os.stat(path)
+            os.utime(path, ns=(info.st_atime_ns, info.st_mtime_ns + 1_000_000_000))
+            self.assertIsNone(cache.get(key))
+            self.assertEqual(cache.stats()['invalidations'], 1)
+
+            cache.put(key, 'notckd')
+            self.assertEqual(cache.get(key), 'notckd')
+
+    def test_float_noise_shares_an_entry(self):
+        cache = PredictionCache(decimals=6)
+        self.assertEqual(cache.key([0.1 + 0.2, -0.0]), cache.key([0.3, 0.0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from artifacts import load_artifacts, save_artifacts
+from feature_schema import FEATURE_COLS
+from linear_scorer import LinearSVMScorer
+from training import build_models, prepare_data, read_dataset
+from tree_engine import TreeEnsembleScorer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(ROOT, 'cleaned_ckd_data.csv')
+
+
+class CompiledScorerParityTest(unittest.TestCase):
+    # Every compiled scorer must reproduce scaler + sklearn model on the raw
+    # rows of the bundled dataset
+
+    @classmethod
+    def setUpClass(cls):
+        df = read_dataset(DATA_PATH)
+        cls.X_df = df[FEATURE_COLS]
+        cls.X = cls.X_df.to_numpy(dtype=np.float64)
+        cls.model = joblib.load(os.path.join(ROOT, 'best_model.joblib'))
+        cls.scaler = joblib.load(os.path.join(ROOT, 'scaler.joblib'))
+
+        # The linear SVM and decision tree main.py compares, fitted as it fits them
+        models = build_models()
+        _, _, cls.fit_scaler, X_train, _, y_train, _ = prepare_data(df)
+        cls.svm = models['SVM'].fit(X_train, y_train)
+        cls.tree = models['Decision Tree'].fit(X_train, y_train)
+
+    def expected(self, model, scaler):
+        X_scaled = scaler.transform(pd.DataFrame(self.X, columns=FEATURE_COLS))
+        return model.predict(X_scaled), model.predict_proba(X_scaled)
+
+    def assert_matches(self, scorer, model, scaler, atol):
+        labels, probas = self.expected(model, scaler)
+        np.testing.assert_allclose(scorer.predict_proba(self.X), probas, rtol=0, atol=atol)
+        np.testing.assert_array_equal(scorer.predict(self.X), labels)
+
+    def test_linear_svm(self):
+        scorer = LinearSVMScorer.from_sklearn(self.svm, self.fit_scaler)
+        self.assert_matches(scorer, self.svm, self.fit_scaler, atol=1e-6)
+
+    def test_random_forest(self):
+        scorer = TreeEnsembleScorer.from_sklearn(self.model, self.scaler)
+        self.assert_matches(scorer, self.model, self.scaler, atol=0)
+
+    def test_decision_tree(self):
+        scorer = TreeEnsembleScorer.from_sklearn(self.tree, self.fit_scaler)
+        self.assert_matches(scorer, self.tree, self.fit_scaler, atol=0)
+
+    def test_memory_mapped_artifacts(self):
+        # Written, then loaded back as read-only memory maps, both scorer kinds
+        # still match sklearn
+        cases = [(LinearSVMScorer.from_sklearn(self.svm, self.fit_scaler), self.svm, self.fit_scaler, 1e-6),
+                 (TreeEnsembleScorer.from_sklearn(self.model, self.scaler), self.model, self.scaler, 0)]
+        for scorer, model, scaler, atol in cases:
+            with self.subTest(kind=scorer.kind), tempfile.TemporaryDirectory() as directory:
+                save_artifacts(directory, scorer)
+                loaded = load_artifacts(directory, mmap_mode='r')
+                # Views of the read-only maps, not in-memory copies
+                arrays, _ = loaded.to_arrays()
+                self.assertFalse(any(array.flags.writeable for array in arrays.values()))
+                self.assert_matches(loaded, model, scaler, atol)
+
+    def test_rewrite_leaves_mapped_arrays_alone(self):
+        # Saving over a directory a server has mapped must not change its arrays
+        scorer = TreeEnsembleScorer.from_sklearn(self.model, self.scaler)
+        with tempfile.TemporaryDirectory() as directory:
+            save_artifacts(directory, scorer)
+            mapped = load_artifacts(directory, mmap_mode='r')
+            before = mapped.predict_proba(self.X)
+            save_artifacts(directory, TreeEnsembleScorer.from_sklearn(self.tree, self.fit_scaler))
+            np.testing.assert_array_equal(mapped.predict_proba(self.X), before)
+
+    def test_save_swaps_versions_whole(self):
+        # A manifest read before a save still names a complete set of arrays
+        # from its own version, and the save that follows drops only versions
+        # no manifest could still be pointing at
+        versions = [TreeEnsembleScorer.from_sklearn(self.model, self.scaler),
+                    TreeEnsembleScorer.from_sklearn(self.tree, self.fit_scaler),
+                    LinearSVMScorer.from_sklearn(self.svm, self.fit_scaler)]
+        with tempfile.TemporaryDirectory() as directory:
+            first = save_artifacts(directory, versions[0])
+            second = save_artifacts(directory, versions[1])
+            self.assertNotEqual(first['arrays_dir'], second['arrays_dir'])
+            expected, _ = versions[0].to_arrays()
+            for name in first['arrays']:
+                np.testing.assert_array_equal(
+                    np.load(os.path.join(directory, first['arrays_dir'], f'{name}.npy')), expected[name])
+            np.testing.assert_array_equal(load_artifacts(directory).predict_proba(self.X),
+                                          versions[1].predict_proba(self.X))
+
+            third = save_artifacts(directory, versions[2])
+            self.assertEqual(sorted(entry for entry in os.listdir(directory) if entry.startswith('arrays-')),
+                             sorted([second['arrays_dir'], third['arrays_dir']]))
+            np.testing.assert_allclose(load_artifacts(directory).predict_proba(self.X),
+                                       versions[2].predict_proba(self.X))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import time
+import unittest
+from unittest import mock
+
+import serve
+from serve import Worker, cpu_count
+
+
+class CpuCountTest(unittest.TestCase):
+    def cpus(self, affinity=8, cpu_max=None):
+        # cpu_count() with this affinity mask and /sys/fs/cgroup/cpu.max content
+        # (None: no such file)
+        opener = (mock.mock_open(read_data=cpu_max) if cpu_max is not None
+                  else mock.Mock(side_effect=FileNotFoundError))
+        with mock.patch.object(serve.os, 'sched_getaffinity', return_value=set(range(affinity)), create=True), \
+                mock.patch('builtins.open', opener):
+            return cpu_count()
+
+    def test_affinity_without_quota(self):
+        self.assertEqual(self.cpus(affinity=6), 6)
+        self.assertEqual(self.cpus(affinity=6, cpu_max='max 100000\n'), 6)
+
+    def test_quota_caps_affinity(self):
+        self.assertEqual(self.cpus(affinity=8, cpu_max='200000 100000\n'), 2)
+        # Partial CPUs round down, but never below one
+        self.assertEqual(self.cpus(affinity=8, cpu_max='250000 100000\n'), 2)
+        self.assertEqual(self.cpus(affinity=8, cpu_max='50000 100000\n'), 1)
+        # A quota above the affinity mask doesn't add CPUs
+        self.assertEqual(self.cpus(affinity=2, cpu_max='800000 100000\n'), 2)
+
+    def test_malformed_quota_ignored(self):
+        self.assertEqual(self.cpus(affinity=4, cpu_max='garbage\n'), 4)
+
+
+class WorkerTest(unittest.TestCase):
+    @staticmethod
+    def flask_app(environ, start_response):
+        return [b'ok']
+
+    def test_stops_after_max_requests(self):
+        worker = Worker(self.flask_app, '127.0.0.1', sock=None, max_requests=3)
+        for _ in range(2):
+            worker.count_requests({}, None)
+            self.assertFalse(worker.should_stop())
+        self.assertEqual(worker.count_requests({}, None), [b'ok'])
+        self.assertTrue(worker.should_stop())
+
+    def test_stops_after_max_age(self):
+        worker = Worker(self.flask_app, '127.0.0.1', sock=None, max_age=0.05)
+        self.assertFalse(worker.should_stop())
+        time.sleep(0.06)
+        self.assertTrue(worker.should_stop())
+
+    def test_unlimited_worker_stops_on_sigterm(self):
+        worker = Worker(self.flask_app, '127.0.0.1', sock=None)
+        for _ in range(100):
+            worker.count_requests({}, None)
+        self.assertFalse(worker.should_stop())
+        worker.stop(None, None)
+        self.assertTrue(worker.should_stop())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, confusion_matrix
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+
+from artifacts import COMPILED_DIR, save_artifacts
+from dataset_cache import load_encoded
+from scorers import check_against_sklearn, compile_scorer
+
+DATA_PATH = "cleaned_ckd_data.csv"
+MODEL_PATH = 'best_model.joblib'
+SCALER_PATH = 'scaler.joblib'
+
+# Categorical columns (plus the target) that get label-encoded for training
+categorical_cols = ['rbc', 'pc', 'pcc', 'ba', 'htn', 'dm', 'cad', 'appet', 'pe', 'ane', 'classification']
+
+
+def read_dataset(path=DATA_PATH):
+    # Load the cleaned dataset
+    df = pd.read_csv(path)
+
+    # Convert all column names to lowercase (to avoid inconsistency)
+    df.columns = df.columns.str.lower()
+
+    # Encode categorical variables, remembering the code each value got
+    le = LabelEncoder()
+    encodings = {}
+    for col in categorical_cols:
+        df[col] = le.fit_transform(df[col])
+        encodings[col] = {str(value): code for code, value in enumerate(le.classes_)}
+    df.attrs['encodings'] = encodings
+    return df
+
+
+def load_dataset(path=DATA_PATH, use_cache=True):
+    # Parse and encode the CSV once; later runs memory-map the encoded columns
+    # from .cache/dataset/ until the file's contents change
+    if not use_cache:
+        return read_dataset(path)
+    return load_encoded(path, read_dataset)
+
+
+def prepare_data(df):
+    # Split features and target
+    X = df.drop(columns=['classification'])
+    y = df['classification']
+
+    # Standardize numerical features
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    # Split into train and test sets, stratified when every class has at least two
+    # rows (the stray 'ckd\t' label in the CSV has only one)
+    stratify = y if y.value_counts().min() >= 2 else None
+    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42, stratify=stratify)
+    return X, y, scaler, X_train, X_test, y_train, y_test
+
+
+def holdout_indices(y):
+    # Row indices of prepare_data's train and test split (it depends only on y)
+    stratify = y if y.value_counts().min() >= 2 else None
+    return train_test_split(np.arange(len(y)), test_size=0.2, random_state=42, stratify=stratify)
+
+
+def build_models(forest_jobs=None, params=None):
+    # Define models for comparison, optionally overriding hyperparameters per model
+    models = {
+        "Random Forest": RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42, n_jobs=forest_jobs),
+        "SVM": SVC(kernel='linear', probability=True),
+        "Decision Tree": DecisionTreeClassifier(max_depth=10, random_state=42)
+    }
+    for name, overrides in (params or {}).items():
+        models[name].set_params(**overrides)
+    return models
+
+
+def evaluate_model(name, model, X_train, y_train, X_test, y_test):
+    # Fit one candidate and score it on the held-out split
+    model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    accuracy = accuracy_score(y_test, y_pred) * 100  # Convert to percentage
+    return name, model, accuracy, confusion_matrix(y_test, y_pred)
+
+
+def train_sequential(models, X_train, y_train, X_test, y_test):
+    return [evaluate_model(name, model, X_train, y_train, X_test, y_test) for name, model in models.items()]
+
+
+# Train/test split as seen by a pool worker, memory-mapped from the parent's temp files
+_shared_data = {}
+_SPLIT_NAMES = ('X_train', 'y_train', 'X_test', 'y_test')
+
+
+def _attach_split(directory):
+    for name in _SPLIT_NAMES:
+        _shared_data[name] = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+
+
+def _evaluate_shared(name, model):
+    return evaluate_model(name, model, *(_shared_data[name] for name in _SPLIT_NAMES))
+
+
+def train_parallel(models, X_train, y_train, X_test, y_test, cores=None):
+    # Fit the candidates concurrently, one process each, within a budget of `cores`
+    cores = cores or os.cpu_count() or 1
+    n_workers = max(1, min(len(models), cores))
+
+    # Whatever the other candidates don't use goes to estimators that parallelize
+    # internally (the forest's n_jobs)
+    spare_cores = max(1, cores - (n_workers - 1))
+    for model in models.values():
+        if 'n_jobs' in model.get_params():
+            model.set_params(n_jobs=spare_cores)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Write the split once; workers memory-map it instead of each task
+        # receiving its own pickled copy
+        for name, array in zip(_SPLIT_NAMES, (X_train, y_train, X_test, y_test)):
+            np.save(os.path.join(directory, f'{name}.npy'), np.asarray(array))
+
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_attach_split, initargs=(directory,)) as pool:
+            futures = [pool.submit(_evaluate_shared, name, model) for name, model in models.items()]
+            return [future.result() for future in futures]
+
+
+def save_best_model(best_model, scaler, X):
+    # Save the best model and scaler
+    joblib.dump(best_model, MODEL_PATH)
+    joblib.dump(scaler, SCALER_PATH)
+
+    # Compile the best model for serving (scaler folded in), check it against sklearn,
+    # and write it as uncompressed arrays that the apps memory-map
+    scorer = compile_scorer(best_model, scaler)
+    if scorer.kind != 'sklearn':
+        max_error = check_against_sklearn(scorer, best_model, scaler, X.to_numpy(dtype=np.float64))
+        save_artifacts(COMPILED_DIR, scorer, sources=[MODEL_PATH, SCALER_PATH])
+        print(f"✅ Compiled {scorer.kind} scorer saved to {COMPILED_DIR} (max probability error vs sklearn: {max_error:.2e})")
+    return scorer
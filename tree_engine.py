@@ -0,0 +1,148 @@
+import numpy as np
+
+# Rows evaluated per traversal pass; small enough that the per-level index
+# arrays for all trees stay in cache
+CHUNK_SIZE = 512
+
+
+class TreeEnsembleScorer:
+    # A fitted DecisionTreeClassifier or RandomForestClassifier flattened into
+    # one set of node arrays. Every tree is evaluated at once, one depth level
+    # per step, over the whole batch. Thresholds are mapped back into raw
+    # feature space when the model is compiled, so no scaling happens at
+    # inference time, and leaf probabilities are accumulated in the same order
+    # as sklearn so predict_proba matches bit for bit.
+
+    kind = 'tree_ensemble'
+
+    def __init__(self, classes, feature, threshold, children, value, roots, depths, average):
+        self.classes_ = np.asarray(classes)
+        self.feature = np.asarray(feature)
+        self.threshold = np.asarray(threshold)
+        # children[2 * node] is the right child, children[2 * node + 1] the left one
+        self.children = np.asarray(children)
+        self.value = np.asarray(value)
+        self.roots = np.asarray(roots)
+        self.depths = np.asarray(depths)
+        self.average = bool(average)
+        self.n_trees = len(self.roots)
+
+        # Walk the deepest trees first so each level only touches a prefix of
+        # the traversal state: level d runs over the trees deeper than d
+        self.order = np.argsort(-self.depths, kind='stable')
+        self.inverse = np.argsort(self.order)
+        self.order_roots = self.roots[self.order]
+        self.level_trees = [int((self.depths > level).sum()) for level in range(int(self.depths.max(initial=0)))]
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None):
+        # A forest averages its trees; a single tree is used as-is
+        average = hasattr(model, 'estimators_')
+        trees = [est.tree_ for est in model.estimators_] if average else [model.tree_]
+        if any(tree.n_outputs != 1 for tree in trees):
+            raise ValueError("Only single-output classifiers can be compiled")
+
+        n_classes = len(model.classes_)
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            # Leaves point back at themselves so extra traversal steps are harmless
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            right = np.where(is_leaf, node_ids, tree.children_right) + offset
+            left = np.where(is_leaf, node_ids, tree.children_left) + offset
+            children.append(np.column_stack([right, left]).ravel())
+
+            # Normalize leaf values exactly like DecisionTreeClassifier.predict_proba
+            proba = tree.value[:, 0, :n_classes].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer)
+
+            roots.append(offset)
+            offset += tree.node_count
+
+        feature = np.concatenate(features).astype(np.int32)
+        threshold = np.concatenate(thresholds)
+        if scaler is not None:
+            threshold = raw_thresholds(feature, threshold, scaler)
+
+        return cls(model.classes_, feature, threshold,
+                   np.concatenate(children).astype(np.int32), np.concatenate(values),
+                   np.array(roots, dtype=np.int32), np.array([tree.max_depth for tree in trees]),
+                   average)
+
+    def to_arrays(self):
+        # Everything needed to rebuild the scorer, as plain arrays and parameters
+        arrays = {'classes': self.classes_, 'feature': self.feature, 'threshold': self.threshold,
+                  'children': self.children, 'value': self.value, 'roots': self.roots,
+                  'depths': self.depths}
+        return arrays, {'average': self.average}
+
+    @classmethod
+    def from_arrays(cls, arrays, params):
+        return cls(arrays['classes'], arrays['feature'], arrays['threshold'], arrays['children'],
+                   arrays['value'], arrays['roots'], arrays['depths'], params['average'])
+
+    def apply(self, X):
+        # Leaf index reached in every tree, shape (n_trees, n_samples)
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+
+        # Traversal state for every (tree, sample) pair, deepest trees first
+        row_offsets = np.tile(np.arange(n_samples, dtype=np.int32) * n_features, self.n_trees)
+        node = np.repeat(self.order_roots, n_samples)
+        for n_trees in self.level_trees:
+            active = node[:n_trees * n_samples]
+            go_left = flat_X.take(row_offsets[:len(active)] + self.feature.take(active)) <= self.threshold.take(active)
+            node[:len(active)] = self.children.take(active * 2 + go_left)
+        return node.reshape(self.n_trees, n_samples)[self.inverse]
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        proba = np.empty((X.shape[0], len(self.classes_)))
+        for start in range(0, X.shape[0], CHUNK_SIZE):
+            leaves = self.apply(X[start:start + CHUNK_SIZE])
+            # Summing over the leading axis adds tree by tree, the same order
+            # RandomForestClassifier accumulates its trees in
+            chunk = self.value.take(leaves, axis=0).sum(axis=0)
+            if self.average:
+                chunk /= self.n_trees
+            proba[start:start + CHUNK_SIZE] = chunk
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def raw_thresholds(feature, threshold, scaler):
+    # sklearn routes a sample left when float32((x - mean) / scale) <= threshold.
+    # That test is monotone in x, so it is equivalent to x <= r for the largest
+    # float64 r that still passes. Start from the float32 rounding boundary
+    # mapped into raw units, then step by ulps until r is exact.
+    mean = scaler.mean_[feature] if scaler.with_mean else np.zeros(len(feature))
+    scale = scaler.scale_[feature] if scaler.with_std else np.ones(len(feature))
+    finite = np.isfinite(threshold)
+
+    def goes_left(x):
+        return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    # Largest float32 not above the threshold, and the midpoint to the next float32
+    below = threshold.astype(np.float32)
+    too_high = below.astype(np.float64) > threshold
+    below[too_high] = np.nextafter(below[too_high], np.float32(-np.inf))
+    boundary = (below.astype(np.float64) + np.nextafter(below, np.float32(np.inf)).astype(np.float64)) / 2
+
+    raw = np.where(finite, boundary * scale + mean, threshold)
+    for _ in range(1000):
+        step_down = finite & ~goes_left(raw)
+        step_up = finite & ~step_down & goes_left(np.nextafter(raw, np.inf))
+        if not (step_down.any() or step_up.any()):
+            return raw
+        raw[step_down] = np.nextafter(raw[step_down], -np.inf)
+        raw[step_up] = np.nextafter(raw[step_up], np.inf)
+    raise ValueError("Could not map tree thresholds back to raw feature space")